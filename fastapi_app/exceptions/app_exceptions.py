@@ -1,3 +1,10 @@
 class TooManyRequestsException(Exception):
-    def __init__(self):
+    def __init__(self, retry_after: float | None = None):
         super().__init__("Too many requests")
+        # Seconds the client should wait before trying again, if known.
+        self.retry_after = retry_after
+
+
+class RequestDroppedException(Exception):
+    def __init__(self):
+        super().__init__("Request was dropped before it was served")
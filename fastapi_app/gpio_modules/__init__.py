@@ -1,9 +1,19 @@
 # ruff: noqa: F401
 
 from .button import Button
-from .buzzer import Buzzer, BuzzerPlayRequest
+from .buzzer import Buzzer, BuzzerMelodyRequest, BuzzerPlayRequest
+from .card_data import CardData, CardReadConfig
+from .common import HARDWARE_ROLE, OWNS_HARDWARE, SIMULATE_HARDWARE
 from .lcd import LcdI2c
+from .led_pattern_player import LedPattern, LedPatternPlayer, LedPatternStep
 from .leds import LedsPcf8574
-from .rfid_module import RfidModule
-from .servo import Servo, ServoMoveRequest
+from .priority_lane_queue import LaneConfig, OverflowPolicy, RequestPriority
+from .rfid_module import AsyncRfidModule, RfidModule
+from .sample_ring import SampleRecord, SampleRingReader, SampleRingWriter
+from .servo import Servo, ServoMoveRequest, ServoState
+from .ultrasonic_scheduler import (
+    UltrasonicSample,
+    UltrasonicScheduler,
+    UltrasonicSensorPins,
+)
 from .ultrasonic_sensor import UltrasonicSensor
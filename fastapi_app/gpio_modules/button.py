@@ -3,10 +3,12 @@ import contextlib
 import os
 import queue
 import sys
+import time
 from datetime import datetime, timezone
 from enum import Enum
 from threading import Timer
 
+import pigpio
 from gpiozero import Button as GPIOButton
 
 # Add current script folder to Python path.
@@ -22,8 +24,29 @@ class ButtonEvent(Enum):
     RELEASED = 0
 
 
+class ButtonEdge:
+    def __init__(
+        self, event: ButtonEvent, timestamp: float, tick: int | None = None
+    ):
+        self.event = event
+        # Wall clock time of the edge, in seconds.
+        self.timestamp = timestamp
+        # pigpio tick of the edge in microseconds, wraps every ~72 minutes.
+        # None when debounced in Python.
+        self.tick = tick
+
+
 class Button:
-    def __init__(self, pin: int, debounce_time: float = 1 / 60):
+    # The longest pigpio watchdog, re-anchors edge timestamps to the wall
+    # clock while the button is idle.
+    ANCHOR_INTERVAL_MS = 60_000
+
+    def __init__(
+        self,
+        pin: int,
+        debounce_time: float = 1 / 60,
+        use_glitch_filter: bool = False,
+    ):
         # Use PiGPIO to avoid vscode freeze bug.
         self.gpio_button = GPIOButton(
             pin,
@@ -32,22 +55,119 @@ class Button:
             # bounce_time=1 / 60,
         )
 
+        self._pin = pin
         self._debounce_time = debounce_time
-        self._event_generator = self._setup_event_generator()
 
-    def _setup_event_generator(self) -> SingleSourceEventGenerator[ButtonEvent]:
+        # Only available with a pigpio daemon, not e.g. a mock pin factory.
+        self._pi: pigpio.pi | None = getattr(
+            self.gpio_button.pin_factory, "connection", None
+        )
+        if use_glitch_filter and self._pi is not None:
+            self._event_generator = self._setup_glitch_filter_event_generator()
+        else:
+            self._event_generator = self._setup_event_generator()
+
+    def _setup_glitch_filter_event_generator(
+        self,
+    ) -> SingleSourceEventGenerator[ButtonEdge]:
+        """
+        pigpio only reports a level that stayed steady for debounce_time, so
+        bounces never reach Python, and timestamps every edge with its tick.
+        """
+        pi = self._pi
+        pressed_level = 0 if self.gpio_button.pull_up else 1
+        callback = None
+        is_pressing_down = False
+        # A tick and its wall clock time, edges are timestamped relative to
+        # it instead of asking pigpiod for the current tick every time.
+        anchor_tick = 0
+        anchor_time = 0.0
+
+        def _anchor():
+            nonlocal anchor_tick
+            nonlocal anchor_time
+
+            anchor_tick = pi.get_current_tick()
+            anchor_time = time.time()
+
+        def _tick_time(tick: int) -> float:
+            nonlocal anchor_tick
+            nonlocal anchor_time
+
+            # Signed, an edge may be queued from just before the anchor.
+            elapsed_us = (tick - anchor_tick) & 0xFFFFFFFF
+            if elapsed_us >= 1 << 31:
+                elapsed_us -= 1 << 32
+
+            # Move the anchor along, ticks wrap every ~72 minutes.
+            anchor_tick = tick
+            anchor_time += elapsed_us / 1_000_000
+            return anchor_time
+
+        def _on_edge(queue: queue.Queue[ButtonEdge], level: int, tick: int):
+            nonlocal is_pressing_down
+
+            # 2 is a watchdog timeout, not an edge. Without edges it fires
+            # every ANCHOR_INTERVAL_MS to keep the anchor close to the wall
+            # clock.
+            if level == pigpio.TIMEOUT:
+                _anchor()
+                return
+
+            is_pressed = level == pressed_level
+            if is_pressed == is_pressing_down:
+                return
+            is_pressing_down = is_pressed
+
+            event = ButtonEvent.PRESSED if is_pressed else ButtonEvent.RELEASED
+            queue.put(ButtonEdge(event, _tick_time(tick), tick))
+
+        def _setup_gpio(queue: queue.Queue[ButtonEdge]):
+            nonlocal callback
+            nonlocal is_pressing_down
+
+            is_pressing_down = self.gpio_button.is_pressed
+            _anchor()
+            pi.set_glitch_filter(
+                self._pin, round(self._debounce_time * 1_000_000)
+            )
+            pi.set_watchdog(self._pin, self.ANCHOR_INTERVAL_MS)
+            callback = pi.callback(
+                self._pin,
+                pigpio.EITHER_EDGE,
+                lambda gpio, level, tick: _on_edge(queue, level, tick),
+            )
+
+        def _clear_gpio():
+            nonlocal callback
+
+            pi.set_watchdog(self._pin, 0)
+            if callback is not None:
+                callback.cancel()
+                callback = None
+            pi.set_glitch_filter(self._pin, 0)
+
+        return SingleSourceEventGenerator(
+            setup_queue=_setup_gpio, cleanup=_clear_gpio
+        )
+
+    def _setup_event_generator(self) -> SingleSourceEventGenerator[ButtonEdge]:
         is_pressing_down = False
         release_timer: Timer | None = None
 
         # Take the first press down and the last press up.
-        def _debounce_event(queue: queue.Queue[ButtonEvent], event):
+        def _debounce_event(queue: queue.Queue[ButtonEdge], event):
             nonlocal is_pressing_down
             nonlocal release_timer
 
+            # The release is only reported once the timer fires, but
+            # happened now.
+            event_time = time.time()
+
             def release():
                 nonlocal is_pressing_down
                 is_pressing_down = False
-                queue.put(ButtonEvent.RELEASED)
+                queue.put(ButtonEdge(ButtonEvent.RELEASED, event_time))
 
             def reset_release_timer():
                 if (
@@ -57,7 +177,7 @@ class Button:
                     release_timer.cancel()
 
             if event == ButtonEvent.PRESSED and not is_pressing_down:
-                queue.put(ButtonEvent.PRESSED)
+                queue.put(ButtonEdge(ButtonEvent.PRESSED, event_time))
                 is_pressing_down = True
                 return
 
@@ -71,7 +191,7 @@ class Button:
                 reset_release_timer()
                 return
 
-        def _setup_gpio(queue: queue.Queue[ButtonEvent]):
+        def _setup_gpio(queue: queue.Queue[ButtonEdge]):
             self.gpio_button.when_pressed = lambda: _debounce_event(
                 queue, ButtonEvent.PRESSED
             )
@@ -100,13 +220,15 @@ class Button:
 
 
 def main():
-    button = Button(26)
+    button = Button(26, use_glitch_filter=True)
     print("Waiting for button press...")
 
-    for event in button.wait_event():
-        current_time = str(datetime.now(timezone.utc).isoformat())
+    for edge in button.wait_event():
+        current_time = str(
+            datetime.fromtimestamp(edge.timestamp, timezone.utc).isoformat()
+        )
 
-        match event:
+        match edge.event:
             case ButtonEvent.PRESSED:
                 print("Button pressed! at ", current_time)
             case ButtonEvent.RELEASED:
@@ -120,10 +242,13 @@ async def async_main():
     press_count = 0
 
     async with contextlib.aclosing(button.async_wait_event()) as wait_event:
-        async for event in wait_event:
-            current_time = str(datetime.now(timezone.utc).isoformat())
+        async for edge in wait_event:
+            current_time = str(
+                datetime.fromtimestamp(edge.timestamp, timezone.utc)
+                .isoformat()
+            )
 
-            match event:
+            match edge.event:
                 case ButtonEvent.PRESSED:
                     print("Button pressed! at ", current_time)
                 case ButtonEvent.RELEASED:
@@ -1,7 +1,10 @@
 import os
 import sys
+import threading
 import time
+from concurrent.futures import Future
 
+import pigpio
 from gpiozero import TonalBuzzer as GPIOTonalBuzzer
 from gpiozero.tones import Tone
 
@@ -9,31 +12,66 @@ from gpiozero.tones import Tone
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from common import pi_gpio_factory
+from priority_lane_queue import LaneConfig, RequestPriority
 from request_queued_thread import RequestQueuedThread
 
 
 class BuzzerPlayRequest:
-    def __init__(self, tone: Tone, duration: float):
+    def __init__(self, tone: Tone | None, duration: float):
+        # None is a rest, only used in melodies.
         self.tone = tone
         self.duration = duration
 
 
+class BuzzerMelodyRequest:
+    # Each note takes 7 bytes of the pigpio wave chain, which is limited to
+    # 600 bytes.
+    MAX_NOTES = 64
+    # Limit of a wave chain loop counter.
+    MAX_PERIODS_PER_NOTE = 65535
+
+    def __init__(self, notes: list[BuzzerPlayRequest]):
+        if not 0 < len(notes) <= self.MAX_NOTES:
+            raise ValueError(f"A melody has 1 to {self.MAX_NOTES} notes")
+
+        self.notes = notes
+
+    @property
+    def duration(self) -> float:
+        return sum(note.duration for note in self.notes)
+
+
 class Buzzer:
-    def __init__(self, pin: int, queue_size: int = 3):
+    # Rests are rendered as this many microseconds of silence, repeated.
+    REST_WAVE_LENGTH = 10_000
+
+    def __init__(
+        self,
+        pin: int,
+        queue_size: int = 3,
+        lanes: dict[RequestPriority, LaneConfig] | None = None,
+    ):
         self.gpio_buzzer = GPIOTonalBuzzer(
             pin, pin_factory=pi_gpio_factory, octaves=2
         )
+        self._pin = pin
         # atexit.register(self.gpio_buzzer.close)
 
         self._queue_size = queue_size
+        self._lanes = lanes
         self._play_queued_thread = self._setup_queued_thread()
+        # Cuts the current note or melody short on close.
+        self._stop_flag_event = threading.Event()
 
     def _setup_queued_thread(self) -> RequestQueuedThread:
         def _serve_request(
-            request: BuzzerPlayRequest, next_request_available: bool
+            request: BuzzerPlayRequest | BuzzerMelodyRequest,
+            next_request_available: bool,
         ):
-            self.gpio_buzzer.play(request.tone)
-            time.sleep(request.duration)
+            if isinstance(request, BuzzerMelodyRequest):
+                self._play_melody(request)
+            else:
+                self._play_note(request)
 
             if not next_request_available:
                 self.gpio_buzzer.stop()
@@ -45,8 +83,86 @@ class Buzzer:
             _serve_request,
             _cleanup,
             queue_size=self._queue_size,
+            lanes=self._lanes,
         )
 
+    def _play_note(self, note: BuzzerPlayRequest):
+        if note.tone is None:
+            self.gpio_buzzer.stop()
+        else:
+            self.gpio_buzzer.play(note.tone)
+
+        self._stop_flag_event.wait(note.duration)
+
+    def _play_melody(self, melody: BuzzerMelodyRequest):
+        pi = getattr(self.gpio_buzzer.pin_factory, "connection", None)
+        if pi is None:
+            # No pigpio daemon, e.g. a mock pin factory, time notes in Python.
+            for note in melody.notes:
+                if self._stop_flag_event.is_set():
+                    break
+
+                self._play_note(note)
+            return
+
+        # The waveform drives the pin directly, PWM must be off.
+        self.gpio_buzzer.stop()
+
+        wave_ids, chain = self._render_melody(pi, melody)
+        try:
+            pi.wave_chain(chain)
+
+            # DMA keeps the timing, the thread only waits for the end. It
+            # stays busy meanwhile, later requests queue up behind the melody
+            # instead of cutting it off.
+            if not self._stop_flag_event.wait(melody.duration):
+                while pi.wave_tx_busy():
+                    if self._stop_flag_event.wait(0.01):
+                        break
+        finally:
+            pi.wave_tx_stop()
+            for wave_id in wave_ids:
+                pi.wave_delete(wave_id)
+
+    def _render_melody(
+        self, pi: pigpio.pi, melody: BuzzerMelodyRequest
+    ) -> tuple[list[int], list[int]]:
+        """
+        Create one single period wave per distinct note and a wave chain that
+        loops each of them for the note duration.
+        """
+        pin_mask = 1 << self._pin
+        waves: dict[int, int] = {}
+        chain = []
+
+        for note in melody.notes:
+            if note.tone is None:
+                wave_key = 0
+                pulses = [pigpio.pulse(0, 0, self.REST_WAVE_LENGTH)]
+                period_count = round(
+                    note.duration * 1_000_000 / self.REST_WAVE_LENGTH
+                )
+            else:
+                wave_key = half_period = round(500_000 / note.tone.frequency)
+                pulses = [
+                    pigpio.pulse(pin_mask, 0, half_period),
+                    pigpio.pulse(0, pin_mask, half_period),
+                ]
+                period_count = round(note.duration * note.tone.frequency)
+
+            if wave_key not in waves:
+                pi.wave_add_generic(pulses)
+                waves[wave_key] = pi.wave_create()
+
+            period_count = min(
+                max(period_count, 1), BuzzerMelodyRequest.MAX_PERIODS_PER_NOTE
+            )
+            # Loop start, wave, loop end repeating period_count times.
+            chain += [255, 0, waves[wave_key], 255, 1]
+            chain += [period_count & 0xFF, period_count >> 8]
+
+        return list(waves.values()), chain
+
     @property
     def max_frequency(self) -> float:
         return self.gpio_buzzer.max_tone.frequency
@@ -62,11 +178,19 @@ class Buzzer:
         self.close()
 
     def close(self):
+        self._stop_flag_event.set()
         self._play_queued_thread.close()
         # self.gpio_buzzer.close()
 
-    def schedule(self, request: BuzzerPlayRequest, block=True):
-        self._play_queued_thread.schedule(request, block=block)
+    def schedule(
+        self,
+        request: BuzzerPlayRequest | BuzzerMelodyRequest,
+        block=True,
+        priority: RequestPriority = RequestPriority.NORMAL,
+    ) -> Future[None]:
+        return self._play_queued_thread.schedule(
+            request, block=block, priority=priority
+        )
 
     def join_queue(self):
         self._play_queued_thread.join_queue()
@@ -90,5 +214,37 @@ def main():
         buzzer.join_queue()
 
 
+def main_melody():
+    with Buzzer(21) as buzzer:
+        # Accepted jingle, then the same notes with rests in between.
+        notes = [Tone("C5"), Tone("E5"), Tone("G5")]
+        buzzer.schedule(
+            BuzzerMelodyRequest(
+                [BuzzerPlayRequest(tone, 0.12) for tone in notes]
+            )
+        )
+        buzzer.schedule(
+            BuzzerMelodyRequest(
+                [
+                    BuzzerPlayRequest(notes[0], 0.2),
+                    BuzzerPlayRequest(None, 0.2),
+                    BuzzerPlayRequest(notes[1], 0.2),
+                    BuzzerPlayRequest(None, 0.2),
+                    BuzzerPlayRequest(notes[2], 0.2),
+                ]
+            )
+        )
+
+        buzzer.join_queue()
+
+
 if __name__ == "__main__":
-    main()
+    test = 1
+
+    match test:
+        case 1:
+            print("Running main()")
+            main()
+        case 2:
+            print("Running main_melody()")
+            main_melody()
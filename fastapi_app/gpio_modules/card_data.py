@@ -0,0 +1,314 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from adafruit_pn532.adafruit_pn532 import (
+    MIFARE_CMD_AUTH_A,
+    MIFARE_CMD_AUTH_B,
+    PN532,
+)
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from pn532_async import AsyncPn532Uart
+
+DEFAULT_MIFARE_KEY = b"\xff" * 6
+
+# NTAG2xx user memory, and so the NDEF TLV, starts at page 4.
+_NTAG_FIRST_USER_PAGE = 4
+_NTAG_PAGE_SIZE = 4
+_MIFARE_BLOCK_SIZE = 16
+
+_TLV_NULL = 0x00
+_TLV_NDEF_MESSAGE = 0x03
+_TLV_TERMINATOR = 0xFE
+
+
+class CardReadConfig:
+    """
+    What to read from a card after its UID. 4 byte UIDs are read as MIFARE
+    Classic, authenticating each block with key. 7 byte UIDs are read as
+    NTAG2xx/Ultralight, where blocks are page numbers and the NDEF message
+    can be read too.
+    """
+
+    def __init__(
+        self,
+        blocks: list[int] | None = None,
+        key: bytes = DEFAULT_MIFARE_KEY,
+        use_key_b: bool = False,
+        ndef: bool = False,
+        ndef_max_pages: int = 128,
+    ):
+        if len(key) != 6:
+            raise ValueError("MIFARE keys are 6 bytes")
+
+        self.blocks = blocks or []
+        self.key = key
+        self.key_number = MIFARE_CMD_AUTH_B if use_key_b else MIFARE_CMD_AUTH_A
+        self.ndef = ndef
+        self.ndef_max_pages = ndef_max_pages
+
+
+class NdefRecord:
+    def __init__(self, tnf: int, record_type: bytes, payload: bytes):
+        self.tnf = tnf
+        self.type = record_type
+        self.payload = payload
+
+    @property
+    def text(self) -> str | None:
+        """
+        Text of a well-known Text record, None for other records.
+        """
+        if self.tnf != 0x01 or self.type != b"T" or not self.payload:
+            return None
+
+        status = self.payload[0]
+        encoding = "utf-16" if status & 0x80 else "utf-8"
+        language_length = status & 0x3F
+        return self.payload[1 + language_length :].decode(
+            encoding, errors="replace"
+        )
+
+
+class CardData:
+    def __init__(
+        self,
+        blocks: dict[int, bytes] | None = None,
+        ndef_records: list[NdefRecord] | None = None,
+        complete: bool = True,
+    ):
+        # Blocks that could not be authenticated or read are left out.
+        self.blocks = blocks or {}
+        self.ndef_records = ndef_records or []
+        # False if a block or the NDEF message could not be read, e.g. the
+        # card was pulled away mid-read. Such reads are not cached.
+        self.complete = complete
+
+
+def parse_ndef_records(message: bytes) -> list[NdefRecord]:
+    records = []
+    i = 0
+
+    while i < len(message):
+        header = message[i]
+        short_record = header & 0x10
+        has_id_length = header & 0x08
+        tnf = header & 0x07
+        i += 1
+
+        type_length = message[i]
+        i += 1
+        if short_record:
+            payload_length = message[i]
+            i += 1
+        else:
+            payload_length = int.from_bytes(message[i : i + 4], "big")
+            i += 4
+
+        id_length = 0
+        if has_id_length:
+            id_length = message[i]
+            i += 1
+
+        record_type = message[i : i + type_length]
+        i += type_length + id_length
+        payload = message[i : i + payload_length]
+        i += payload_length
+
+        if len(payload) != payload_length:
+            raise ValueError("Truncated NDEF record")
+
+        records.append(NdefRecord(tnf, bytes(record_type), bytes(payload)))
+
+        # Message end flag
+        if header & 0x40:
+            break
+
+    return records
+
+
+def _parse_ndef_message(message: bytes) -> list[NdefRecord]:
+    try:
+        return parse_ndef_records(message)
+    except (ValueError, IndexError) as e:
+        print(f"Invalid NDEF message: {e}")
+        return []
+
+
+def find_ndef_message(memory: bytes) -> tuple[bool, bytes | None]:
+    """
+    Look for the NDEF message TLV in the user memory read so far. Returns
+    whether the search is done, and the message if one was found.
+    """
+    i = 0
+    while i < len(memory):
+        tag = memory[i]
+        if tag == _TLV_NULL:
+            i += 1
+            continue
+        if tag == _TLV_TERMINATOR:
+            return True, None
+
+        if i + 1 >= len(memory):
+            return False, None
+
+        length = memory[i + 1]
+        value_start = i + 2
+        if length == 0xFF:
+            if i + 3 >= len(memory):
+                return False, None
+
+            length = int.from_bytes(memory[i + 2 : i + 4], "big")
+            value_start = i + 4
+
+        if tag == _TLV_NDEF_MESSAGE:
+            if value_start + length > len(memory):
+                return False, None
+
+            return True, bytes(memory[value_start : value_start + length])
+
+        i = value_start + length
+
+    return False, None
+
+
+def _block_size(uid: bytes) -> int:
+    return _MIFARE_BLOCK_SIZE if len(uid) == 4 else _NTAG_PAGE_SIZE
+
+
+def read_card_data(
+    pn532: PN532, uid: bytes, config: CardReadConfig
+) -> CardData:
+    """
+    Read the configured blocks and NDEF message of the card that was just
+    detected by pn532. The card must still be selected, i.e. no other
+    command was sent since it was detected.
+    """
+    blocks = {}
+    ndef_records = []
+    is_mifare_classic = len(uid) == 4
+
+    for block in config.blocks:
+        if is_mifare_classic and not pn532.mifare_classic_authenticate_block(
+            uid, block, config.key_number, config.key
+        ):
+            continue
+
+        # Also reads NTAG2xx pages, 4 at a time.
+        data = pn532.mifare_classic_read_block(block)
+        if data is not None:
+            blocks[block] = bytes(data[: _block_size(uid)])
+
+    ndef_complete = True
+    if config.ndef and not is_mifare_classic:
+        memory = b""
+        for page in range(_NTAG_FIRST_USER_PAGE, config.ndef_max_pages, 4):
+            data = pn532.mifare_classic_read_block(page)
+            if data is None:
+                ndef_complete = False
+                break
+
+            memory += bytes(data)
+            done, message = find_ndef_message(memory)
+            if done:
+                if message:
+                    ndef_records = _parse_ndef_message(message)
+                break
+
+    complete = len(blocks) == len(config.blocks) and ndef_complete
+    return CardData(blocks, ndef_records, complete)
+
+
+async def async_read_card_data(
+    pn532: AsyncPn532Uart, uid: bytes, config: CardReadConfig
+) -> CardData:
+    """
+    Same as read_card_data() for a PN532 driven by the event loop.
+    """
+    blocks = {}
+    ndef_records = []
+    is_mifare_classic = len(uid) == 4
+
+    for block in config.blocks:
+        if (
+            is_mifare_classic
+            and not await pn532.mifare_classic_authenticate_block(
+                uid, block, config.key_number, config.key
+            )
+        ):
+            continue
+
+        data = await pn532.mifare_classic_read_block(block)
+        if data is not None:
+            blocks[block] = data[: _block_size(uid)]
+
+    ndef_complete = True
+    if config.ndef and not is_mifare_classic:
+        memory = b""
+        for page in range(_NTAG_FIRST_USER_PAGE, config.ndef_max_pages, 4):
+            data = await pn532.mifare_classic_read_block(page)
+            if data is None:
+                ndef_complete = False
+                break
+
+            memory += data
+            done, message = find_ndef_message(memory)
+            if done:
+                if message:
+                    ndef_records = _parse_ndef_message(message)
+                break
+
+    complete = len(blocks) == len(config.blocks) and ndef_complete
+    return CardData(blocks, ndef_records, complete)
+
+
+class CardDataCache:
+    """
+    Card data by UID, kept for ttl seconds so a card presented again within
+    a session is not read again. Holds at most max_size cards.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 256):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, CardData]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, uid: str, now: float | None = None) -> CardData | None:
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self._remove_expired(now)
+
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+
+            return entry[1]
+
+    def put(self, uid: str, card_data: CardData, now: float | None = None):
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            # Keep the entries in insertion time order for _remove_expired().
+            self._entries.pop(uid, None)
+            self._entries[uid] = (now, card_data)
+
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def _remove_expired(self, now: float):
+        while self._entries:
+            uid, (put_time, _) = next(iter(self._entries.items()))
+            if now - put_time < self._ttl:
+                break
+
+            self._entries.popitem(last=False)
@@ -6,6 +6,32 @@ IS_DOCKER = bool(os.getenv("IS_DOCKER", "False").capitalize() == "True")
 DOCKER_HOSTNAME = "host.docker.internal"
 print(f"IS_DOCKER: {IS_DOCKER}")
 
+# Run without a Raspberry Pi: mock GPIO pins and simulated I2C/UART devices,
+# e.g. for load tests.
+SIMULATE_HARDWARE = bool(
+    os.getenv("SIMULATE_HARDWARE", "False").capitalize() == "True"
+)
+print(f"SIMULATE_HARDWARE: {SIMULATE_HARDWARE}")
+
+# "local" drives the hardware from the API process. With the process split,
+# "daemon" is the single hardware daemon process and "api" an API worker
+# that sends device requests to it, see fastapi_app/hardware_daemon.
+HARDWARE_ROLE = os.getenv("HARDWARE_ROLE", "local")
+if HARDWARE_ROLE not in ("local", "daemon", "api"):
+    raise ValueError(f"Invalid HARDWARE_ROLE: {HARDWARE_ROLE}")
+OWNS_HARDWARE = HARDWARE_ROLE != "api"
+print(f"HARDWARE_ROLE: {HARDWARE_ROLE}")
+
 # out = subprocess.run(["ping", "-c", "1", DOCKER_HOSTNAME], capture_output=True)
 # print(out.stdout.decode())
-pi_gpio_factory = PiGPIOFactory(host=DOCKER_HOSTNAME if IS_DOCKER else None)
+if not OWNS_HARDWARE:
+    # API workers must not touch the pins, the daemon owns them.
+    pi_gpio_factory = None
+elif SIMULATE_HARDWARE:
+    from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+    pi_gpio_factory = MockFactory(pin_class=MockPWMPin)
+else:
+    pi_gpio_factory = PiGPIOFactory(
+        host=DOCKER_HOSTNAME if IS_DOCKER else None
+    )
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+# Generic item type
+T = TypeVar("T")
+
+_END_OF_STREAM = object()
+
+
+class ConflatingQueue(Generic[T]):
+    """
+    Queue holding only the latest item: a put replaces the pending item
+    instead of waiting behind it, so memory stays O(1) however slow the
+    consumer is. Meant for continuous measurements, where only the freshest
+    value matters.
+
+    With key, the latest item of every key is kept instead, e.g. one sample
+    per sensor. Pending items are taken in the order their key first got
+    queued.
+
+    A pending None is never replaced, it is the end of stream signal of
+    SingleSourceEventGenerator.
+
+    Follows the queue.Queue interface, including task_done() and join().
+    """
+
+    def __init__(self, key: Callable[[T], Hashable] | None = None):
+        self._key = key
+        self._items: dict[Hashable, T | None] = {}
+        self._unfinished_tasks = 0
+        # Number of items replaced before they were taken.
+        self.dropped_count = 0
+
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._all_tasks_done = threading.Condition(self._mutex)
+
+    def qsize(self) -> int:
+        with self._mutex:
+            return len(self._items)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def put(self, item: T, block: bool = True, timeout: float | None = None):
+        # Never blocks, block and timeout are only there for compatibility.
+        if item is None:
+            key = _END_OF_STREAM
+        elif self._key is not None:
+            key = self._key(item)
+        else:
+            key = None
+
+        with self._mutex:
+            if _END_OF_STREAM in self._items:
+                return
+
+            if key in self._items:
+                self.dropped_count += 1
+            else:
+                self._unfinished_tasks += 1
+
+            self._items[key] = item
+            self._not_empty.notify()
+
+    def put_nowait(self, item: T):
+        self.put(item, block=False)
+
+    def get(self, block: bool = True, timeout: float | None = None) -> T:
+        with self._not_empty:
+            if not block:
+                if not self._items:
+                    raise queue.Empty
+            else:
+                deadline = (
+                    None if timeout is None else time.monotonic() + timeout
+                )
+                while not self._items:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise queue.Empty
+
+                    self._not_empty.wait(remaining)
+
+            key = next(iter(self._items))
+            return self._items.pop(key)
+
+    def get_nowait(self) -> T:
+        return self.get(block=False)
+
+    def task_done(self):
+        with self._all_tasks_done:
+            if self._unfinished_tasks <= 0:
+                raise ValueError("task_done() called too many times")
+
+            self._unfinished_tasks -= 1
+            if self._unfinished_tasks == 0:
+                self._all_tasks_done.notify_all()
+
+    def join(self):
+        with self._all_tasks_done:
+            while self._unfinished_tasks > 0:
+                self._all_tasks_done.wait()
@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+
+class ExpiringDebounceTable:
+    """
+    Remembers when each key (e.g. a card UID) was last seen, to drop repeats
+    that come within its debounce window.
+
+    Keys are kept in last seen order, so keys whose window has passed are
+    dropped from the front, and the table never holds more than max_size
+    keys however many distinct keys are seen.
+    """
+
+    def __init__(self, window: float = 0.5, max_size: int = 1024):
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self._window = window
+        self._max_size = max_size
+        self._key_windows: dict[str, float] = {}
+        self._max_window = window
+
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def set_window(self, key: str, window: float | None):
+        """
+        Use a different debounce window for key, or the default one again if
+        window is None.
+        """
+        if window is not None and window < 0:
+            raise ValueError("window must not be negative")
+
+        with self._lock:
+            if window is None:
+                self._key_windows.pop(key, None)
+            else:
+                self._key_windows[key] = window
+
+            self._max_window = max(
+                [self._window, *self._key_windows.values()]
+            )
+
+    def should_accept(self, key: str, now: float | None = None) -> bool:
+        """
+        Record that key was seen and return whether it is outside its
+        debounce window. A key seen continuously (e.g. a card left on the
+        reader) stays debounced.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self._remove_expired(now)
+
+            last_seen = self._last_seen.pop(key, None)
+            self._last_seen[key] = now
+
+            if len(self._last_seen) > self._max_size:
+                self._last_seen.popitem(last=False)
+
+            if last_seen is None:
+                return True
+
+            return now - last_seen >= self._key_windows.get(key, self._window)
+
+    def _remove_expired(self, now: float):
+        while self._last_seen:
+            key, last_seen = next(iter(self._last_seen.items()))
+            if now - last_seen < self._max_window:
+                break
+
+            self._last_seen.popitem(last=False)
+
+
+def soak_test(scan_count: int = 5_000_000, max_size: int = 1024):
+    """
+    Feed millions of simulated scans from a large pool of visitor cards and
+    check that memory stays flat.
+    """
+    table = ExpiringDebounceTable(window=0.5, max_size=max_size)
+    regular_uids = [f"{i:08x}" for i in range(20)]
+    for uid in regular_uids[:5]:
+        table.set_window(uid, 5)
+
+    tracemalloc.start()
+    now = 0.0
+    checkpoints = []
+
+    for i in range(scan_count):
+        # Mostly repeat scans from regulars, a lot of one-off visitor cards.
+        if random.random() < 0.3:
+            uid = random.choice(regular_uids)
+        else:
+            uid = f"{random.getrandbits(56):014x}"
+
+        # A scan every 0-20 ms of simulated time, much busier than real life.
+        now += random.random() * 0.02
+        table.should_accept(uid, now)
+
+        if (i + 1) % (scan_count // 10) == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            checkpoints.append(current)
+            print(
+                f"{i + 1} scans, {len(table)} keys, "
+                f"{current / 1024:.1f} KiB traced"
+            )
+
+    tracemalloc.stop()
+
+    assert len(table) <= max_size
+    # Allow some noise from the allocator, growth would be many times this.
+    assert max(checkpoints[1:]) < checkpoints[1] * 1.1 + 64 * 1024
+    print("Memory stayed flat.")
+
+
+if __name__ == "__main__":
+    soak_test()
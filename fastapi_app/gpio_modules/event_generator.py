@@ -1,5 +1,7 @@
 import asyncio
+import os
 import queue
+import sys
 import threading
 from contextlib import asynccontextmanager, contextmanager
 from typing import (
@@ -7,10 +9,16 @@ from typing import (
     Callable,
     Generator,
     Generic,
+    Hashable,
     Self,
     TypeVar,
 )
 
+# Add current script folder to Python path.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conflating_queue import ConflatingQueue
+
 # Generic event type
 T = TypeVar("T")
 
@@ -21,11 +29,24 @@ class SingleSourceEventGenerator(Generic[T]):
         setup_queue: Callable[[queue.Queue[T]], None],
         cleanup: Callable[[], None],
         queue_size: int = 0,
+        conflate: bool = False,
+        conflate_key: Callable[[T], Hashable] | None = None,
     ):
+        """
+        With conflate, only the latest event (of every conflate_key) is kept
+        until it is taken, for continuous measurements. queue_size is then
+        ignored.
+        """
         self._setup_queue = setup_queue
         self._cleanup = cleanup
-
-        self._event_queue: queue.Queue[T] = queue.Queue(queue_size)
+        self._conflate = conflate
+        self._conflate_key = conflate_key
+
+        self._event_queue: queue.Queue[T] | ConflatingQueue[T] = (
+            ConflatingQueue(conflate_key)
+            if conflate
+            else queue.Queue(queue_size)
+        )
         self._lock = threading.Lock()
         self._async_lock = asyncio.Lock()
         self._generator_stopping = False
@@ -37,7 +58,7 @@ class SingleSourceEventGenerator(Generic[T]):
         if self._lock.locked() and not self._generator_stopping:
             self._generator_stopping = True
             self._cleanup()
-            self._clear_queue()
+            # Pending events are still delivered before the stop signal.
             self._event_queue.put_nowait(None)
             self._event_queue.join()
             self._generator_stopping = False
@@ -72,6 +93,30 @@ class SingleSourceEventGenerator(Generic[T]):
                 self._cleanup()
                 self._clear_queue()
 
+    def _take_latest(
+        self, first_event: T | None, async_event_queue: asyncio.Queue
+    ) -> list[T | None]:
+        # The consumer fell behind if more events are waiting, skip to the
+        # latest one of every key.
+        latest: dict[Hashable, T] = {}
+        event = first_event
+        while event is not None:
+            key = (
+                self._conflate_key(event)
+                if self._conflate_key is not None
+                else None
+            )
+            latest[key] = event
+
+            if async_event_queue.empty():
+                return list(latest.values())
+
+            event = async_event_queue.get_nowait()
+            async_event_queue.task_done()
+
+        # End of stream after the latest events.
+        return [*latest.values(), None]
+
     async def async_wait_event(self) -> AsyncGenerator[T, None]:
         loop = asyncio.get_event_loop()
         async_event_queue = asyncio.Queue()
@@ -112,9 +157,20 @@ class SingleSourceEventGenerator(Generic[T]):
             try:
                 while True:
                     async with _get_event() as async_event:
+                        if self._conflate:
+                            async_events = self._take_latest(
+                                async_event, async_event_queue
+                            )
+                        else:
+                            async_events = [async_event]
+
+                        for async_event in async_events:
+                            if async_event is None:
+                                break
+                            yield async_event
+
                         if async_event is None:
                             break
-                        yield async_event
 
             # except BaseException as e:
             #     match e:
@@ -1,12 +1,23 @@
+import os
 import re
+import sys
 import threading
 import time
+from concurrent.futures import Future
 from itertools import chain
-from typing import Final
+from typing import Callable, Final
 
 from more_itertools import batched
 from RPLCD.i2c import CharLCD
 
+# Add current script folder to Python path.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from common import SIMULATE_HARDWARE
+from priority_lane_queue import LaneConfig, OverflowPolicy, RequestPriority
+from request_queued_thread import RequestQueuedThread
+from simulation import SimulatedCharLCD
+
 
 class StringObject:
     def __init__(self, content: str):
@@ -86,17 +97,51 @@ class TextWrapper:
         return [line.rstrip() for line in lines]
 
 
+class LcdWriteRequest:
+    def __init__(self, lines: list[str], clear: bool = True):
+        self.lines = lines
+        self.clear = clear
+
+
 class LcdI2c:
     MAX_LINE_LENGTH: Final = 20
     MAX_LINE_COUNT: Final = 4
 
-    def __init__(self, i2c_bus, i2c_addr=0x27):
+    def __init__(
+        self,
+        i2c_bus,
+        i2c_addr=0x27,
+        on_write: Callable[[list[str]], None] | None = None,
+    ):
         self._i2c_bus = i2c_bus
         self._i2c_addr = i2c_addr
+        # Called with the lines once they are on the screen.
+        self._on_write = on_write
         self._lcd = self._init_lcd()
 
         self._text_wrapper = TextWrapper(self.MAX_LINE_LENGTH)
         self._write_lock = threading.Lock()
+        self._write_queued_thread = self._setup_queued_thread()
+
+    def _setup_queued_thread(self) -> RequestQueuedThread:
+        def _serve_request(
+            request: LcdWriteRequest, next_request_available: bool
+        ):
+            self._write_lines(request.lines, request.clear)
+
+        def _cleanup():
+            pass
+
+        # Only the newest text matters, it replaces a pending one.
+        return RequestQueuedThread(
+            _serve_request,
+            _cleanup,
+            lanes={
+                RequestPriority.NORMAL: LaneConfig(
+                    1, OverflowPolicy.REPLACE_PENDING
+                )
+            },
+        )
 
     def __enter__(self):
         return self
@@ -105,6 +150,9 @@ class LcdI2c:
         self.close()
 
     def _init_lcd(self):
+        if SIMULATE_HARDWARE:
+            return SimulatedCharLCD()
+
         attempts = 0
         while True:
             try:
@@ -125,42 +173,45 @@ class LcdI2c:
         return lcd
 
     def close(self):
+        self._write_queued_thread.close()
         self._lcd.close()
 
     def clear(self):
         self._lcd.clear()
 
-    def write_string(self, text: str, clear=True):
+    def _wrap_text(self, text: str) -> list[str]:
+        lines = text.rstrip().split("\n")
+        lines = list(
+            chain.from_iterable(
+                [
+                    self._text_wrapper.wrap(line) if line != "" else [""]
+                    for line in lines
+                ]
+            )
+        )
+
+        if len(lines) > self.MAX_LINE_COUNT:
+            raise ValueError(
+                f"Number of lines is greater than {self.MAX_LINE_COUNT}: "
+                f"{lines}"
+            )
+
+        return lines
+
+    def _write_lines(self, lines: list[str], clear=True):
         attempts = 0
         with self._write_lock:
             while True:
                 try:
-                    lines = text.rstrip().split("\n")
-                    lines = list(
-                        chain.from_iterable(
-                            [
-                                self._text_wrapper.wrap(line)
-                                if line != ""
-                                else [""]
-                                for line in lines
-                            ]
-                        )
-                    )
-
                     if clear:
                         self.clear()
 
                     print(f"Sending text to LCD: {lines}")
                     print("-" * self.MAX_LINE_LENGTH)
 
-                    for i, line in enumerate(lines):
+                    for line in lines:
                         print(line)
 
-                        if i >= self.MAX_LINE_COUNT:
-                            raise ValueError(
-                                f"Number of lines is greater than {self.MAX_LINE_COUNT}: {lines}"
-                            )
-
                         self._lcd.write_string(line)
                         self._lcd.crlf()
 
@@ -176,6 +227,21 @@ class LcdI2c:
                     )
                     self._lcd = self._init_lcd()
 
+            if self._on_write is not None:
+                self._on_write(lines)
+
+    def write_string(self, text: str, clear=True):
+        self._write_lines(self._wrap_text(text), clear)
+
+    def schedule_write(self, text: str, clear=True) -> Future[None]:
+        """
+        Write text from the LCD thread, for callers that must not block.
+        Raises ValueError right away if the text does not fit.
+        """
+        return self._write_queued_thread.schedule(
+            LcdWriteRequest(self._wrap_text(text), clear), block=False
+        )
+
 
 def run_example():
     def get_multiline_input() -> str:
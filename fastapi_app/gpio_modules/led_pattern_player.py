@@ -0,0 +1,217 @@
+import os
+import sys
+import threading
+import time
+from typing import Callable
+
+from adafruit_extended_bus import ExtendedI2C as I2C
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from leds import LedsPcf8574
+
+
+class LedPatternStep:
+    def __init__(self, byte: int, duration: float):
+        if duration < 0:
+            raise ValueError("duration must not be negative")
+
+        self.byte = byte
+        self.duration = duration
+
+
+class LedPattern:
+    def __init__(
+        self,
+        steps: list[LedPatternStep],
+        loop_count: int = 1,
+        priority: int = 0,
+        end_byte: int | None = None,
+    ):
+        """
+        A sequence of LED bytes, each shown for its step duration.
+
+        loop_count is the number of times the steps are played, 0 means loop
+        forever. When a finite pattern ends the LEDs keep showing the last
+        step, or end_byte if it is set.
+        """
+        if len(steps) == 0:
+            raise ValueError("steps must not be empty")
+        if loop_count < 0:
+            raise ValueError("loop_count must not be negative")
+        if loop_count == 0 and sum(step.duration for step in steps) <= 0:
+            raise ValueError("A looping pattern must have a total duration")
+
+        self.steps = steps
+        self.loop_count = loop_count
+        self.priority = priority
+        self.end_byte = end_byte
+
+    @classmethod
+    def static(cls, byte: int, priority: int = 0):
+        return cls([LedPatternStep(byte, 0)], priority=priority)
+
+
+class LedPatternPlayer:
+    """
+    Plays LedPatterns on a single timer thread, the thread sleeps until the
+    next step is due so an animation costs nothing between frames.
+    """
+
+    def __init__(
+        self,
+        leds: LedsPcf8574,
+        on_state_change: Callable[[LedPattern, bool], None] | None = None,
+    ):
+        self._leds = leds
+        # Called with the pattern and whether it is playing, when play()
+        # starts it and from the player thread when a finite pattern ends.
+        self._on_state_change = on_state_change
+
+        self._condition = threading.Condition()
+        self._pattern: LedPattern | None = None
+        # The pattern given to play(), _pattern may be its end_byte.
+        self._played_pattern: LedPattern | None = None
+        self._step_index = 0
+        self._loops_done = 0
+        self._next_step_time = 0.0
+        self._closing = False
+
+        self._player_thread = threading.Thread(target=self._thread)
+        self._player_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+
+        self._player_thread.join()
+
+    @property
+    def is_playing(self) -> bool:
+        return self._pattern is not None
+
+    def play(self, pattern: LedPattern, preempt=False) -> bool:
+        """
+        Start playing pattern, replacing the current one. If a pattern is
+        still playing and has a higher priority, the new pattern is rejected
+        and False is returned, unless preempt is True.
+        """
+        pattern_bytes = [step.byte for step in pattern.steps]
+        pattern_bytes.append(pattern.end_byte)
+
+        for byte in pattern_bytes:
+            if byte is not None and (byte < 0 or byte > self._leds.max_byte):
+                raise ValueError(
+                    f"byte must be between 0x00 and {hex(self._leds.max_byte)}"
+                )
+
+        with self._condition:
+            if (
+                not preempt
+                and self._pattern is not None
+                and pattern.priority < self._pattern.priority
+            ):
+                return False
+
+            self._pattern = pattern
+            self._played_pattern = pattern
+            self._step_index = 0
+            self._loops_done = 0
+            self._next_step_time = time.monotonic()
+            self._condition.notify()
+
+            self._report_state(pattern, True)
+
+        return True
+
+    def _report_state(self, pattern: LedPattern, playing: bool):
+        # Called with self._condition held, so reports keep their order.
+        if self._on_state_change is not None:
+            self._on_state_change(pattern, playing)
+
+    def _next_byte(self) -> int:
+        # Must be called with self._condition held, when a step is due.
+        pattern = self._pattern
+        step = pattern.steps[self._step_index]
+
+        # Schedule from the previous deadline instead of the current time, so
+        # long animations do not drift.
+        self._next_step_time += step.duration
+        self._step_index += 1
+
+        if self._step_index >= len(pattern.steps):
+            self._step_index = 0
+            self._loops_done += 1
+
+            is_finite = pattern.loop_count != 0
+            if is_finite and self._loops_done >= pattern.loop_count:
+                self._pattern = None
+
+                if pattern.end_byte is not None:
+                    # Show the last step for its full duration first.
+                    self._pattern = LedPattern.static(
+                        pattern.end_byte, pattern.priority
+                    )
+                else:
+                    # The LEDs keep showing this step from now on.
+                    self._report_state(self._played_pattern, False)
+
+        return step.byte
+
+    def _thread(self):
+        while True:
+            with self._condition:
+                while not self._closing:
+                    if self._pattern is None:
+                        self._condition.wait()
+                        continue
+
+                    timeout = self._next_step_time - time.monotonic()
+                    if timeout > 0:
+                        self._condition.wait(timeout)
+                        continue
+
+                    break
+
+                if self._closing:
+                    break
+
+                byte = self._next_byte()
+
+            self._leds.set_leds_byte(byte)
+
+
+def main():
+    with (
+        LedsPcf8574(I2C(7), reverse_layout=True, led_count=4) as leds,
+        LedPatternPlayer(leds) as player,
+    ):
+        print("Blinking for 5 seconds.")
+        player.play(
+            LedPattern(
+                [LedPatternStep(0b0100, 0.5), LedPatternStep(0, 0.5)],
+                loop_count=0,
+            )
+        )
+        time.sleep(5)
+
+        print("Flashing 3 times then hold.")
+        player.play(
+            LedPattern(
+                [LedPatternStep(0b0001, 0.15), LedPatternStep(0, 0.15)],
+                loop_count=3,
+                end_byte=0b0001,
+            )
+        )
+        time.sleep(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,32 @@
 import os
 import sys
+import threading
 import time
 
 from adafruit_extended_bus import ExtendedI2C as I2C
 from adafruit_pcf8574 import PCF8574
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import SIMULATE_HARDWARE
+from simulation import SimulatedPcf8574
+
+
+def _reverse_bits(n, length):
+    result = 0
+
+    for _ in range(length):
+        # Create space for the next bit.
+        result <<= 1
+        # Add the rightmost bit of n to result.
+        result |= n & 1
+        # Shift n to the right. So the next bit can be added.
+        n >>= 1
+
+    return result
+
+
+# Precomputed 8-bit reversal, indexed by the byte to reverse.
+REVERSED_BYTES = tuple(_reverse_bits(n, 8) for n in range(256))
 
 
 class LedsPcf8574:
@@ -27,6 +48,14 @@ class LedsPcf8574:
         self._address = address
         self.led_count = led_count
         self.reverse_layout = reverse_layout
+
+        # The last byte sent to the PCF8574, None if unknown.
+        self._last_written_byte: int | None = None
+        # The newest byte waiting to be written, see set_leds_byte().
+        self._pending_byte: int | None = None
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
         self._pcf = self._init_leds()
 
     def __enter__(self):
@@ -39,7 +68,10 @@ class LedsPcf8574:
         attempts = 0
         while True:
             try:
-                pcf = PCF8574(self._i2c, self._address)
+                if SIMULATE_HARDWARE:
+                    pcf = SimulatedPcf8574(self._i2c, self._address)
+                else:
+                    pcf = PCF8574(self._i2c, self._address)
 
                 # Init pins turn off be default. LEDs are active low so we set
                 # all of the pins high.
@@ -47,6 +79,7 @@ class LedsPcf8574:
                 # for i in range(8):
                 #     self._pcf.get_pin(i).switch_to_output(value=True)
                 pcf.write_gpio(0xFF)
+                self._last_written_byte = 0xFF
                 break
             except IOError as e:
                 attempts += 1
@@ -58,7 +91,9 @@ class LedsPcf8574:
 
     def close(self):
         # Turn off all LEDs.
-        self._pcf.write_gpio(0xFF)
+        with self._write_lock:
+            self._pcf.write_gpio(0xFF)
+            self._last_written_byte = 0xFF
 
     def set_led(self, led_id: int, state: bool):
         if led_id < 0 or led_id > self.led_count - 1:
@@ -66,30 +101,55 @@ class LedsPcf8574:
                 f"led_id must be between 0 and {self.led_count - 1}"
             )
 
-        self._pcf.write_pin(
-            led_id if not self.reverse_layout else 7 - led_id,
-            not state,
-        )
+        with self._write_lock:
+            self._pcf.write_pin(
+                led_id if not self.reverse_layout else 7 - led_id,
+                not state,
+            )
+            # write_pin() only touches one pin, we no longer know the full
+            # byte for sure.
+            self._last_written_byte = None
 
     def set_leds_byte(self, byte: int, reverse_byte=False):
-        attempts = 0
-        while True:
-            try:
-                if byte < 0 or byte > self.max_byte:
-                    raise ValueError(
-                        f"byte must be between 0x00 and {hex(self.max_byte)}"
-                    )
+        if byte < 0 or byte > self.max_byte:
+            raise ValueError(
+                f"byte must be between 0x00 and {hex(self.max_byte)}"
+            )
+
+        with self._pending_lock:
+            self._pending_byte = self._to_gpio_byte(byte, reverse_byte)
+
+        # Coalesce bursts: callers that pile up behind a slow I2C write will
+        # find that the first of them already wrote the newest pending byte.
+        with self._write_lock:
+            with self._pending_lock:
+                gpio_byte = self._pending_byte
+                self._pending_byte = None
+
+            if gpio_byte is None or gpio_byte == self._last_written_byte:
+                return
+
+            self._write_gpio_byte(gpio_byte)
+
+    def _to_gpio_byte(self, byte: int, reverse_byte: bool) -> int:
+        # Flip bits because LEDs are active low.
+        byte = ~byte & 0xFF
 
-                # Flip bits because LEDs are active low.
-                byte = ~byte & 0xFF
+        if reverse_byte:
+            # Same as reversing only the lowest led_count bits.
+            byte = REVERSED_BYTES[byte & self.max_byte] >> (8 - self.led_count)
 
-                if reverse_byte:
-                    byte = self._reverse_bits(byte, self.led_count)
+        if self.reverse_layout:
+            byte = REVERSED_BYTES[byte]
 
-                if self.reverse_layout:
-                    byte = self._reverse_bits(byte, 8)
+        return byte
 
-                self._pcf.write_gpio(byte)
+    def _write_gpio_byte(self, gpio_byte: int):
+        attempts = 0
+        while True:
+            try:
+                self._pcf.write_gpio(gpio_byte)
+                self._last_written_byte = gpio_byte
                 break
             except IOError as e:
                 attempts += 1
@@ -108,19 +168,6 @@ class LedsPcf8574:
         """
         return (1 << self.led_count) - 1
 
-    def _reverse_bits(self, n, length):
-        result = 0
-
-        for _ in range(length):
-            # Create space for the next bit.
-            result <<= 1
-            # Add the rightmost bit of n to result.
-            result |= n & 1
-            # Shift n to the right. So the next bit can be added.
-            n >>= 1
-
-        return result
-
 
 def main():
     with LedsPcf8574(I2C(7), reverse_layout=True, led_count=4) as led_ctl:
@@ -0,0 +1,497 @@
+import asyncio
+import os
+import random
+import sys
+import time
+from enum import Enum
+
+import serial
+
+_PREAMBLE = 0x00
+_STARTCODE2 = 0xFF
+_POSTAMBLE = 0x00
+
+_HOSTTOPN532 = 0xD4
+_PN532TOHOST = 0xD5
+_ERROR_FRAME_TFI = 0x7F
+
+_COMMAND_GETFIRMWAREVERSION = 0x02
+_COMMAND_SAMCONFIGURATION = 0x14
+_COMMAND_INDATAEXCHANGE = 0x40
+_COMMAND_INLISTPASSIVETARGET = 0x4A
+
+_MIFARE_ISO14443A = 0x00
+_MIFARE_CMD_READ = 0x30
+
+_ACK_FRAME = b"\x00\x00\xff\x00\xff\x00"
+_WAKEUP = b"\x55\x55" + b"\x00" * 15
+
+
+class Pn532TimeoutError(RuntimeError):
+    pass
+
+
+class Pn532FrameKind(Enum):
+    ACK = 0
+    NACK = 1
+    DATA = 2
+    ERROR = 3
+
+
+class Pn532Frame:
+    def __init__(self, kind: Pn532FrameKind, data: bytes = b""):
+        self.kind = kind
+        self.data = data
+
+
+class _ParserState(Enum):
+    START = 0
+    LENGTH = 1
+    LENGTH_CHECKSUM = 2
+    DATA = 3
+    DATA_CHECKSUM = 4
+
+
+def build_frame(data: bytes) -> bytes:
+    if not 0 < len(data) < 255:
+        raise ValueError("Frame data must be 1 to 254 bytes")
+
+    length = len(data)
+    return bytes(
+        [
+            _PREAMBLE,
+            _PREAMBLE,
+            _STARTCODE2,
+            length,
+            (~length + 1) & 0xFF,
+            *data,
+            (~sum(data) + 1) & 0xFF,
+            _POSTAMBLE,
+        ]
+    )
+
+
+class Pn532FrameParser:
+    """
+    Incremental parser for frames sent by the PN532, fed with whatever bytes
+    the UART had available.
+
+    It is a state machine that never raises on bad input: when a candidate
+    frame turns out to be invalid, parsing resumes right after the start code
+    that began it, so a frame that follows line noise is still found.
+    """
+
+    def __init__(self):
+        self.checksum_errors = 0
+        self._reset()
+
+    def reset(self):
+        """
+        Drop a partially parsed frame, e.g. before sending a new command.
+        """
+        self._reset()
+
+    def _reset(self):
+        self._state = _ParserState.START
+        self._previous_byte: int | None = None
+        self._length = 0
+        self._data = bytearray()
+        # Bytes after the start code of the current candidate frame, fed
+        # again if the candidate is invalid.
+        self._candidate = bytearray()
+
+    def feed(self, chunk: bytes) -> list[Pn532Frame]:
+        frames: list[Pn532Frame] = []
+        pending = bytearray(chunk)
+        i = 0
+
+        while i < len(pending):
+            byte = pending[i]
+            i += 1
+
+            rewind = self._step(byte, frames)
+            if rewind is not None:
+                self.checksum_errors += 1
+                pending[i:i] = rewind
+
+        return frames
+
+    def _step(self, byte: int, frames: list[Pn532Frame]) -> bytes | None:
+        """
+        Advance the state machine by one byte. Returns the bytes to parse
+        again if the current candidate frame turned out to be invalid.
+        """
+        if self._state == _ParserState.START:
+            if self._previous_byte == _PREAMBLE and byte == _STARTCODE2:
+                self._state = _ParserState.LENGTH
+                self._candidate.clear()
+
+            self._previous_byte = byte
+            return None
+
+        self._candidate.append(byte)
+
+        match self._state:
+            case _ParserState.LENGTH:
+                self._length = byte
+                self._state = _ParserState.LENGTH_CHECKSUM
+
+            case _ParserState.LENGTH_CHECKSUM:
+                if self._length == 0x00 and byte == 0xFF:
+                    frames.append(Pn532Frame(Pn532FrameKind.ACK))
+                    self._reset()
+                elif self._length == 0xFF and byte == 0x00:
+                    frames.append(Pn532Frame(Pn532FrameKind.NACK))
+                    self._reset()
+                elif self._length == 0 or (self._length + byte) & 0xFF != 0:
+                    # Data frames hold at least the TFI byte, a zero length
+                    # frame would wait for its data forever.
+                    return self._rewind()
+                else:
+                    self._data.clear()
+                    self._state = _ParserState.DATA
+
+            case _ParserState.DATA:
+                self._data.append(byte)
+                if len(self._data) == self._length:
+                    self._state = _ParserState.DATA_CHECKSUM
+
+            case _ParserState.DATA_CHECKSUM:
+                if (sum(self._data) + byte) & 0xFF != 0:
+                    return self._rewind()
+
+                data = bytes(self._data)
+                if data[0] == _ERROR_FRAME_TFI:
+                    frames.append(Pn532Frame(Pn532FrameKind.ERROR, data))
+                else:
+                    frames.append(Pn532Frame(Pn532FrameKind.DATA, data))
+
+                self._reset()
+
+        return None
+
+    def _rewind(self) -> bytes:
+        candidate = bytes(self._candidate)
+        self._reset()
+        return candidate
+
+
+class AsyncPn532Uart:
+    """
+    PN532 over UART driven by the asyncio event loop: the serial port is
+    non-blocking and registered with loop.add_reader(), so waiting for a
+    card costs no thread and no polling.
+
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, port: str = "/dev/ttyAMA0", baudrate: int = 115200):
+        # pyserial is only used to open and configure the port.
+        self._serial = serial.Serial(port, baudrate=baudrate, timeout=0)
+        self._fd = self._serial.fileno()
+        os.set_blocking(self._fd, False)
+
+        self._parser = Pn532FrameParser()
+        self._frames: asyncio.Queue[Pn532Frame] = asyncio.Queue()
+        self._command_lock = asyncio.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _attach(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self._fd, self._on_readable)
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+
+        self._serial.close()
+
+    def _on_readable(self):
+        try:
+            chunk = os.read(self._fd, 256)
+        except BlockingIOError:
+            return
+
+        for frame in self._parser.feed(chunk):
+            self._frames.put_nowait(frame)
+
+    def _write(self, data: bytes):
+        # Frames are tiny, the kernel buffer always has room for them.
+        os.write(self._fd, data)
+
+    def _drain_frames(self):
+        self._parser.reset()
+        while not self._frames.empty():
+            self._frames.get_nowait()
+
+    async def _read_frame(self, timeout: float | None) -> Pn532Frame:
+        try:
+            return await asyncio.wait_for(self._frames.get(), timeout)
+        except asyncio.TimeoutError:
+            raise Pn532TimeoutError("Timed out waiting for PN532") from None
+
+    async def _send_command(
+        self, command: int, params: bytes = b"", timeout: float = 1
+    ):
+        self._attach()
+        self._drain_frames()
+        self._write(build_frame(bytes([_HOSTTOPN532, command, *params])))
+
+        frame = await self._read_frame(timeout)
+        if frame.kind != Pn532FrameKind.ACK:
+            raise RuntimeError("Did not receive expected ACK from PN532!")
+
+    async def _read_response(
+        self, command: int, timeout: float | None = 1
+    ) -> bytes:
+        frame = await self._read_frame(timeout)
+
+        if frame.kind == Pn532FrameKind.ERROR:
+            raise RuntimeError("PN532 returned an error frame")
+        if frame.kind != Pn532FrameKind.DATA or frame.data[:2] != bytes(
+            [_PN532TOHOST, command + 1]
+        ):
+            raise RuntimeError("Received unexpected command response!")
+
+        return frame.data[2:]
+
+    async def call_function(
+        self, command: int, params: bytes = b"", timeout: float = 1
+    ) -> bytes:
+        async with self._command_lock:
+            await self._send_command(command, params, timeout)
+            return await self._read_response(command, timeout)
+
+    async def wakeup(self):
+        self._attach()
+        self._write(_WAKEUP)
+        await self.sam_configuration()
+
+    async def firmware_version(self) -> tuple[int, int, int, int]:
+        response = await self.call_function(
+            _COMMAND_GETFIRMWAREVERSION, timeout=0.5
+        )
+        return tuple(response[:4])
+
+    async def sam_configuration(self):
+        # Normal mode, 1 second virtual card timeout, use IRQ pin.
+        await self.call_function(
+            _COMMAND_SAMCONFIGURATION, bytes([0x01, 0x14, 0x01])
+        )
+
+    async def read_passive_target(
+        self, timeout: float | None = None
+    ) -> bytes | None:
+        """
+        Wait for a card and return its UID, or None after timeout seconds.
+        With no timeout the PN532 keeps listening until a card shows up.
+        """
+        async with self._command_lock:
+            await self._send_command(
+                _COMMAND_INLISTPASSIVETARGET,
+                bytes([0x01, _MIFARE_ISO14443A]),
+            )
+
+            try:
+                response = await self._read_response(
+                    _COMMAND_INLISTPASSIVETARGET, timeout
+                )
+            except Pn532TimeoutError:
+                # Sending an ACK aborts the pending command on the PN532.
+                self._write(_ACK_FRAME)
+                if self._frames.empty():
+                    return None
+                raise
+            except BaseException:
+                # Also on cancellation, which must still end the caller.
+                self._write(_ACK_FRAME)
+                raise
+
+        if response[0] != 0x01:
+            raise RuntimeError("More than one card detected!")
+        if response[5] > 7:
+            raise RuntimeError("Found card with unexpectedly long UID!")
+
+        return response[6 : 6 + response[5]]
+
+    async def in_data_exchange(self, data: bytes) -> bytes | None:
+        """
+        Send data to the selected card, returns its answer or None if the
+        card reported an error.
+        """
+        response = await self.call_function(
+            _COMMAND_INDATAEXCHANGE, bytes([0x01, *data])
+        )
+        if response[0] & 0x3F != 0x00:
+            return None
+
+        return response[1:]
+
+    async def mifare_classic_authenticate_block(
+        self, uid: bytes, block_number: int, key_number: int, key: bytes
+    ) -> bool:
+        response = await self.in_data_exchange(
+            bytes([key_number, block_number & 0xFF, *key, *uid])
+        )
+        return response is not None
+
+    async def mifare_classic_read_block(
+        self, block_number: int
+    ) -> bytes | None:
+        return await self.in_data_exchange(
+            bytes([_MIFARE_CMD_READ, block_number & 0xFF])
+        )
+
+
+def _sample_response_stream(frame_count: int) -> tuple[bytes, list[bytes]]:
+    """
+    Byte stream shaped like a PN532 UART recording: an ACK followed by an
+    InListPassiveTarget response for each card, with the occasional error
+    frame.
+    """
+    stream = bytearray()
+    frames = []
+
+    for _ in range(frame_count):
+        stream += _ACK_FRAME
+
+        if random.random() < 0.05:
+            data = bytes([_ERROR_FRAME_TFI, 0x81])
+        else:
+            uid = random.randbytes(random.choice([4, 7]))
+            data = bytes(
+                [_PN532TOHOST, _COMMAND_INLISTPASSIVETARGET + 1, 0x01, 0x01]
+                + [0x00, 0x04, 0x08, len(uid)]
+            ) + uid
+
+        stream += build_frame(data)
+        frames.append(data)
+
+    return bytes(stream), frames
+
+
+def _chunked(stream: bytes, max_chunk_size: int = 32) -> list[bytes]:
+    # UART reads return whatever arrived so far, split it the same way.
+    chunks = []
+    i = 0
+    while i < len(stream):
+        size = random.randint(1, max_chunk_size)
+        chunks.append(stream[i : i + size])
+        i += size
+
+    return chunks
+
+
+def _noise() -> bytes:
+    noise = random.randbytes(random.randint(0, 40))
+    if random.random() < 0.2:
+        # Zero length frame, passes the length checksum.
+        i = random.randint(0, len(noise))
+        noise = noise[:i] + b"\x00\x00\xff\x00\x00" + noise[i:]
+
+    return noise
+
+
+def fuzz_parser(iterations: int = 20_000):
+    """
+    Feed valid frames surrounded by random noise, in random chunk sizes, and
+    check the parser never raises, finds every frame and recovers for the
+    next valid frame, unless noise formed a valid-looking frame that
+    swallowed them.
+    """
+    # Longer than the longest frame, completes any candidate frame left
+    # open by the noise.
+    padding = b"\x00" * 262
+    sentinel = bytes([_PN532TOHOST, _COMMAND_GETFIRMWAREVERSION + 1, 1, 2])
+    swallowed_streams = 0
+
+    for _ in range(iterations):
+        stream, expected = _sample_response_stream(random.randint(1, 3))
+        expected.append(sentinel)
+
+        parser = Pn532FrameParser()
+        parsed = []
+        for chunk in _chunked(
+            _noise() + stream + _noise() + build_frame(sentinel) + padding,
+            16,
+        ):
+            parsed.extend(parser.feed(chunk))
+
+        parsed_data = [
+            frame.data
+            for frame in parsed
+            if frame.kind in (Pn532FrameKind.DATA, Pn532FrameKind.ERROR)
+        ]
+        missing = [data for data in expected if data not in parsed_data]
+        spurious = [data for data in parsed_data if data not in expected]
+
+        if spurious:
+            swallowed_streams += 1
+            continue
+
+        assert not missing, f"Parser lost {missing}"
+        assert parsed_data[-1] == sentinel, "Parser did not recover"
+
+    print(
+        f"{iterations} streams, {swallowed_streams} with frames swallowed "
+        f"by a noise frame"
+    )
+    print("Parser recovered every frame not overlapped by a noise frame.")
+
+
+def benchmark_parser(recording_path: str | None = None):
+    """
+    Measure parser throughput on a recorded UART byte stream, or on a
+    generated one if no recording is given.
+    """
+    if recording_path is not None:
+        with open(recording_path, "rb") as recording:
+            stream = recording.read()
+    else:
+        stream, _ = _sample_response_stream(20_000)
+
+    chunks = _chunked(stream)
+    parser = Pn532FrameParser()
+
+    start = time.perf_counter()
+    frame_count = 0
+    for chunk in chunks:
+        frame_count += len(parser.feed(chunk))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(stream)} bytes, {frame_count} frames in {elapsed:.3f} s: "
+        f"{len(stream) / elapsed / 1024:.0f} KiB/s, "
+        f"{frame_count / elapsed:.0f} frames/s, "
+        f"{parser.checksum_errors} checksum errors"
+    )
+
+
+async def async_main():
+    pn532 = AsyncPn532Uart()
+    await pn532.wakeup()
+
+    ic, ver, rev, support = await pn532.firmware_version()
+    print("Found PN532 with firmware version: {0}.{1}".format(ver, rev))
+
+    print("Waiting for RFID/NFC card")
+    while True:
+        uid = await pn532.read_passive_target()
+        print("Card: ", uid.hex())
+
+
+if __name__ == "__main__":
+    test = 2
+
+    match test:
+        case 1:
+            print("Running async_main()")
+            asyncio.run(async_main())
+        case 2:
+            print("Running fuzz_parser()")
+            fuzz_parser()
+        case 3:
+            print("Running benchmark_parser()")
+            benchmark_parser(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+from collections import deque
+from enum import Enum, IntEnum
+from typing import Generic, TypeVar
+
+# Generic item type
+T = TypeVar("T")
+
+
+class RequestPriority(IntEnum):
+    # Cosmetic, e.g. a beep. Shed first.
+    LOW = 0
+    NORMAL = 1
+    # Safety related, e.g. closing the gate. Should never be rejected.
+    CRITICAL = 2
+
+
+class OverflowPolicy(Enum):
+    # Raise queue.Full, or wait for room if blocking.
+    REJECT = "reject"
+    # Drop the oldest pending item of the lane to make room.
+    DROP_OLDEST = "drop_oldest"
+    # The new item takes the place of the newest pending item of the lane.
+    REPLACE_PENDING = "replace_pending"
+
+
+class LaneConfig:
+    def __init__(
+        self,
+        capacity: int,
+        overflow_policy: OverflowPolicy = OverflowPolicy.REJECT,
+    ):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+
+
+def default_lanes(capacity: int) -> dict[RequestPriority, LaneConfig]:
+    """
+    Same capacity for every lane, critical items push out the oldest pending
+    critical item instead of being rejected.
+    """
+    return {
+        RequestPriority.LOW: LaneConfig(capacity),
+        RequestPriority.NORMAL: LaneConfig(capacity),
+        RequestPriority.CRITICAL: LaneConfig(
+            capacity, OverflowPolicy.DROP_OLDEST
+        ),
+    }
+
+
+class PriorityLaneQueue(Generic[T]):
+    """
+    Queue with one bounded FIFO lane per priority. get() always takes from
+    the highest priority lane that has items, and each lane handles being
+    full with its own overflow policy.
+
+    Follows the queue.Queue interface, including task_done() and join().
+    """
+
+    def __init__(self, lanes: dict[RequestPriority, LaneConfig]):
+        self._lane_configs = {
+            priority: lanes.get(priority, LaneConfig(1))
+            for priority in RequestPriority
+        }
+        # Highest priority first
+        self._lanes: dict[RequestPriority, deque[T]] = {
+            priority: deque()
+            for priority in sorted(RequestPriority, reverse=True)
+        }
+
+        self._closed = False
+        self._unfinished_tasks = 0
+        self.dropped_count = 0
+
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._not_full = threading.Condition(self._mutex)
+        self._all_tasks_done = threading.Condition(self._mutex)
+
+    def qsize(self) -> int:
+        with self._mutex:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def put(
+        self,
+        item: T,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        block: bool = True,
+        timeout: float | None = None,
+    ) -> list[T]:
+        """
+        Add item to the lane of priority. Returns the pending items the
+        overflow policy dropped to make room, if any.
+        """
+        lane = self._lanes[priority]
+        config = self._lane_configs[priority]
+        dropped = []
+
+        with self._not_full:
+            if len(lane) >= config.capacity:
+                match config.overflow_policy:
+                    case OverflowPolicy.REJECT:
+                        self._wait_for_room(lane, config, block, timeout)
+                    case OverflowPolicy.DROP_OLDEST:
+                        dropped.append(lane.popleft())
+                    case OverflowPolicy.REPLACE_PENDING:
+                        dropped.append(lane.pop())
+
+            # Dropped items will never be served.
+            self._unfinished_tasks -= len(dropped)
+            self.dropped_count += len(dropped)
+
+            lane.append(item)
+            self._unfinished_tasks += 1
+            self._not_empty.notify()
+
+        return dropped
+
+    def _wait_for_room(
+        self,
+        lane: deque[T],
+        config: LaneConfig,
+        block: bool,
+        timeout: float | None,
+    ):
+        # Must be called with self._mutex held.
+        if not block:
+            raise queue.Full
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(lane) >= config.capacity:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Full
+
+            self._not_full.wait(remaining)
+
+    def get(self) -> T | None:
+        """
+        Wait for the next item, highest priority first. Returns None once the
+        queue is closed and empty.
+        """
+        with self._not_empty:
+            while True:
+                for lane in self._lanes.values():
+                    if lane:
+                        item = lane.popleft()
+                        self._not_full.notify_all()
+                        return item
+
+                if self._closed:
+                    return None
+
+                self._not_empty.wait()
+
+    def task_done(self):
+        with self._all_tasks_done:
+            self._unfinished_tasks -= 1
+            if self._unfinished_tasks <= 0:
+                self._all_tasks_done.notify_all()
+
+    def join(self):
+        with self._all_tasks_done:
+            while self._unfinished_tasks > 0:
+                self._all_tasks_done.wait()
+
+    def clear(self) -> list[T]:
+        """
+        Remove and return all pending items.
+        """
+        with self._mutex:
+            cleared = []
+            for lane in self._lanes.values():
+                cleared.extend(lane)
+                lane.clear()
+
+            self._unfinished_tasks -= len(cleared)
+            self._all_tasks_done.notify_all()
+            self._not_full.notify_all()
+
+        return cleared
+
+    def close(self):
+        """
+        Make get() return None once the pending items are taken.
+        """
+        with self._mutex:
+            self._closed = True
+            self._not_empty.notify_all()
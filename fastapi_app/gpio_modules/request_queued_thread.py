@@ -1,27 +1,51 @@
-import queue
+import os
+import sys
 import threading
-from contextlib import contextmanager
+from concurrent.futures import Future
 from typing import (
     Callable,
     Generic,
     TypeVar,
 )
 
+# Add current script folder to Python path.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from priority_lane_queue import (
+    LaneConfig,
+    PriorityLaneQueue,
+    RequestPriority,
+    default_lanes,
+)
+
 # Generic request type
 T = TypeVar("T")
 
 
+class _QueuedRequest(Generic[T]):
+    def __init__(self, request: T):
+        self.request = request
+        self.future: Future[None] = Future()
+
+
 class RequestQueuedThread(Generic[T]):
     def __init__(
         self,
         serve_request: Callable[[T, bool], None],
         cleanup: Callable[[], None],
         queue_size: int = 0,
+        lanes: dict[RequestPriority, LaneConfig] | None = None,
     ):
         self._serve_request = serve_request
         self._cleanup = cleanup
 
-        self._queue: queue.Queue[T] = queue.Queue(queue_size)
+        if lanes is None:
+            # queue_size 0 used to mean unbounded.
+            lanes = default_lanes(queue_size or sys.maxsize)
+
+        self._queue: PriorityLaneQueue[_QueuedRequest[T]] = PriorityLaneQueue(
+            lanes
+        )
         self._buzzer_thread = threading.Thread(
             target=self._thread,
             # args=(self._queue, self._serve_request, self._cleanup),
@@ -34,23 +58,34 @@ class RequestQueuedThread(Generic[T]):
         # serve_request: Callable[[T], None],
         # cleanup: Callable[[], None],
     ):
-        @contextmanager
-        def _get_request():
-            request = self._queue.get()
-            yield request
-            self._queue.task_done()
-
         try:
             while True:
-                with _get_request() as request:
-                    if request is None:
-                        break
+                queued_request = self._queue.get()
+                if queued_request is None:
+                    break
 
-                    self._serve_request(request, self._queue.qsize() != 0)
+                try:
+                    # Skip requests cancelled while they were queued.
+                    if queued_request.future.set_running_or_notify_cancel():
+                        self._serve_queued_request(queued_request)
+                finally:
+                    self._queue.task_done()
         finally:
             self._cleanup()
             self._clear_queue()
 
+    def _serve_queued_request(self, queued_request: _QueuedRequest[T]):
+        try:
+            self._serve_request(
+                queued_request.request, self._queue.qsize() != 0
+            )
+        except Exception as e:
+            print(e)
+            print("Failed to serve request, continuing with the next one")
+            queued_request.future.set_exception(e)
+        else:
+            queued_request.future.set_result(None)
+
     def __enter__(self):
         return self
 
@@ -60,21 +95,40 @@ class RequestQueuedThread(Generic[T]):
     def close(self):
         try:
             self._clear_queue()
-            self._queue.put_nowait(None)
+            self._queue.close()
             self._buzzer_thread.join()
         finally:
             self._cleanup()
 
     def _clear_queue(self):
-        while not self._queue.empty():
-            self._queue.get_nowait()
-            self._queue.task_done()
+        for queued_request in self._queue.clear():
+            queued_request.future.cancel()
 
-    def schedule(self, request: T, block=True):
+    def schedule(
+        self,
+        request: T,
+        block=True,
+        priority: RequestPriority = RequestPriority.NORMAL,
+    ) -> Future[None]:
+        """
+        Queue request in the lane of priority. Raises queue.Full if that lane
+        is full, its overflow policy is to reject and block is False.
+
+        The returned future completes when the request was served, holds its
+        exception if serving it failed, and is cancelled if the request was
+        dropped before being served. Cancelling it skips the request if it
+        has not started yet.
+        """
         if request is None:
             raise ValueError("Request cannot be None")
 
-        self._queue.put(request, block=block)
+        queued_request = _QueuedRequest(request)
+        for dropped_request in self._queue.put(
+            queued_request, priority, block=block
+        ):
+            dropped_request.future.cancel()
+
+        return queued_request.future
 
     # Use this if you put a bunch of requests in the queue and want to wait for
     # all of them to finish.
@@ -2,103 +2,349 @@ import asyncio
 import contextlib
 import os
 import queue
+import random
+import selectors
 import sys
 import threading
 import time
-from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Callable
+from typing import AsyncGenerator, Callable
 
 import serial
+from adafruit_pn532.adafruit_pn532 import PN532
 from adafruit_pn532.uart import PN532_UART
 from gpiozero.tones import Tone
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from buzzer import Buzzer, BuzzerPlayRequest
+from card_data import (
+    CardData,
+    CardDataCache,
+    CardReadConfig,
+    async_read_card_data,
+    read_card_data,
+)
+from debounce_table import ExpiringDebounceTable
 from event_generator import SingleSourceEventGenerator
+from pn532_async import AsyncPn532Uart
+from priority_lane_queue import RequestPriority
 
 
-class RfidModule:
-    def __init__(self, buzzer: Buzzer | None = None):
-        self._buzzer = buzzer
+def create_uart_pn532(port: str = "/dev/ttyAMA0") -> PN532:
+    uart = serial.Serial(port, baudrate=115200, timeout=0.1)
+    return PN532_UART(uart, debug=False)
 
-        self._event_thread: threading.Thread | None = None
-        self._stop_event_flag = threading.Event()
 
-        self._event_generator = self._setup_event_generator()
+def create_i2c_pn532(i2c_bus: int) -> PN532:
+    from adafruit_extended_bus import ExtendedI2C as I2C
+    from adafruit_pn532.i2c import PN532_I2C
+
+    return PN532_I2C(I2C(i2c_bus), debug=False)
+
+
+def create_spi_pn532(cs_pin: int) -> PN532:
+    import board
+    import busio
+    from adafruit_pn532.spi import PN532_SPI
+    from digitalio import DigitalInOut
+
+    spi = busio.SPI(board.SCK, board.MOSI, board.MISO)
+    cs = DigitalInOut(getattr(board, f"D{cs_pin}"))
+    return PN532_SPI(spi, cs, debug=False)
+
+
+def _beep_scan(buzzer: Buzzer):
+    # Only feedback, skipped rather than waited for when the buzzer is busy.
+    # This also never blocks the event loop.
+    with contextlib.suppress(queue.Full):
+        buzzer.schedule(
+            BuzzerPlayRequest(Tone(frequency=800), duration=0.1),
+            block=False,
+            priority=RequestPriority.LOW,
+        )
+
+
+class RfidScan:
+    def __init__(
+        self, reader: str, uid: str, card_data: CardData | None = None
+    ):
+        self.reader = reader
+        self.uid = uid
+        # Only read if the module has a CardReadConfig.
+        self.card_data = card_data
+
+
+class RfidReader:
+    def __init__(self, name: str, pn532_factory: Callable[[], PN532]):
+        self.name = name
+        self._pn532_factory = pn532_factory
+
+        # Whether an InListPassiveTarget command is pending on the PN532.
+        self.is_listening = False
 
         self._pn532 = self._init_pn532()
         ic, ver, rev, support = self._pn532.firmware_version
-        print("Found PN532 with firmware version: {0}.{1}".format(ver, rev))
+        print(
+            "Found PN532 '{0}' with firmware version: {1}.{2}".format(
+                name, ver, rev
+            )
+        )
 
-    def _init_pn532(self) -> PN532_UART:
+    def _init_pn532(self) -> PN532:
         attempts = 0
         while True:
             try:
-                uart = serial.Serial(
-                    "/dev/ttyAMA0", baudrate=115200, timeout=0.1
-                )
-                pn532 = PN532_UART(uart, debug=False)
+                pn532 = self._pn532_factory()
                 pn532.SAM_configuration()
                 break
             except RuntimeError as e:
                 attempts += 1
 
                 print(e)
-                print(f"Failed to init PN532, retrying... (attempt {attempts})")
+                print(
+                    f"Failed to init PN532 '{self.name}', retrying... "
+                    f"(attempt {attempts})"
+                )
 
         return pn532
 
-    def _read_uid(self) -> str | None:
+    def fileno(self) -> int | None:
+        """
+        File descriptor that becomes readable when the PN532 answers, None if
+        the bus has no such thing (I2C, SPI) and the reader must be polled.
+        """
+        # PN532_UART keeps its serial port in _uart.
+        uart = getattr(self._pn532, "_uart", self._pn532)
+        try:
+            return uart.fileno()
+        except AttributeError:
+            return None
+
+    def poll_uid(self, timeout: float) -> str | None:
+        """
+        Check for a card, sending InListPassiveTarget first if none is
+        pending on the PN532.
+        """
         attempts = 0
         while True:
             try:
-                uid = self._pn532.read_passive_target(timeout=0.5)
+                if not self.is_listening:
+                    self._pn532.listen_for_passive_target(timeout=0.5)
+                    self.is_listening = True
+
+                uid = self._pn532.get_passive_target(timeout=timeout)
                 break
             except RuntimeError as e:
                 attempts += 1
+                self.is_listening = False
 
                 print(e)
-                print(f"Failed to read PN532, reinit... (attempt {attempts})")
+                print(
+                    f"Failed to read PN532 '{self.name}', reinit... "
+                    f"(attempt {attempts})"
+                )
                 self._pn532 = self._init_pn532()
 
         if uid is None:
             return None
 
+        # A found card ends the InListPassiveTarget command.
+        self.is_listening = False
         return "".join(f"{x:02x}" for x in uid)
 
-    def _setup_event_generator(self) -> SingleSourceEventGenerator[str]:
+    def read_card_data(
+        self, uid: str, config: CardReadConfig
+    ) -> CardData | None:
+        """
+        Read the data of the card poll_uid() just returned, None if the read
+        failed, e.g. because the card already left.
+        """
+        try:
+            return read_card_data(self._pn532, bytes.fromhex(uid), config)
+        except RuntimeError as e:
+            print(e)
+            print(f"Failed to read card data on PN532 '{self.name}'")
+            return None
+
+
+class RfidModule:
+    # Poll timeout while a card was seen recently or a vehicle is near.
+    ACTIVE_POLL_TIMEOUT = 0.02
+    # Sleep between polls of I2C/SPI readers while idle. The PN532 keeps
+    # listening for cards on its own, so this only delays noticing its
+    # answer. UART readers are woken up by their file descriptor instead.
+    IDLE_POLL_INTERVAL = 0.25
+
+    def __init__(
+        self,
+        readers: list[RfidReader] | None = None,
+        buzzer: Buzzer | None = None,
+        active_time: float = 5,
+        debounce_time: float = 0.5,
+        debounce_table_size: int = 1024,
+        card_read_config: CardReadConfig | None = None,
+        card_data_ttl: float = 60,
+    ):
+        if readers is None:
+            readers = [RfidReader("main", create_uart_pn532)]
+        if len({reader.name for reader in readers}) != len(readers):
+            raise ValueError("Reader names must be unique")
+
+        self._readers = {reader.name: reader for reader in readers}
+        self._buzzer = buzzer
+        self._active_time = active_time
+
+        self._card_read_config = card_read_config
+        # Authenticated block reads are slow, a card presented again soon
+        # after gets the data read the first time.
+        self._card_data_cache = CardDataCache(card_data_ttl)
+
+        # The same card is debounced separately on each reader.
+        self._debounce_tables = {
+            reader.name: ExpiringDebounceTable(
+                debounce_time, debounce_table_size
+            )
+            for reader in readers
+        }
+
+        self._event_thread: threading.Thread | None = None
+        self._stop_event_flag = threading.Event()
+
+        # Written to by wake() and cleanup to interrupt the select() call.
+        self._wake_read_fd, self._wake_write_fd = os.pipe()
+        os.set_blocking(self._wake_read_fd, False)
+        os.set_blocking(self._wake_write_fd, False)
+        self._last_activity_time = 0.0
+
+        self._event_generator = self._setup_event_generator()
+
+    @property
+    def reader_names(self) -> list[str]:
+        return list(self._readers)
+
+    def set_debounce_time(self, uid: str, debounce_time: float | None):
+        """
+        Override the debounce time of one card, None to use the default.
+        """
+        for debounce_table in self._debounce_tables.values():
+            debounce_table.set_window(uid, debounce_time)
+
+    def wake(self):
+        """
+        Switch to fast polling, e.g. because a vehicle is approaching.
+        """
+        self._last_activity_time = time.monotonic()
+        self._interrupt_select()
+
+    @property
+    def is_active(self) -> bool:
+        return (
+            time.monotonic() - self._last_activity_time
+        ) < self._active_time
+
+    def _interrupt_select(self):
+        with contextlib.suppress(BlockingIOError):
+            os.write(self._wake_write_fd, b"\0")
+
+    def _wait_scans(self, selector: selectors.BaseSelector) -> list[RfidScan]:
+        """
+        Wait until a reader may have an answer and return the scanned cards.
+        UART readers are waited on together with one select() call, I2C and
+        SPI readers are polled.
+        """
+        polled_readers = []
+        for reader in self._readers.values():
+            if not reader.is_listening:
+                # Only sends InListPassiveTarget, the answer is read below.
+                reader.poll_uid(0)
+
+            fd = reader.fileno()
+            if fd is None:
+                polled_readers.append(reader)
+                continue
+
+            # The fd changes when the reader is re-initialized.
+            key = selector.get_map().get(fd)
+            if key is None:
+                selector.register(fd, selectors.EVENT_READ, reader)
+            elif key.data is not reader:
+                selector.modify(fd, selectors.EVENT_READ, reader)
+
+        if self.is_active:
+            timeout = self.ACTIVE_POLL_TIMEOUT
+        elif polled_readers:
+            timeout = self.IDLE_POLL_INTERVAL
+        else:
+            # Nothing to poll, only the stop flag needs checking now and then.
+            timeout = 1
+
+        ready_readers = []
+        for key, _ in selector.select(timeout):
+            if key.fd == self._wake_read_fd:
+                with contextlib.suppress(BlockingIOError):
+                    os.read(self._wake_read_fd, 64)
+                continue
+
+            ready_readers.append(key.data)
+
+        scans = []
+        for reader in ready_readers + polled_readers:
+            uid = reader.poll_uid(0.01)
+            if uid is not None:
+                scans.append(RfidScan(reader.name, uid))
+
+        # Drop fds of readers that were re-initialized.
+        reader_fds = {reader.fileno() for reader in self._readers.values()}
+        for fd in list(selector.get_map()):
+            if fd != self._wake_read_fd and fd not in reader_fds:
+                selector.unregister(fd)
+
+        return scans
+
+    def _get_card_data(self, scan: RfidScan) -> CardData | None:
+        card_data = self._card_data_cache.get(scan.uid)
+        if card_data is None:
+            card_data = self._readers[scan.reader].read_card_data(
+                scan.uid, self._card_read_config
+            )
+            if card_data is not None and card_data.complete:
+                self._card_data_cache.put(scan.uid, card_data)
+
+        return card_data
+
+    def _setup_event_generator(self) -> SingleSourceEventGenerator[RfidScan]:
         def _live_thread_loop(
-            on_event: Callable[[str], None], stop_event_flag: threading.Event
+            on_event: Callable[[RfidScan], None],
+            stop_event_flag: threading.Event,
         ):
-            scan_time_history: dict[str, float] = defaultdict(lambda: 0)
+            for reader in self._readers.values():
+                reader.is_listening = False
 
-            while True:
-                if stop_event_flag.is_set():
-                    break
+            with selectors.DefaultSelector() as selector:
+                selector.register(self._wake_read_fd, selectors.EVENT_READ)
 
-                uid = self._read_uid()
+                while True:
+                    if stop_event_flag.is_set():
+                        break
 
-                if uid is not None:
-                    current_time = time.time()
-                    scan_delta_time_uid = current_time - scan_time_history[uid]
-                    scan_time_history[uid] = current_time
+                    for scan in self._wait_scans(selector):
+                        self._last_activity_time = time.monotonic()
 
-                    # print("Scan delta time:", scan_delta_time)
+                        # Debounce
+                        debounce_table = self._debounce_tables[scan.reader]
+                        if not debounce_table.should_accept(scan.uid):
+                            continue
 
-                    # Debounce
-                    if scan_delta_time_uid < 0.5:
-                        continue
+                        if self._card_read_config is not None:
+                            scan.card_data = self._get_card_data(scan)
 
-                    on_event(uid)
-                    if self._buzzer is not None:
-                        self._buzzer.schedule(
-                            BuzzerPlayRequest(Tone(frequency=800), duration=0.1)
-                        )
+                        on_event(scan)
+                        if self._buzzer is not None:
+                            _beep_scan(self._buzzer)
 
-        def _setup_gpio(queue: queue.Queue[str]):
-            def on_event(uid: str):
-                queue.put(uid)
+        def _setup_gpio(queue: queue.Queue[RfidScan]):
+            def on_event(scan: RfidScan):
+                queue.put(scan)
 
             self._event_thread = threading.Thread(
                 target=_live_thread_loop,
@@ -109,6 +355,7 @@ class RfidModule:
 
         def cleanup():
             self._stop_event_flag.set()
+            self._interrupt_select()
             if self._event_thread is not None:
                 # Max wait for the thread to close, max 5 secs
                 self._event_thread.join(5)
@@ -127,25 +374,269 @@ class RfidModule:
         return self._event_generator.async_wait_event()
 
 
+class AsyncRfidModule:
+    """
+    RfidModule for UART readers that runs on the asyncio event loop instead
+    of a thread. Each reader keeps an InListPassiveTarget command pending and
+    the loop wakes up only when the PN532 answers.
+    """
+
+    # The pending command is renewed after this many seconds without an
+    # answer, in case the answer got lost.
+    LISTEN_TIMEOUT = 5
+
+    def __init__(
+        self,
+        ports: dict[str, str] | None = None,
+        buzzer: Buzzer | None = None,
+        debounce_time: float = 0.5,
+        debounce_table_size: int = 1024,
+        card_read_config: CardReadConfig | None = None,
+        card_data_ttl: float = 60,
+    ):
+        if ports is None:
+            ports = {"main": "/dev/ttyAMA0"}
+
+        self._ports = ports
+        self._buzzer = buzzer
+        self._card_read_config = card_read_config
+        self._card_data_cache = CardDataCache(card_data_ttl)
+        self._debounce_tables = {
+            name: ExpiringDebounceTable(debounce_time, debounce_table_size)
+            for name in ports
+        }
+        self._reader_tasks: set[asyncio.Task] = set()
+
+    @property
+    def reader_names(self) -> list[str]:
+        return list(self._ports)
+
+    def set_debounce_time(self, uid: str, debounce_time: float | None):
+        """
+        Override the debounce time of one card, None to use the default.
+        """
+        for debounce_table in self._debounce_tables.values():
+            debounce_table.set_window(uid, debounce_time)
+
+    def wake(self):
+        # The PN532 answers as soon as a card shows up, there is no polling
+        # to speed up.
+        pass
+
+    async def _open_reader(self, name: str) -> AsyncPn532Uart:
+        attempts = 0
+        while True:
+            pn532 = None
+            try:
+                pn532 = AsyncPn532Uart(self._ports[name])
+                await pn532.wakeup()
+                ic, ver, rev, support = await pn532.firmware_version()
+                break
+            except (RuntimeError, OSError) as e:
+                # serial.SerialException is an OSError.
+                attempts += 1
+                if pn532 is not None:
+                    pn532.close()
+
+                print(e)
+                print(
+                    f"Failed to init PN532 '{name}', retrying... "
+                    f"(attempt {attempts})"
+                )
+                await asyncio.sleep(1)
+            except BaseException:
+                # Cancelled, e.g. by close(), the port must not stay open.
+                if pn532 is not None:
+                    pn532.close()
+                raise
+
+        print(
+            "Found PN532 '{0}' with firmware version: {1}.{2}".format(
+                name, ver, rev
+            )
+        )
+        return pn532
+
+    async def _reader_loop(self, name: str, scans: asyncio.Queue[RfidScan]):
+        pn532 = await self._open_reader(name)
+        try:
+            while True:
+                try:
+                    uid = await pn532.read_passive_target(
+                        self.LISTEN_TIMEOUT
+                    )
+                except (RuntimeError, OSError) as e:
+                    print(e)
+                    print(f"Failed to read PN532 '{name}', reinit...")
+                    pn532.close()
+                    pn532 = await self._open_reader(name)
+                    continue
+
+                if uid is None:
+                    # Listen again, a lost or garbled answer can not hang
+                    # the reader.
+                    continue
+
+                scan = RfidScan(name, "".join(f"{x:02x}" for x in uid))
+                if not self._debounce_tables[name].should_accept(scan.uid):
+                    continue
+
+                if self._card_read_config is not None:
+                    scan.card_data = await self._get_card_data(
+                        name, pn532, uid
+                    )
+
+                scans.put_nowait(scan)
+                if self._buzzer is not None:
+                    _beep_scan(self._buzzer)
+        finally:
+            pn532.close()
+
+    async def _get_card_data(
+        self, name: str, pn532: AsyncPn532Uart, uid: bytes
+    ) -> CardData | None:
+        uid_hex = uid.hex()
+        card_data = self._card_data_cache.get(uid_hex)
+        if card_data is not None:
+            return card_data
+
+        try:
+            card_data = await async_read_card_data(
+                pn532, uid, self._card_read_config
+            )
+        except RuntimeError as e:
+            print(e)
+            print(f"Failed to read card data on PN532 '{name}'")
+            return None
+
+        # A partial read is returned once, the next scan reads the card again.
+        if card_data.complete:
+            self._card_data_cache.put(uid_hex, card_data)
+        return card_data
+
+    async def async_wait_event(self) -> AsyncGenerator[RfidScan, None]:
+        if self._reader_tasks:
+            raise RuntimeError("Another consumer is already waiting events")
+
+        scans: asyncio.Queue[RfidScan] = asyncio.Queue()
+        self._reader_tasks = {
+            asyncio.create_task(self._reader_loop(name, scans))
+            for name in self._ports
+        }
+        try:
+            while True:
+                yield await scans.get()
+        finally:
+            self.close()
+
+    def close(self):
+        for task in self._reader_tasks:
+            task.cancel()
+
+        self._reader_tasks = set()
+
+
 def main():
     with Buzzer(21) as buzzer:
-        rfid = RfidModule(buzzer)
+        rfid = RfidModule(buzzer=buzzer)
 
         print("Waiting for RFID/NFC card")
         for event in rfid.wait_event():
             current_time = str(datetime.now(timezone.utc).isoformat())
-            print("Card: ", event, " at ", current_time)
+            print(
+                "Card: ", event.uid, " on ", event.reader, " at ", current_time
+            )
 
 
 async def async_main():
     with Buzzer(21) as buzzer:
-        rfid = RfidModule(buzzer)
+        rfid = RfidModule(buzzer=buzzer)
+
+        print("Waiting for RFID/NFC card")
+        async with contextlib.aclosing(rfid.async_wait_event()) as wait_event:
+            async for event in wait_event:
+                current_time = str(datetime.now(timezone.utc).isoformat())
+                print(
+                    "Card: ",
+                    event.uid,
+                    " on ",
+                    event.reader,
+                    " at ",
+                    current_time,
+                )
+
+
+async def async_main_uart():
+    with Buzzer(21) as buzzer:
+        rfid = AsyncRfidModule(buzzer=buzzer)
 
         print("Waiting for RFID/NFC card")
         async with contextlib.aclosing(rfid.async_wait_event()) as wait_event:
             async for event in wait_event:
                 current_time = str(datetime.now(timezone.utc).isoformat())
-                print("Card: ", event, " at ", current_time)
+                print("Card: ", event.uid, " at ", current_time)
+
+
+def benchmark_polling():
+    from simulation import SimulatedPn532
+
+    def _measure_latencies(
+        pn532: SimulatedPn532, event_times, gap: float
+    ) -> list[float]:
+        latencies = []
+        for i in range(10):
+            event_count = len(event_times)
+            pn532.present_card(bytes([0x04, 0x00, 0x00, i]))
+
+            while len(event_times) == event_count:
+                time.sleep(0.001)
+
+            latencies.append(event_times[-1] - pn532.card_present_time)
+            pn532.remove_card()
+            # Randomize the gap so cards do not always land at the same point
+            # of the polling cycle.
+            time.sleep(gap + random.uniform(0, RfidModule.IDLE_POLL_INTERVAL))
+
+        return latencies
+
+    # A reader without a file descriptor is polled like I2C/SPI, one with a
+    # file descriptor is waited on like UART.
+    for with_fd in (False, True):
+        pn532 = SimulatedPn532(with_fd=with_fd)
+        rfid = RfidModule([RfidReader("sim", lambda: pn532)], active_time=1)
+
+        event_times: list[float] = []
+
+        def _consume():
+            for _ in rfid.wait_event():
+                event_times.append(time.monotonic())
+
+        consumer_thread = threading.Thread(target=_consume)
+        consumer_thread.start()
+        time.sleep(2)
+
+        cpu_start = time.process_time()
+        time.sleep(5)
+        idle_cpu = (time.process_time() - cpu_start) / 5
+
+        active_latencies = _measure_latencies(pn532, event_times, 0.3)
+        idle_latencies = _measure_latencies(pn532, event_times, 1.5)
+
+        rfid.close()
+        consumer_thread.join()
+        pn532.close()
+
+        print(f"with_fd={with_fd}")
+        print(f"  idle CPU: {idle_cpu * 100:.2f}%")
+        for name, latencies in (
+            ("active", active_latencies),
+            ("idle", idle_latencies),
+        ):
+            print(
+                f"  {name} scan-to-event latency: "
+                f"avg {sum(latencies) / len(latencies) * 1000:.1f} ms, "
+                f"max {max(latencies) * 1000:.1f} ms"
+            )
 
 
 if __name__ == "__main__":
@@ -158,6 +649,12 @@ if __name__ == "__main__":
         case 2:
             print("Running async_main()")
             asyncio.run(async_main())
+        case 3:
+            print("Running benchmark_polling()")
+            benchmark_polling()
+        case 4:
+            print("Running async_main_uart()")
+            asyncio.run(async_main_uart())
 
 
 # servo_1 = Servo(
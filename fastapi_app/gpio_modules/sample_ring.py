@@ -0,0 +1,255 @@
+"""
+Shared-memory ring buffer of sensor samples, for processes running on the
+same Pi. Standard library only, so a reader does not need the API's
+dependencies:
+
+    python fastapi_app/gpio_modules/sample_ring.py <ring path>
+
+The file is a header, a table of sensor names and a ring of fixed-size
+records. There is a single writer and no lock, every record is a seqlock
+holding its sequence number at both ends. The writer clears the start seq,
+writes the data, then the end seq and finally the start seq again. Readers
+go the other way round: end seq, data, start seq. A reader that raced the
+writer sees a seq other than the one it expected and skips the record.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Final, NamedTuple
+
+MAGIC: Final = b"LHSR"
+VERSION: Final = 1
+
+# magic, version, record size, capacity, sensor count, closed, latest seq
+HEADER: Final = struct.Struct("<4sHHIHHQ")
+LATEST_SEQ_OFFSET: Final = 16
+CLOSED_OFFSET: Final = 14
+
+MAX_SENSORS: Final = 16
+NAME: Final = struct.Struct("<16s")
+NAMES_OFFSET: Final = HEADER.size
+
+# seq, timestamp, distance, sensor index, seq again
+RECORD: Final = struct.Struct("<QddI4xQ")
+RECORDS_OFFSET: Final = 320
+SEQ: Final = struct.Struct("<Q")
+# timestamp, distance, sensor index
+RECORD_DATA: Final = struct.Struct("<ddI4x")
+RECORD_DATA_OFFSET: Final = SEQ.size
+RECORD_END_OFFSET: Final = RECORD_DATA_OFFSET + RECORD_DATA.size
+
+
+class SampleRecord(NamedTuple):
+    seq: int
+    # Unix time in seconds
+    timestamp: float
+    sensor: str
+    # In cm
+    distance: float
+
+
+class SampleRingWriter:
+    """
+    Creates the ring at path, replacing any ring left by a previous run.
+    Only one writer may publish at a time.
+    """
+
+    def __init__(self, path: str, sensor_names: list[str], capacity: int):
+        if not 0 < len(sensor_names) <= MAX_SENSORS:
+            raise ValueError(f"Between 1 and {MAX_SENSORS} sensors supported")
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self._sensor_indexes = {
+            name: index for index, name in enumerate(sensor_names)
+        }
+        self._capacity = capacity
+        self._seq = 0
+
+        # Build the ring aside and swap it in, readers of the previous ring
+        # keep their mapping instead of crashing on a truncated file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        size = RECORDS_OFFSET + capacity * RECORD.size
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(
+            self._mmap,
+            0,
+            MAGIC,
+            VERSION,
+            RECORD.size,
+            capacity,
+            len(sensor_names),
+            0,
+            0,
+        )
+        for index, name in enumerate(sensor_names):
+            NAME.pack_into(
+                self._mmap, NAMES_OFFSET + index * NAME.size, name.encode()
+            )
+
+        os.replace(tmp_path, path)
+
+    def write(
+        self, sensor: str, distance: float, timestamp: float | None = None
+    ):
+        if self._mmap.closed:
+            return
+
+        self._seq += 1
+        offset = RECORDS_OFFSET + (self._seq % self._capacity) * RECORD.size
+        # No record has seq 0, readers skip the slot from here on.
+        SEQ.pack_into(self._mmap, offset, 0)
+        RECORD_DATA.pack_into(
+            self._mmap,
+            offset + RECORD_DATA_OFFSET,
+            time.time() if timestamp is None else timestamp,
+            distance,
+            self._sensor_indexes[sensor],
+        )
+        SEQ.pack_into(self._mmap, offset + RECORD_END_OFFSET, self._seq)
+        SEQ.pack_into(self._mmap, offset, self._seq)
+        # Published last, readers never look past it.
+        SEQ.pack_into(self._mmap, LATEST_SEQ_OFFSET, self._seq)
+
+    def close(self):
+        if self._mmap.closed:
+            return
+
+        struct.pack_into("<H", self._mmap, CLOSED_OFFSET, 1)
+        self._mmap.close()
+
+
+class SampleRingReader:
+    """
+    Reads the ring without copying it out of shared memory first and
+    without blocking the writer. A reader that falls more than capacity
+    records behind loses the oldest ones, visible as a gap in seq.
+    """
+
+    def __init__(self, path: str):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mmap = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, record_size, capacity, sensor_count, _, _ = (
+            HEADER.unpack_from(self._mmap)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} sample ring")
+        if record_size != RECORD.size:
+            raise ValueError(f"Unexpected record size: {record_size}")
+
+        self._capacity = capacity
+        self.sensor_names = [
+            NAME.unpack_from(self._mmap, NAMES_OFFSET + index * NAME.size)[0]
+            .rstrip(b"\0")
+            .decode()
+            for index in range(sensor_count)
+        ]
+
+    @property
+    def latest_seq(self) -> int:
+        return SEQ.unpack_from(self._mmap, LATEST_SEQ_OFFSET)[0]
+
+    @property
+    def closed(self) -> bool:
+        """
+        True once the writer closed the ring, a new one replaces it when
+        the API restarts.
+        """
+        return struct.unpack_from("<H", self._mmap, CLOSED_OFFSET)[0] != 0
+
+    def read_since(self, seq: int) -> list[SampleRecord]:
+        """
+        Return the records with a sequence number greater than seq that are
+        still in the ring.
+        """
+        latest_seq = self.latest_seq
+        start_seq = max(seq + 1, latest_seq - self._capacity + 1, 1)
+
+        records: list[SampleRecord] = []
+        for expected_seq in range(start_seq, latest_seq + 1):
+            offset = (
+                RECORDS_OFFSET
+                + (expected_seq % self._capacity) * RECORD.size
+            )
+            # Reverse order of the writer: a record rewritten since the
+            # end seq was read has a different start seq by now.
+            (seq_end,) = SEQ.unpack_from(
+                self._mmap, offset + RECORD_END_OFFSET
+            )
+            timestamp, distance, sensor = RECORD_DATA.unpack_from(
+                self._mmap, offset + RECORD_DATA_OFFSET
+            )
+            (seq_start,) = SEQ.unpack_from(self._mmap, offset)
+            # Overwritten by a newer lap, or torn while being written.
+            if seq_start != expected_seq or seq_end != expected_seq:
+                continue
+
+            records.append(
+                SampleRecord(
+                    expected_seq,
+                    timestamp,
+                    self.sensor_names[sensor],
+                    distance,
+                )
+            )
+
+        return records
+
+    def wait(
+        self,
+        seq: int,
+        timeout: float | None = None,
+        poll_interval: float = 0.0005,
+    ) -> list[SampleRecord]:
+        """
+        Wait for records after seq. Returns an empty list on timeout or
+        once the writer closed the ring.
+
+        The ring has no way to signal a reader, it is polled: lower
+        poll_interval for lower latency at the cost of CPU time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.latest_seq <= seq and not self.closed:
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+
+            time.sleep(poll_interval)
+
+        return self.read_since(seq)
+
+    def close(self):
+        self._mmap.close()
+
+
+def main():
+    reader = SampleRingReader(sys.argv[1])
+    seq = reader.latest_seq
+
+    try:
+        while not reader.closed:
+            for record in reader.wait(seq, timeout=1):
+                seq = record.seq
+                latency_us = (time.time() - record.timestamp) * 1_000_000
+                print(
+                    f"#{record.seq} {record.sensor}: {record.distance} cm,"
+                    f" {latency_us:.0f} us old"
+                )
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
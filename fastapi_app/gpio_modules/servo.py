@@ -4,6 +4,8 @@ import os
 import sys
 import threading
 import time
+from concurrent.futures import Future
+from typing import Callable
 
 from gpiozero import AngularServo as GPIOAngularServo
 
@@ -11,6 +13,7 @@ from gpiozero import AngularServo as GPIOAngularServo
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from common import pi_gpio_factory
+from priority_lane_queue import LaneConfig, RequestPriority
 from request_queued_thread import RequestQueuedThread
 
 SERVO_FREQUENCY_HZ = 50
@@ -22,6 +25,16 @@ class ServoMoveRequest:
         self.duration = duration
 
 
+class ServoState:
+    def __init__(self, angle: float, target_angle: float, eta: float):
+        # Without the angle offset. While moving, the angle the move started
+        # from.
+        self.angle = angle
+        self.target_angle = target_angle
+        # Seconds until target_angle is reached, 0 once it is.
+        self.eta = eta
+
+
 class Servo:
     def __init__(
         self,
@@ -30,6 +43,8 @@ class Servo:
         max_pulse_width=float,
         queue_size: int = 3,
         angle_offset: float = 0,
+        lanes: dict[RequestPriority, LaneConfig] | None = None,
+        on_state_change: Callable[[ServoState], None] | None = None,
     ):
         self.gpio_servo = GPIOAngularServo(
             pin,
@@ -42,7 +57,10 @@ class Servo:
         # atexit.register(self.gpio_buzzer.close)
 
         self._angle_offset = angle_offset
+        # Called from the servo thread when a move starts and ends.
+        self._on_state_change = on_state_change
         self._queue_size = queue_size
+        self._lanes = lanes
         self._move_queued_thread = self._setup_queued_thread()
         self._stop_flag_event = threading.Event()
 
@@ -54,6 +72,16 @@ class Servo:
     def min_angle(self) -> float:
         return self.gpio_servo.min_angle
 
+    def _report_state(self, target_angle: float, eta: float):
+        if self._on_state_change is not None:
+            self._on_state_change(
+                ServoState(
+                    self.gpio_servo.angle - self._angle_offset,
+                    target_angle - self._angle_offset,
+                    eta,
+                )
+            )
+
     def ease_angle(self, angle: float, ease_seconds: float):
         if ease_seconds < 0:
             raise ValueError("ease_time must not be negative")
@@ -66,8 +94,11 @@ class Servo:
         #     f"Current angle: {self.gpio_servo.angle}, Requested angle: {angle}"
         # )
         if angle == round(self.gpio_servo.angle, 0):
+            self._report_state(self.gpio_servo.angle, 0)
             return
 
+        self._report_state(angle, ease_seconds)
+
         # The number of steps to finish the operation.
         # We multiply by 2 to make the movement smoother.
         steps = math.ceil(SERVO_FREQUENCY_HZ * ease_seconds * 2)
@@ -100,6 +131,8 @@ class Servo:
             self.gpio_servo.angle = target_angle
             time.sleep(step_delay)
 
+        self._report_state(self.gpio_servo.angle, 0)
+
     def _setup_queued_thread(self) -> RequestQueuedThread:
         def _serve_request(
             request: ServoMoveRequest, next_request_available: bool
@@ -116,6 +149,7 @@ class Servo:
             _serve_request,
             _cleanup,
             queue_size=self._queue_size,
+            lanes=self._lanes,
         )
 
     def __enter__(self):
@@ -129,9 +163,16 @@ class Servo:
         self._move_queued_thread.close()
         # self.gpio_buzzer.close()
 
-    def schedule(self, request: ServoMoveRequest, block=True):
+    def schedule(
+        self,
+        request: ServoMoveRequest,
+        block=True,
+        priority: RequestPriority = RequestPriority.NORMAL,
+    ) -> Future[None]:
         # print(f"Scheduling request: {request.angle}")
-        self._move_queued_thread.schedule(request, block=block)
+        return self._move_queued_thread.schedule(
+            request, block=block, priority=priority
+        )
 
     def join_queue(self):
         self._move_queued_thread.join_queue()
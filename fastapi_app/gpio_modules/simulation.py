@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+
+
+class SimulatedPn532:
+    """
+    Stand-in for adafruit_pn532's PN532 that needs no hardware, used to
+    benchmark RfidModule. Mimics the library's host side cost: waiting for a
+    response polls the bus every 10 ms, and a card is only reported to a
+    pending InListPassiveTarget command.
+
+    With with_fd=True it also exposes a file descriptor that becomes readable
+    when the answer is ready, like the serial port of a UART PN532.
+    """
+
+    # Same poll period as adafruit_pn532's PN532_UART._wait_ready().
+    POLL_PERIOD = 0.01
+    # Time the PN532 takes to answer InListPassiveTarget once a card is in
+    # the field.
+    RESPONSE_DELAY = 0.02
+
+    def __init__(self, with_fd: bool = False):
+        self.firmware_version = (0x32, 1, 6, 7)
+
+        self._lock = threading.Lock()
+        self._listening = False
+        self._listen_time = 0.0
+        self._card_uid: bytes | None = None
+        self.card_present_time: float | None = None
+
+        self._read_fd: int | None = None
+        self._write_fd: int | None = None
+        self._answer_timer: threading.Timer | None = None
+        if with_fd:
+            self._read_fd, self._write_fd = os.pipe()
+            os.set_blocking(self._read_fd, False)
+
+    def close(self):
+        if self._answer_timer is not None:
+            self._answer_timer.cancel()
+
+        if self._read_fd is not None:
+            os.close(self._read_fd)
+            os.close(self._write_fd)
+
+    def fileno(self) -> int:
+        if self._read_fd is None:
+            raise AttributeError("Simulated PN532 has no file descriptor")
+
+        return self._read_fd
+
+    def SAM_configuration(self):
+        pass
+
+    def present_card(self, uid: bytes):
+        with self._lock:
+            self._card_uid = uid
+            self.card_present_time = time.monotonic()
+            self._schedule_answer()
+
+    def remove_card(self):
+        with self._lock:
+            self._card_uid = None
+
+    def _answer_time(self) -> float:
+        return (
+            max(self._listen_time, self.card_present_time)
+            + self.RESPONSE_DELAY
+        )
+
+    def _schedule_answer(self):
+        # Must be called with self._lock held.
+        if self._write_fd is None:
+            return
+        if not self._listening or self._card_uid is None:
+            return
+
+        def _answer():
+            with self._lock:
+                if self._listening and self._card_uid is not None:
+                    os.write(self._write_fd, b"\0")
+
+        if self._answer_timer is not None:
+            self._answer_timer.cancel()
+
+        delay = max(0, self._answer_time() - time.monotonic())
+        self._answer_timer = threading.Timer(delay, _answer)
+        self._answer_timer.start()
+
+    def _in_waiting(self) -> bool:
+        with self._lock:
+            if not self._listening or self._card_uid is None:
+                return False
+
+            return time.monotonic() >= self._answer_time()
+
+    def listen_for_passive_target(self, card_baud: int = 0, timeout=1) -> bool:
+        with self._lock:
+            self._listening = True
+            self._listen_time = time.monotonic()
+            self._schedule_answer()
+        return True
+
+    def get_passive_target(self, timeout=1) -> bytes | None:
+        timestamp = time.monotonic()
+        while (time.monotonic() - timestamp) < timeout:
+            if self._in_waiting():
+                with self._lock:
+                    self._listening = False
+                    if self._read_fd is not None:
+                        while os.read(self._read_fd, 64) == 64:
+                            pass
+                    return self._card_uid
+
+            time.sleep(self.POLL_PERIOD)
+
+        return None
+
+    def read_passive_target(self, card_baud: int = 0, timeout=1):
+        self.listen_for_passive_target(card_baud, timeout)
+        return self.get_passive_target(timeout)
+
+
+class SimulatedCharLCD:
+    """
+    Stand-in for RPLCD's CharLCD, taking about as long as a 2004A display
+    behind a PCF8574 backpack on a 100 kHz I2C bus.
+    """
+
+    # Each character is two nibbles, each sent with an enable pulse.
+    CHAR_WRITE_TIME = 0.0005
+    CLEAR_TIME = 0.002
+
+    def __init__(self, *args, **kwargs):
+        self.lines = [""]
+
+    def clear(self):
+        time.sleep(self.CLEAR_TIME)
+        self.lines = [""]
+
+    def write_string(self, text: str):
+        time.sleep(len(text) * self.CHAR_WRITE_TIME)
+        self.lines[-1] += text
+
+    def crlf(self):
+        self.lines.append("")
+
+    def close(self):
+        pass
+
+
+class SimulatedPcf8574:
+    """
+    Stand-in for adafruit_pcf8574's PCF8574.
+    """
+
+    WRITE_TIME = 0.0003
+
+    def __init__(self, i2c=None, address: int = 0x20):
+        self.gpio = 0xFF
+
+    def write_gpio(self, byte: int):
+        time.sleep(self.WRITE_TIME)
+        self.gpio = byte
+
+    def write_pin(self, pin: int, value: bool):
+        time.sleep(self.WRITE_TIME)
+        if value:
+            self.gpio |= 1 << pin
+        else:
+            self.gpio &= ~(1 << pin) & 0xFF
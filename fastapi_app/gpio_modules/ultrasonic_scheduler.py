@@ -0,0 +1,299 @@
+import asyncio
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Final
+
+import pigpio
+from gpiozero import InputDevice, OutputDevice
+
+# Add current script folder to Python path.
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from common import pi_gpio_factory
+from event_generator import SingleSourceEventGenerator
+from sample_ring import SampleRingWriter
+from ultrasonic_sensor import (
+    ECHO_TIMEOUT_MS,
+    TRIGGER_PULSE_US,
+    PigpioEchoTimer,
+    echo_distance_cm,
+)
+
+
+class UltrasonicSensorPins:
+    def __init__(self, name: str, trigger_pin: int, echo_pin: int):
+        self.name = name
+        self.trigger_pin = trigger_pin
+        self.echo_pin = echo_pin
+
+
+class UltrasonicSample:
+    def __init__(self, sensor: str, distance: float):
+        self.sensor = sensor
+        # In cm
+        self.distance = distance
+
+
+class GpioEchoTimer:
+    """
+    Times the echo of one sensor with gpiozero's pin callbacks, for running
+    without pigpio. Unlike gpiozero's DistanceSensor, which keeps pinging
+    from its own thread, it only pings when asked to.
+    """
+
+    def __init__(self, trigger_pin: int, echo_pin: int, max_distance: float):
+        self._max_distance = max_distance
+        self._trigger = OutputDevice(trigger_pin, pin_factory=pi_gpio_factory)
+        self._echo = InputDevice(echo_pin, pin_factory=pi_gpio_factory)
+
+        self._rise_ticks = None
+        self._fall_ticks = None
+        self._echoed = threading.Event()
+        self._echo.pin.edges = "both"
+        self._echo.pin.when_changed = self._on_echo_changed
+
+    def _on_echo_changed(self, ticks: int, state: bool):
+        if state:
+            self._rise_ticks = ticks
+        elif self._rise_ticks is not None:
+            self._fall_ticks = ticks
+            self._echoed.set()
+
+    def ping(self) -> float:
+        """
+        Returns the distance in cm, max_distance if nothing is in range.
+        """
+        self._rise_ticks = None
+        self._echoed.clear()
+
+        self._trigger.on()
+        time.sleep(TRIGGER_PULSE_US / 1_000_000)
+        self._trigger.off()
+
+        if not self._echoed.wait(ECHO_TIMEOUT_MS / 1000):
+            return round(self._max_distance * 100, 3)
+
+        echo_width = pi_gpio_factory.ticks_diff(
+            self._fall_ticks, self._rise_ticks
+        )
+        return echo_distance_cm(echo_width, self._max_distance)
+
+    def close(self):
+        self._echo.close()
+        self._trigger.close()
+
+
+class UltrasonicScheduler:
+    """
+    Owns several ultrasonic sensors and pings them one at a time in
+    round-robin order, so a sensor never hears the echo of another one.
+
+    The ping rate is shared: with max_sample_rate pings per second and N
+    sensors, each sensor is sampled at most max_sample_rate / N times per
+    second. Adding a sensor costs sample rate, not a thread.
+
+    With sample_ring, every sample is also written to the shared-memory
+    ring, at full rate, before the event stream conflates it.
+    """
+
+    # Quiet time after an echo before the next sensor is pinged, lets the
+    # previous ping die out.
+    CROSSTALK_GUARD: Final = 0.01
+
+    def __init__(
+        self,
+        sensors: list[UltrasonicSensorPins],
+        use_pigpio_timing: bool = False,
+        max_sample_rate: float = 16,
+        max_distance: float = 1,
+        sample_ring: SampleRingWriter | None = None,
+    ):
+        if not sensors:
+            raise ValueError("At least one sensor is required")
+
+        self._sensors = sensors
+        self._min_slot = max(1 / max_sample_rate, self.CROSSTALK_GUARD)
+        self._max_distance = max_distance
+        self._sample_ring = sample_ring
+
+        # Only available with a pigpio daemon, not e.g. a mock pin factory.
+        pi = getattr(pi_gpio_factory, "connection", None)
+        self._pi: pigpio.pi | None = pi if use_pigpio_timing else None
+
+        # Only needed without pigpio, pinged in turn from one thread.
+        self._gpio_sensors: list[GpioEchoTimer] = []
+        if self._pi is None:
+            self._gpio_sensors = [
+                GpioEchoTimer(
+                    sensor.trigger_pin, sensor.echo_pin, max_distance
+                )
+                for sensor in sensors
+            ]
+
+        self._event_thread: threading.Thread | None = None
+        self._stop_event_flag = threading.Event()
+
+        self._current_sample_interval = None
+        self._event_generator = self._setup_event_generator()
+
+    @property
+    def sensor_names(self) -> list[str]:
+        return [sensor.name for sensor in self._sensors]
+
+    def set_sample_interval(self, sample_interval: float):
+        """
+        Time between two samples of the same sensor.
+        """
+        if self._current_sample_interval != sample_interval:
+            self.close()
+            self._event_generator = self._setup_event_generator(
+                sample_interval
+            )
+
+    def _slot(self, sample_interval: float) -> float:
+        return max(sample_interval / len(self._sensors), self._min_slot)
+
+    def _put_sample(
+        self, queue: queue.Queue[UltrasonicSample], sample: UltrasonicSample
+    ):
+        if self._sample_ring is not None:
+            self._sample_ring.write(sample.sensor, sample.distance)
+
+        queue.put(sample)
+
+    def _setup_event_generator(
+        self, sample_interval: float = 1
+    ) -> SingleSourceEventGenerator[UltrasonicSample]:
+        self._current_sample_interval = sample_interval
+        if self._pi is not None:
+            return self._setup_pigpio_event_generator(
+                self._slot(sample_interval)
+            )
+
+        slot = self._slot(sample_interval)
+
+        def _live_thread_loop(
+            queue: queue.Queue[UltrasonicSample],
+            stop_event_flag: threading.Event,
+        ):
+            while not stop_event_flag.is_set():
+                for sensor, gpio_sensor in zip(
+                    self._sensors, self._gpio_sensors
+                ):
+                    if stop_event_flag.is_set():
+                        break
+
+                    self._put_sample(
+                        queue,
+                        UltrasonicSample(sensor.name, gpio_sensor.ping()),
+                    )
+
+                    stop_event_flag.wait(slot)
+
+        def _setup_gpio(queue: queue.Queue[UltrasonicSample]):
+            self._event_thread = threading.Thread(
+                target=_live_thread_loop,
+                args=(queue, self._stop_event_flag),
+            )
+            self._stop_event_flag.clear()
+            self._event_thread.start()
+
+        def cleanup():
+            self._stop_event_flag.set()
+            if self._event_thread is not None:
+                # Max wait for the thread to close, max 5 secs
+                self._event_thread.join(5)
+
+        # Only the latest sample of every sensor matters.
+        return SingleSourceEventGenerator(
+            setup_queue=_setup_gpio,
+            cleanup=cleanup,
+            conflate=True,
+            conflate_key=lambda sample: sample.sensor,
+        )
+
+    def _setup_pigpio_event_generator(
+        self, slot: float
+    ) -> SingleSourceEventGenerator[UltrasonicSample]:
+        """
+        Same echo timing as UltrasonicSensor's pigpio mode, one
+        PigpioEchoTimer walks through all the sensors.
+        """
+        echo_timer = None
+
+        def _on_distance(
+            queue: queue.Queue[UltrasonicSample], index: int, distance: float
+        ):
+            self._put_sample(
+                queue, UltrasonicSample(self._sensors[index].name, distance)
+            )
+
+        def _setup_gpio(queue: queue.Queue[UltrasonicSample]):
+            nonlocal echo_timer
+
+            echo_timer = PigpioEchoTimer(
+                self._pi,
+                [
+                    (sensor.trigger_pin, sensor.echo_pin)
+                    for sensor in self._sensors
+                ],
+                slot,
+                self._max_distance,
+                lambda index, distance: _on_distance(queue, index, distance),
+                min_gap=self.CROSSTALK_GUARD,
+            )
+            echo_timer.start()
+
+        def cleanup():
+            nonlocal echo_timer
+
+            if echo_timer is not None:
+                echo_timer.stop()
+                echo_timer = None
+
+        # Only the latest sample of every sensor matters.
+        return SingleSourceEventGenerator(
+            setup_queue=_setup_gpio,
+            cleanup=cleanup,
+            conflate=True,
+            conflate_key=lambda sample: sample.sensor,
+        )
+
+    def close(self):
+        self._event_generator.close()
+
+    def wait_event(self):
+        return self._event_generator.wait_event()
+
+    def async_wait_event(self):
+        return self._event_generator.async_wait_event()
+
+
+async def async_main():
+    scheduler = UltrasonicScheduler(
+        [
+            UltrasonicSensorPins("front", 23, 24),
+            UltrasonicSensorPins("rear", 27, 22),
+        ],
+        use_pigpio_timing=True,
+    )
+    scheduler.set_sample_interval(0.2)
+
+    async with contextlib.aclosing(scheduler.async_wait_event()) as wait_event:
+        async for sample in wait_event:
+            current_time = str(datetime.now(timezone.utc).isoformat())
+            print(
+                f"Distance {sample.sensor}: ",
+                sample.distance,
+                " at ",
+                current_time,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(async_main())
@@ -6,8 +6,10 @@ import sys
 import threading
 import time
 from datetime import datetime, timezone
-from typing import Callable
+from enum import Enum
+from typing import Callable, Final
 
+import pigpio
 from gpiozero import DistanceSensor
 
 # from adafruit_hcsr04 import HCSR04
@@ -18,12 +20,168 @@ from common import pi_gpio_factory
 from event_generator import SingleSourceEventGenerator
 
 
-class UltrasonicSensor:
-    def __init__(self, trigger_pin: int, echo_pin: int):
-        self._sensor = DistanceSensor(
-            trigger=trigger_pin, echo=echo_pin, pin_factory=pi_gpio_factory
+SPEED_OF_SOUND: Final = 343.26
+TRIGGER_PULSE_US: Final = 10
+# An HC-SR04 gives up after ~38 ms without an echo.
+ECHO_TIMEOUT_MS: Final = 50
+
+
+def echo_distance_cm(echo_width: float, max_distance: float) -> float:
+    """
+    Distance for an echo pulse of echo_width seconds, capped at
+    max_distance like gpiozero.
+    """
+    distance = echo_width * SPEED_OF_SOUND / 2
+    # Use cm instead of m
+    return round(min(distance, max_distance) * 100, 3)
+
+
+class EchoState(Enum):
+    # Waiting for the next trigger.
+    IDLE = 0
+    # Trigger sent, waiting for the echo pulse to start.
+    TRIGGERED = 1
+    # Echo pulse started, waiting for it to end.
+    ECHOING = 2
+
+
+class PigpioEchoTimer:
+    """
+    Pings sensors, given as (trigger pin, echo pin), one at a time in
+    round-robin order and calls on_distance with the sensor index and the
+    distance in cm.
+
+    pigpiod sends the trigger pulse and timestamps the echo edges, so the
+    echo width does not depend on Python scheduling. Everything runs from
+    pigpio's callback thread: the echo pin watchdog of the current sensor
+    both times out a missing echo and wakes it up for its ping, one slot
+    after the previous ping but at least min_gap after the previous echo.
+    """
+
+    def __init__(
+        self,
+        pi: pigpio.pi,
+        sensors: list[tuple[int, int]],
+        slot: float,
+        max_distance: float,
+        on_distance: Callable[[int, float], None],
+        min_gap: float = 0,
+    ):
+        self._pi = pi
+        self._sensors = sensors
+        self._slot = slot
+        self._max_distance = max_distance
+        self._on_distance = on_distance
+        self._min_gap = min_gap
+
+        self._callbacks = []
+        self._current = 0
+        self._state = EchoState.IDLE
+        self._trigger_time = 0.0
+        self._rise_tick = 0
+
+    def start(self):
+        for index, (trigger_pin, echo_pin) in enumerate(self._sensors):
+            self._pi.set_mode(trigger_pin, pigpio.OUTPUT)
+            self._pi.write(trigger_pin, 0)
+            self._pi.set_mode(echo_pin, pigpio.INPUT)
+
+            self._callbacks.append(
+                self._pi.callback(
+                    echo_pin,
+                    pigpio.EITHER_EDGE,
+                    lambda gpio, level, tick, index=index: self._on_edge(
+                        index, level, tick
+                    ),
+                )
+            )
+
+        self._current = 0
+        self._trigger()
+
+    def stop(self):
+        for _, echo_pin in self._sensors:
+            self._pi.set_watchdog(echo_pin, 0)
+
+        for callback in self._callbacks:
+            callback.cancel()
+        self._callbacks.clear()
+
+    def _trigger(self):
+        trigger_pin, echo_pin = self._sensors[self._current]
+        self._state = EchoState.TRIGGERED
+        self._trigger_time = time.monotonic()
+        self._pi.set_watchdog(echo_pin, ECHO_TIMEOUT_MS)
+        self._pi.gpio_trigger(trigger_pin, TRIGGER_PULSE_US, 1)
+
+    def _next_sensor(self):
+        self._pi.set_watchdog(self._sensors[self._current][1], 0)
+        self._current = (self._current + 1) % len(self._sensors)
+        self._state = EchoState.IDLE
+
+        remaining = max(
+            self._slot - (time.monotonic() - self._trigger_time),
+            self._min_gap,
+        )
+        # The watchdog takes 1 to 60000 ms.
+        self._pi.set_watchdog(
+            self._sensors[self._current][1],
+            min(60_000, max(1, round(remaining * 1000))),
         )
 
+    def _publish(self, distance: float):
+        self._on_distance(self._current, distance)
+        self._next_sensor()
+
+    def _on_edge(self, index: int, level: int, tick: int):
+        # Edges and watchdogs of the other sensors are crosstalk or
+        # leftovers.
+        if index != self._current:
+            return
+
+        match self._state, level:
+            case EchoState.TRIGGERED, 1:
+                self._rise_tick = tick
+                self._state = EchoState.ECHOING
+            case EchoState.ECHOING, 0:
+                echo_width = pigpio.tickDiff(self._rise_tick, tick) / 1e6
+                self._publish(echo_distance_cm(echo_width, self._max_distance))
+            case EchoState.TRIGGERED | EchoState.ECHOING, pigpio.TIMEOUT:
+                # Nothing in range, report max_distance like gpiozero.
+                self._publish(round(self._max_distance * 100, 3))
+            case EchoState.IDLE, pigpio.TIMEOUT:
+                self._trigger()
+
+
+class UltrasonicSensor:
+    def __init__(
+        self,
+        trigger_pin: int,
+        echo_pin: int,
+        use_pigpio_timing: bool = False,
+        max_sample_rate: float = 16,
+        max_distance: float = 1,
+    ):
+        self._trigger_pin = trigger_pin
+        self._echo_pin = echo_pin
+        # Triggering again before the previous ping died out reads its echo.
+        self._min_sample_interval = 1 / max_sample_rate
+        self._max_distance = max_distance
+
+        # Only available with a pigpio daemon, not e.g. a mock pin factory.
+        pi = getattr(pi_gpio_factory, "connection", None)
+        self._pi: pigpio.pi | None = pi if use_pigpio_timing else None
+
+        # gpiozero runs its own echo thread, only needed without pigpio.
+        self._sensor = None
+        if self._pi is None:
+            self._sensor = DistanceSensor(
+                trigger=trigger_pin,
+                echo=echo_pin,
+                max_distance=max_distance,
+                pin_factory=pi_gpio_factory,
+            )
+
         self._event_thread: threading.Thread | None = None
         self._stop_event_flag = threading.Event()
 
@@ -39,6 +197,10 @@ class UltrasonicSensor:
         self, sample_interval: float = 1
     ) -> SingleSourceEventGenerator[float]:
         self._current_sample_interval = sample_interval
+        if self._pi is not None:
+            return self._setup_pigpio_event_generator(
+                max(sample_interval, self._min_sample_interval)
+            )
 
         def _live_thread_loop(
             on_event: Callable[[float], None], stop_event_flag: threading.Event
@@ -69,8 +231,38 @@ class UltrasonicSensor:
                 # Max wait for the thread to close, max 5 secs
                 self._event_thread.join(5)
 
+        # Only the latest distance matters.
         return SingleSourceEventGenerator(
-            setup_queue=_setup_gpio, cleanup=cleanup
+            setup_queue=_setup_gpio, cleanup=cleanup, conflate=True
+        )
+
+    def _setup_pigpio_event_generator(
+        self, sample_interval: float
+    ) -> SingleSourceEventGenerator[float]:
+        echo_timer = None
+
+        def _setup_gpio(queue: queue.Queue[float]):
+            nonlocal echo_timer
+
+            echo_timer = PigpioEchoTimer(
+                self._pi,
+                [(self._trigger_pin, self._echo_pin)],
+                sample_interval,
+                self._max_distance,
+                lambda index, distance: queue.put(distance),
+            )
+            echo_timer.start()
+
+        def cleanup():
+            nonlocal echo_timer
+
+            if echo_timer is not None:
+                echo_timer.stop()
+                echo_timer = None
+
+        # Only the latest distance matters.
+        return SingleSourceEventGenerator(
+            setup_queue=_setup_gpio, cleanup=cleanup, conflate=True
         )
 
     def close(self):
@@ -84,7 +276,7 @@ class UltrasonicSensor:
 
 
 def main():
-    sensor = UltrasonicSensor(23, 24)
+    sensor = UltrasonicSensor(23, 24, use_pigpio_timing=True)
     sensor.set_sample_interval(0.1)
 
     for event in sensor.wait_event():
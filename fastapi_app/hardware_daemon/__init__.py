@@ -0,0 +1,22 @@
+# ruff: noqa: F401
+
+import os
+
+from fastapi_app.gpio_modules.common import HARDWARE_ROLE, OWNS_HARDWARE
+
+from .client import (
+    HardwareClient,
+    HardwareDaemonError,
+    PatternConflictError,
+    RemoteEventStream,
+)
+from .protocol import Op
+
+HARDWARE_DAEMON_SOCKET = os.getenv(
+    "HARDWARE_DAEMON_SOCKET", "/tmp/lienhoa_hardware_daemon.sock"
+)
+
+# Only API workers talk to the daemon, the other roles own the hardware.
+hardware_client = (
+    None if OWNS_HARDWARE else HardwareClient(HARDWARE_DAEMON_SOCKET)
+)
@@ -0,0 +1,54 @@
+"""
+Hardware daemon of the process split, run it next to the API workers:
+
+    HARDWARE_ROLE=daemon python -m fastapi_app.hardware_daemon
+    HARDWARE_ROLE=api fastapi run fastapi_app/main.py --workers 4
+"""
+
+import os
+
+# Must be set before the device modules are imported.
+os.environ.setdefault("HARDWARE_ROLE", "daemon")
+
+import asyncio  # noqa: E402
+import signal  # noqa: E402
+
+from fastapi_app.gpio_modules import OWNS_HARDWARE  # noqa: E402
+from fastapi_app.hardware_daemon import HARDWARE_DAEMON_SOCKET  # noqa: E402
+from fastapi_app.hardware_daemon.server import (  # noqa: E402
+    STREAMS,
+    HardwareDaemon,
+)
+from fastapi_app.modules import screen  # noqa: E402
+from fastapi_app.utils import RunOnShutdown  # noqa: E402
+
+
+async def main():
+    if not OWNS_HARDWARE:
+        raise RuntimeError("The hardware daemon can not run as an API worker")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # Device events are journaled even when no API worker is watching.
+    for stream in STREAMS.values():
+        stream.start()
+
+    daemon = HardwareDaemon(HARDWARE_DAEMON_SOCKET)
+    await daemon.start()
+    print(f"Hardware daemon listening on {HARDWARE_DAEMON_SOCKET}")
+
+    screen.screen.write_string("API ready")
+    await stop_event.wait()
+
+    await daemon.close()
+    screen.screen.write_string("Server shutdown")
+
+    for job in RunOnShutdown.get_jobs():
+        job()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import queue
+from concurrent.futures import Future
+from typing import AsyncGenerator
+
+from fastapi_app.exceptions import app_exceptions
+from fastapi_app.utils.event_journal import JournalRecord
+
+from . import protocol
+from .protocol import ErrorCode, FrameKind, Op
+
+
+class HardwareDaemonError(Exception):
+    pass
+
+
+class PatternConflictError(Exception):
+    pass
+
+
+def _to_exception(code: ErrorCode, message: str) -> Exception:
+    match code:
+        case ErrorCode.INVALID:
+            return ValueError(message)
+        case ErrorCode.QUEUE_FULL:
+            return queue.Full()
+        case ErrorCode.DROPPED:
+            return app_exceptions.RequestDroppedException()
+        case ErrorCode.CONFLICT:
+            return PatternConflictError(message)
+        case _:
+            return HardwareDaemonError(message)
+
+
+class _PendingRequest:
+    def __init__(self, with_completion: bool):
+        self.answer: asyncio.Future[bytes] = (
+            asyncio.get_running_loop().create_future()
+        )
+        # Same kind of future as RequestQueuedThread.schedule() returns, so
+        # wait_request() works for both.
+        self.completion: Future[None] | None = (
+            Future() if with_completion else None
+        )
+
+
+class HardwareClient:
+    """
+    Sends device requests from an API worker to the hardware daemon over a
+    single connection, any number of requests can be in flight.
+    """
+
+    def __init__(self, socket_path: str):
+        self._socket_path = socket_path
+
+        self._connect_lock = asyncio.Lock()
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._pending: dict[int, _PendingRequest] = {}
+        self._request_ids = itertools.count(1)
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(
+                    self._socket_path
+                )
+                self._reader_task = asyncio.create_task(
+                    self._read_answers(reader)
+                )
+
+            return self._writer
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    async def _read_answers(self, reader: asyncio.StreamReader):
+        try:
+            while (frame := await protocol.read_frame(reader)) is not None:
+                # A bad answer fails its own request, not the connection.
+                try:
+                    self._on_answer(*frame)
+                except Exception as e:
+                    print(f"Failed to handle hardware daemon answer: {e}")
+
+        except (ConnectionError, protocol.ProtocolError) as e:
+            print(f"Hardware daemon connection failed: {e}")
+
+        finally:
+            self._writer.close()
+            self._fail_pending()
+
+    def _on_answer(self, kind: FrameKind, request_id: int, payload: bytes):
+        pending = self._pending.get(request_id)
+        if pending is None:
+            return
+
+        match kind:
+            case FrameKind.ACCEPTED:
+                if not pending.answer.done():
+                    pending.answer.set_result(payload)
+                return
+            case FrameKind.DONE:
+                if not pending.answer.done():
+                    pending.answer.set_result(payload)
+                if (
+                    pending.completion is not None
+                    and not pending.completion.done()
+                ):
+                    pending.completion.set_result(None)
+            case FrameKind.ERROR:
+                code, message = protocol.decode_error(payload)
+                if not pending.answer.done():
+                    pending.answer.set_exception(_to_exception(code, message))
+                elif (
+                    # Nobody waits for the completion of this request.
+                    pending.completion is None
+                    or pending.completion.done()
+                ):
+                    pass
+                elif code == ErrorCode.DROPPED:
+                    pending.completion.cancel()
+                else:
+                    pending.completion.set_exception(
+                        _to_exception(code, message)
+                    )
+
+        del self._pending[request_id]
+
+    def _fail_pending(self):
+        for pending in self._pending.values():
+            error = HardwareDaemonError("Lost connection to hardware daemon")
+            if not pending.answer.done():
+                pending.answer.set_exception(error)
+            elif pending.completion is not None:
+                pending.completion.set_exception(error)
+
+        self._pending.clear()
+
+    async def request(
+        self, op: Op, payload: bytes = b"", with_completion: bool = False
+    ) -> tuple[bytes, Future[None] | None]:
+        """
+        Send a request and wait until the daemon accepted it. With
+        with_completion, also returns a future that completes once the
+        device served the request.
+        """
+        try:
+            writer = await self._connect()
+        except OSError as e:
+            raise HardwareDaemonError(
+                f"Hardware daemon is not reachable: {e}"
+            ) from e
+
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        pending = _PendingRequest(with_completion)
+        self._pending[request_id] = pending
+
+        protocol.write_frame(
+            writer,
+            FrameKind.REQUEST,
+            request_id,
+            protocol.OP.pack(op) + payload,
+        )
+        await writer.drain()
+
+        return await pending.answer, pending.completion
+
+
+class RemoteEventStream:
+    """
+    EventStream of the hardware daemon, seen from an API worker. Every
+    subscriber gets its own connection.
+    """
+
+    def __init__(self, socket_path: str, name: str):
+        self._socket_path = socket_path
+        self._name = name
+
+    def start(self):
+        # The daemon runs the source.
+        pass
+
+    def close(self):
+        pass
+
+    async def subscribe(
+        self, since: int | None = None
+    ) -> AsyncGenerator[JournalRecord, None]:
+        reader, writer = await asyncio.open_unix_connection(
+            self._socket_path
+        )
+        try:
+            protocol.write_frame(
+                writer,
+                FrameKind.SUBSCRIBE,
+                0,
+                protocol.encode_subscribe(self._name, since),
+            )
+            await writer.drain()
+
+            while (frame := await protocol.read_frame(reader)) is not None:
+                kind, _, payload = frame
+                if kind == FrameKind.EVENT:
+                    yield protocol.decode_event(payload)
+
+            raise HardwareDaemonError(
+                f"Hardware daemon closed the {self._name} stream"
+            )
+
+        finally:
+            writer.close()
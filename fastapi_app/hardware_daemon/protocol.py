@@ -0,0 +1,224 @@
+"""
+Binary protocol between the API workers and the hardware daemon, over a
+Unix domain socket.
+
+Every frame is a 9 byte header (kind, request id, payload length) followed
+by the payload. Device requests are packed with struct, only the rarely
+sent access list and event data are JSON.
+
+An API worker sends REQUEST frames on one connection. The daemon answers
+ACCEPTED once the device request is queued and DONE once it was served,
+or ERROR if either fails. Requests without a device queue are answered
+with DONE right away. A SUBSCRIBE frame turns its connection into a
+stream of EVENT frames.
+"""
+
+import asyncio
+import json
+import math
+import struct
+from enum import IntEnum
+from typing import Any
+
+from fastapi_app.utils.event_journal import JournalRecord
+
+HEADER = struct.Struct("!BII")
+# Keeps a corrupt length from allocating the whole RAM of the Pi.
+MAX_PAYLOAD_SIZE = 1024 * 1024
+
+
+class FrameKind(IntEnum):
+    REQUEST = 1
+    ACCEPTED = 2
+    DONE = 3
+    ERROR = 4
+    SUBSCRIBE = 5
+    EVENT = 6
+
+
+class Op(IntEnum):
+    MOVE_GATE = 1
+    BEEP = 2
+    PLAY_MELODY = 3
+    SHOW_STATUS_LIGHTS_STATE = 4
+    PLAY_STATUS_LIGHTS_PATTERN = 5
+    WRITE_SCREEN = 6
+    SET_SAMPLE_INTERVAL = 7
+    GET_ACCESS_LIST = 8
+    SET_ACCESS_LIST = 9
+    GET_STATE = 10
+
+
+class ErrorCode(IntEnum):
+    # ValueError, bad request arguments
+    INVALID = 1
+    # queue.Full, the device queue rejected the request
+    QUEUE_FULL = 2
+    # The request was dropped from its queue before it was served.
+    DROPPED = 3
+    # Serving the request failed.
+    FAILED = 4
+    # A status lights pattern with a higher priority is playing.
+    CONFLICT = 5
+
+
+# Floats are doubles, a float32 0.01 would fail the >= 0.01 validation of
+# the daemon.
+OP = struct.Struct("!B")
+MOVE_GATE = struct.Struct("!Bdd")
+BEEP = struct.Struct("!dd")
+NOTE = struct.Struct("!dd")
+COUNT = struct.Struct("!H")
+PATTERN = struct.Struct("!Iih")
+PATTERN_STEP = struct.Struct("!Bd")
+SAMPLE_INTERVAL = struct.Struct("!d")
+ERROR = struct.Struct("!B")
+SUBSCRIBE = struct.Struct("!q")
+STATE_WAIT = struct.Struct("!qd")
+EVENT = struct.Struct("!qd")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+async def read_frame(
+    reader: asyncio.StreamReader,
+) -> tuple[FrameKind, int, bytes] | None:
+    """
+    Returns None once the other side closed the connection.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+
+    kind, request_id, length = HEADER.unpack(header)
+    if kind not in FrameKind.__members__.values():
+        raise ProtocolError(f"Unknown frame kind: {kind}")
+    if length > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload too large: {length} bytes")
+
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+    return FrameKind(kind), request_id, payload
+
+
+def write_frame(
+    writer: asyncio.StreamWriter,
+    kind: FrameKind,
+    request_id: int,
+    payload: bytes = b"",
+):
+    writer.write(HEADER.pack(kind, request_id, len(payload)) + payload)
+
+
+def encode_error(code: ErrorCode, message: str) -> bytes:
+    return ERROR.pack(code) + message.encode()
+
+
+def decode_error(payload: bytes) -> tuple[ErrorCode, str]:
+    (code,) = ERROR.unpack_from(payload)
+    return ErrorCode(code), payload[ERROR.size :].decode()
+
+
+def encode_notes(notes: list[tuple[float | None, float]]) -> bytes:
+    # Rests have no frequency, sent as NaN.
+    return COUNT.pack(len(notes)) + b"".join(
+        NOTE.pack(math.nan if frequency is None else frequency, duration)
+        for frequency, duration in notes
+    )
+
+
+def decode_notes(payload: bytes) -> list[tuple[float | None, float]]:
+    (count,) = COUNT.unpack_from(payload)
+    notes = []
+    for frequency, duration in NOTE.iter_unpack(
+        payload[COUNT.size : COUNT.size + count * NOTE.size]
+    ):
+        notes.append((None if math.isnan(frequency) else frequency, duration))
+
+    return notes
+
+
+def encode_pattern(
+    steps: list[tuple[int, float]],
+    loop_count: int,
+    priority: int,
+    end_byte: int | None,
+) -> bytes:
+    # No end byte is sent as -1.
+    header = PATTERN.pack(
+        loop_count, priority, -1 if end_byte is None else end_byte
+    )
+    return (
+        header
+        + COUNT.pack(len(steps))
+        + b"".join(
+            PATTERN_STEP.pack(byte, duration) for byte, duration in steps
+        )
+    )
+
+
+def decode_pattern(
+    payload: bytes,
+) -> tuple[list[tuple[int, float]], int, int, int | None]:
+    loop_count, priority, end_byte = PATTERN.unpack_from(payload)
+    (count,) = COUNT.unpack_from(payload, PATTERN.size)
+    start = PATTERN.size + COUNT.size
+    steps = list(
+        PATTERN_STEP.iter_unpack(
+            payload[start : start + count * PATTERN_STEP.size]
+        )
+    )
+    return steps, loop_count, priority, None if end_byte < 0 else end_byte
+
+
+def encode_subscribe(stream: str, since: int | None) -> bytes:
+    return SUBSCRIBE.pack(-1 if since is None else since) + stream.encode()
+
+
+def decode_subscribe(payload: bytes) -> tuple[str, int | None]:
+    (since,) = SUBSCRIBE.unpack_from(payload)
+    return payload[SUBSCRIBE.size :].decode(), None if since < 0 else since
+
+
+def encode_state_wait(
+    since: int | None, timeout: float, sections: list[str] | None
+) -> bytes:
+    # No since is sent as -1, sections comma separated.
+    return STATE_WAIT.pack(
+        -1 if since is None else since, timeout
+    ) + ",".join(sections or []).encode()
+
+
+def decode_state_wait(
+    payload: bytes,
+) -> tuple[int | None, float, list[str] | None]:
+    since, timeout = STATE_WAIT.unpack_from(payload)
+    sections = payload[STATE_WAIT.size :].decode()
+    return (
+        None if since < 0 else since,
+        timeout,
+        sections.split(",") if sections else None,
+    )
+
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def decode_json(payload: bytes) -> Any:
+    return json.loads(payload)
+
+
+def encode_event(record: JournalRecord) -> bytes:
+    return EVENT.pack(record.seq, record.timestamp) + encode_json(record.data)
+
+
+def decode_event(payload: bytes) -> JournalRecord:
+    seq, timestamp = EVENT.unpack_from(payload)
+    return JournalRecord(seq, timestamp, decode_json(payload[EVENT.size :]))
@@ -0,0 +1,278 @@
+import asyncio
+import contextlib
+import os
+import queue
+from concurrent.futures import Future
+from typing import Awaitable, Callable
+
+from fastapi_app.exceptions import app_exceptions
+from fastapi_app.modules import (
+    access_control,
+    buzzer,
+    collision_button,
+    distance_sensor,
+    gate,
+    rfid,
+    screen,
+    state,
+    status_lights,
+)
+from fastapi_app.utils import EventStream
+
+from . import protocol
+from .protocol import ErrorCode, FrameKind, Op
+
+# A request handler returns the DONE payload, or the future of the queued
+# device request.
+_Handler = Callable[[bytes], Awaitable[bytes | Future[None]]]
+
+
+class _ConflictError(Exception):
+    pass
+
+
+async def _move_gate(payload: bytes) -> Future[None]:
+    return await gate.move_gate(*protocol.MOVE_GATE.unpack(payload))
+
+
+async def _beep(payload: bytes) -> Future[None]:
+    return await buzzer.beep(*protocol.BEEP.unpack(payload))
+
+
+async def _play_melody(payload: bytes) -> Future[None]:
+    return await buzzer.play_melody(
+        [
+            buzzer.BuzzerNoteData(frequency=frequency, duration=duration)
+            for frequency, duration in protocol.decode_notes(payload)
+        ]
+    )
+
+
+async def _show_status_lights_state(payload: bytes) -> bytes:
+    await status_lights.show_state(
+        status_lights.StatusLightState(payload.decode())
+    )
+    return b""
+
+
+async def _play_status_lights_pattern(payload: bytes) -> bytes:
+    steps, loop_count, priority, end_byte = protocol.decode_pattern(payload)
+    data = status_lights.StatusLightsPatternData(
+        steps=[
+            status_lights.StatusLightsPatternStep(byte=byte, duration=duration)
+            for byte, duration in steps
+        ],
+        loop_count=loop_count,
+        priority=priority,
+        end_byte=end_byte,
+    )
+
+    if not await status_lights.play_pattern(data):
+        raise _ConflictError("A pattern with a higher priority is playing")
+
+    return b""
+
+
+async def _write_screen(payload: bytes) -> Future[None]:
+    return await screen.write_text(payload.decode())
+
+
+async def _set_sample_interval(payload: bytes) -> bytes:
+    (interval,) = protocol.SAMPLE_INTERVAL.unpack(payload)
+    await distance_sensor.set_sample_interval(interval)
+    return b""
+
+
+async def _get_access_list(payload: bytes) -> bytes:
+    response = await access_control.get_access_list()
+    return protocol.encode_json(response.model_dump(mode="json"))
+
+
+async def _set_access_list(payload: bytes) -> bytes:
+    response = await access_control.update_access_list(
+        access_control.AccessListData.model_validate(
+            protocol.decode_json(payload)
+        )
+    )
+    return protocol.encode_json(response.model_dump(mode="json"))
+
+
+async def _get_state(payload: bytes) -> bytes:
+    store_id, version, snapshot = await state.get_snapshot(
+        *protocol.decode_state_wait(payload)
+    )
+    return protocol.encode_json(
+        {"id": store_id, "version": version, "state": snapshot}
+    )
+
+
+HANDLERS: dict[Op, _Handler] = {
+    Op.MOVE_GATE: _move_gate,
+    Op.BEEP: _beep,
+    Op.PLAY_MELODY: _play_melody,
+    Op.SHOW_STATUS_LIGHTS_STATE: _show_status_lights_state,
+    Op.PLAY_STATUS_LIGHTS_PATTERN: _play_status_lights_pattern,
+    Op.WRITE_SCREEN: _write_screen,
+    Op.SET_SAMPLE_INTERVAL: _set_sample_interval,
+    Op.GET_ACCESS_LIST: _get_access_list,
+    Op.SET_ACCESS_LIST: _set_access_list,
+    Op.GET_STATE: _get_state,
+}
+
+STREAMS: dict[str, EventStream] = {
+    "rfid": rfid.rfid_stream,
+    "collision_button": collision_button.button_stream,
+    "distance_sensor": distance_sensor.sensor_stream,
+}
+
+
+def _to_error(e: BaseException) -> bytes:
+    match e:
+        case ValueError():
+            code = ErrorCode.INVALID
+        case queue.Full():
+            code = ErrorCode.QUEUE_FULL
+        case app_exceptions.RequestDroppedException():
+            code = ErrorCode.DROPPED
+        case _ConflictError():
+            code = ErrorCode.CONFLICT
+        case _:
+            code = ErrorCode.FAILED
+
+    return protocol.encode_error(code, str(e))
+
+
+class HardwareDaemon:
+    """
+    Owns the hardware, i.e. imports the device modules with HARDWARE_ROLE
+    set to "daemon", and serves the API workers over a Unix domain socket.
+    """
+
+    def __init__(self, socket_path: str):
+        self._socket_path = socket_path
+        self._server: asyncio.Server | None = None
+        # Keep references to running requests so they are not garbage
+        # collected.
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._socket_path)
+
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, self._socket_path
+        )
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._socket_path)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while (frame := await protocol.read_frame(reader)) is not None:
+                kind, request_id, payload = frame
+
+                match kind:
+                    case FrameKind.REQUEST:
+                        # Requests are served concurrently, a slow one does
+                        # not hold up the others on the connection.
+                        task = asyncio.create_task(
+                            self._serve_request(writer, request_id, payload)
+                        )
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                    case FrameKind.SUBSCRIBE:
+                        subscription = asyncio.create_task(
+                            self._serve_subscription(writer, payload)
+                        )
+                        subscription.add_done_callback(
+                            lambda _: writer.close()
+                        )
+                        # The API worker closes the connection to
+                        # unsubscribe.
+                        await reader.read()
+                        subscription.cancel()
+                        break
+                    case _:
+                        raise protocol.ProtocolError(
+                            f"Unexpected frame kind: {kind}"
+                        )
+
+        except (ConnectionError, protocol.ProtocolError) as e:
+            print(f"API worker connection failed: {e}")
+
+        finally:
+            writer.close()
+
+    async def _serve_request(
+        self, writer: asyncio.StreamWriter, request_id: int, payload: bytes
+    ):
+        try:
+            (op,) = protocol.OP.unpack_from(payload)
+            result = await HANDLERS[Op(op)](payload[protocol.OP.size :])
+        except Exception as e:
+            protocol.write_frame(
+                writer, FrameKind.ERROR, request_id, _to_error(e)
+            )
+            return
+
+        if not isinstance(result, Future):
+            protocol.write_frame(writer, FrameKind.DONE, request_id, result)
+            return
+
+        protocol.write_frame(writer, FrameKind.ACCEPTED, request_id)
+
+        # The device thread completes the future, answer from the loop.
+        loop = asyncio.get_running_loop()
+        result.add_done_callback(
+            lambda future: loop.call_soon_threadsafe(
+                self._answer_completion, writer, request_id, future
+            )
+        )
+
+    def _answer_completion(
+        self,
+        writer: asyncio.StreamWriter,
+        request_id: int,
+        future: Future[None],
+    ):
+        if writer.is_closing():
+            return
+
+        if future.cancelled():
+            error = app_exceptions.RequestDroppedException()
+            protocol.write_frame(
+                writer, FrameKind.ERROR, request_id, _to_error(error)
+            )
+        elif future.exception() is not None:
+            protocol.write_frame(
+                writer,
+                FrameKind.ERROR,
+                request_id,
+                _to_error(future.exception()),
+            )
+        else:
+            protocol.write_frame(writer, FrameKind.DONE, request_id)
+
+    async def _serve_subscription(
+        self, writer: asyncio.StreamWriter, payload: bytes
+    ):
+        name, since = protocol.decode_subscribe(payload)
+        if name not in STREAMS:
+            print(f"API worker subscribed to unknown stream: {name}")
+            return
+
+        async with contextlib.aclosing(
+            STREAMS[name].subscribe(since)
+        ) as wait_event:
+            async for record in wait_event:
+                protocol.write_frame(
+                    writer, FrameKind.EVENT, 0, protocol.encode_event(record)
+                )
+                await writer.drain()
@@ -0,0 +1,164 @@
+"""
+Load test of the device endpoints on simulated hardware, no Raspberry Pi
+needed:
+
+    python -m fastapi_app.load_test
+
+Runs the same mixed gate/buzzer/screen workload against the current
+handlers and against copies of the previous ones (sync def handlers that
+hop to the threadpool, and an async LCD handler that blocks the event loop)
+and prints requests/sec and latency percentiles for both.
+"""
+
+import os
+import tempfile
+
+# Must be set before the app and the device modules are imported.
+os.environ.setdefault("SIMULATE_HARDWARE", "True")
+os.environ.setdefault("EVENT_JOURNAL_DIR", tempfile.mkdtemp())
+# Measure the handlers, not the admission limits.
+os.environ.setdefault("ADMISSION_MAX_CONCURRENT", "0")
+os.environ.setdefault("ADMISSION_RATE", "0")
+
+import asyncio  # noqa: E402
+import contextlib  # noqa: E402
+import itertools  # noqa: E402
+import time  # noqa: E402
+from typing import Annotated  # noqa: E402
+
+import anyio.from_thread  # noqa: E402
+import httpx  # noqa: E402
+from fastapi import APIRouter, Form, Path  # noqa: E402
+from gpiozero.tones import Tone  # noqa: E402
+
+from fastapi_app.gpio_modules import (  # noqa: E402
+    BuzzerPlayRequest,
+    RequestPriority,
+    ServoMoveRequest,
+)
+from fastapi_app.main import app  # noqa: E402
+from fastapi_app.modules import buzzer, gate, screen  # noqa: E402
+from fastapi_app.utils import RunOnShutdown  # noqa: E402
+
+before_router = APIRouter(prefix="/before", include_in_schema=False)
+
+
+@before_router.patch("/gate/{gate_id}")
+def set_gate_before(
+    data: Annotated[gate.GateFormData, Form()],
+    gate_id: Annotated[int, Path(ge=1, le=2)],
+):
+    if gate.hardware_client is not None:
+        # API workers of the process split have no servo, ask the daemon.
+        anyio.from_thread.run(
+            gate.move_gate, gate_id, data.angle, data.duration
+        )
+    else:
+        gate.gates[gate_id].schedule(
+            ServoMoveRequest(data.angle, data.duration), block=False
+        )
+
+    return data
+
+
+@before_router.post("/buzzer/")
+def set_buzzer_before(data: Annotated[buzzer.BuzzerFormData, Form()]):
+    if buzzer.hardware_client is not None:
+        anyio.from_thread.run(buzzer.beep, data.frequency, data.duration)
+    else:
+        buzzer.buzzer.schedule(
+            BuzzerPlayRequest(Tone(data.frequency), data.duration),
+            block=False,
+            priority=RequestPriority.LOW,
+        )
+
+    return data
+
+
+@before_router.post("/screen/")
+async def set_lcd_text_before(data: Annotated[screen.LcdFormData, Form()]):
+    screen.screen.write_string(data.text)
+    return screen.LcdResponse(text=data.text)
+
+
+def _workload(prefix: str) -> list[tuple[str, str, dict]]:
+    return [
+        ("PATCH", f"{prefix}/gate/1", {"angle": 10, "duration": 0}),
+        ("PATCH", f"{prefix}/gate/2", {"angle": -45, "duration": 0}),
+        ("POST", f"{prefix}/buzzer/", {"frequency": 600, "duration": 0.01}),
+        ("POST", f"{prefix}/screen/", {"text": "Xin chao\nBien so 29A-12345"}),
+    ]
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    index = round(percentile / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    prefix: str,
+    request_count: int,
+    concurrency: int,
+) -> dict:
+    requests = itertools.islice(
+        itertools.cycle(_workload(prefix)), request_count
+    )
+    latencies: list[float] = []
+    status_codes: dict[int, int] = {}
+
+    async def _worker():
+        for method, url, data in requests:
+            start = time.perf_counter()
+            response = await client.request(method, url, data=data)
+            latencies.append(time.perf_counter() - start)
+            status_codes[response.status_code] = (
+                status_codes.get(response.status_code, 0) + 1
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests_per_second": request_count / elapsed,
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+        "status_codes": status_codes,
+    }
+
+
+async def main(request_count: int = 2000, concurrency: int = 50):
+    app.include_router(before_router)
+
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client,
+    ):
+        for name, prefix in (("before", "/before"), ("after", "")):
+            # Let the device queues drain between runs.
+            await asyncio.sleep(1)
+
+            # The handlers print every LCD write.
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                result = await run_load(
+                    client, prefix, request_count, concurrency
+                )
+
+            print(
+                f"{name:>6}: {result['requests_per_second']:7.0f} req/s, "
+                f"p50 {result['p50'] * 1000:6.1f} ms, "
+                f"p99 {result['p99'] * 1000:6.1f} ms, "
+                f"status codes {result['status_codes']}"
+            )
+
+    for job in RunOnShutdown.get_jobs():
+        job()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,18 +1,31 @@
 from contextlib import asynccontextmanager
+from math import ceil
 from queue import Full
 
 from fastapi import FastAPI, HTTPException, status
 from fastapi.responses import PlainTextResponse
 
+from fastapi_app.exceptions import app_exceptions
+from fastapi_app.gpio_modules import OWNS_HARDWARE
+from fastapi_app.hardware_daemon import HardwareDaemonError, hardware_client
 from fastapi_app.modules import (
+    access_control,
     buzzer,
     collision_button,
     distance_sensor,
+    events,
     gate,
     rfid,
+    scene,
     screen,
+    state,
     status_lights,
 )
+from fastapi_app.utils import (
+    DEFAULT_ADMISSION_LIMIT,
+    AdmissionController,
+    AdmissionLimit,
+)
 
 # Get the app's version number.
 try:
@@ -25,6 +38,18 @@ except FileNotFoundError:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if not OWNS_HARDWARE:
+        # API worker of the process split, the hardware daemon runs the
+        # devices and their event streams.
+        yield
+        await hardware_client.close()
+        return
+
+    # Device events are journaled even when no client is watching.
+    rfid.rfid_stream.start()
+    collision_button.button_stream.start()
+    distance_sensor.sensor_stream.start()
+
     screen.screen.write_string("API ready")
     yield
     screen.screen.write_string("Server shutdown")
@@ -43,13 +68,36 @@ app = FastAPI(
 )
 
 
-app.include_router(gate.router)
-app.include_router(status_lights.router)
-app.include_router(screen.router)
-app.include_router(buzzer.router)
-app.include_router(distance_sensor.router)
-app.include_router(collision_button.router)
-app.include_router(rfid.router)
+admission_controller = AdmissionController()
+
+# A scene drives every device at once.
+SCENE_ADMISSION_LIMIT = AdmissionLimit(max_concurrent=2, rate=5, burst=10)
+# Long polls are held open by design, only their rate is limited.
+STATE_ADMISSION_LIMIT = AdmissionLimit(
+    rate=DEFAULT_ADMISSION_LIMIT.rate, burst=DEFAULT_ADMISSION_LIMIT.burst
+)
+
+for router in (
+    gate.router,
+    status_lights.router,
+    screen.router,
+    buzzer.router,
+    distance_sensor.router,
+    collision_button.router,
+    rfid.router,
+    events.router,
+    access_control.router,
+):
+    app.include_router(router, dependencies=[admission_controller.limit()])
+
+app.include_router(
+    scene.router,
+    dependencies=[admission_controller.limit(SCENE_ADMISSION_LIMIT)],
+)
+app.include_router(
+    state.router,
+    dependencies=[admission_controller.limit(STATE_ADMISSION_LIMIT)],
+)
 
 
 @app.get(
@@ -58,7 +106,7 @@ app.include_router(rfid.router)
     tags=["pages"],
     response_class=PlainTextResponse,
 )
-def homescreen():
+async def homescreen():
     return "Hello, World!"
 
 
@@ -67,13 +115,29 @@ async def value_exception_handler(request, exc):
     raise HTTPException(status.HTTP_400_BAD_REQUEST, str(exc))
 
 
-# @app.exception_handler(app_exceptions.TooManyRequestsException)
-# async def buzzer_too_many_requests_exception_handler(request, exc):
-#     raise HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, str(exc))
+@app.exception_handler(app_exceptions.TooManyRequestsException)
+async def too_many_requests_exception_handler(request, exc):
+    headers = None
+    if exc.retry_after is not None:
+        headers = {"Retry-After": str(max(1, ceil(exc.retry_after)))}
+
+    raise HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, str(exc), headers)
+
+
+@app.exception_handler(app_exceptions.RequestDroppedException)
+async def request_dropped_exception_handler(request, exc):
+    raise HTTPException(status.HTTP_409_CONFLICT, str(exc))
+
+
+@app.exception_handler(HardwareDaemonError)
+async def hardware_daemon_exception_handler(request, exc):
+    raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(exc))
 
 
 @app.exception_handler(Full)
 async def buzzer_too_many_requests_exception_handler(request, exc):
     raise HTTPException(
-        status.HTTP_429_TOO_MANY_REQUESTS, "Buzzer request queue is full"
+        status.HTTP_429_TOO_MANY_REQUESTS,
+        "Device request queue is full",
+        {"Retry-After": "1"},
     )
@@ -0,0 +1,165 @@
+import asyncio
+from typing import Annotated
+
+from fastapi import APIRouter, Body
+from pydantic import BaseModel, Field
+
+from fastapi_app.hardware_daemon import Op, hardware_client, protocol
+from fastapi_app.modules import gate, scene, status_lights
+from fastapi_app.utils import AccessCache, AccessCacheEntry, AccessDecision
+
+access_cache = AccessCache()
+
+# Scenes played on the Pi as soon as a cached card is scanned, can be
+# replaced by the backend together with the access list.
+access_scenes: dict[AccessDecision, list[scene.SceneAction]] = {
+    AccessDecision.ALLOW: [
+        scene.StatusLightsAction(
+            device="status_lights", state=status_lights.StatusLightState.ALLOW
+        ),
+        scene.GateAction(
+            device="gate", gate_id=1, angle=gate.GATE_OPEN_ANGLE, duration=0.5
+        ),
+    ],
+    AccessDecision.DENY: [
+        scene.StatusLightsAction(
+            device="status_lights", state=status_lights.StatusLightState.DENY
+        ),
+    ],
+}
+
+# Keep references to running scenes so they are not garbage collected.
+_scene_tasks: set[asyncio.Task] = set()
+
+
+class AccessListEntry(BaseModel):
+    uid: str = Field(
+        description="Card UID in hex, as reported by /rfid/watch",
+        examples=["04a2b3c4"],
+        pattern=r"^[0-9a-f]+$",
+    )
+    decision: AccessDecision
+    ttl: float | None = Field(
+        description="Seconds until the entry expires, never if null",
+        examples=[None, 3600],
+        gt=0,
+        default=None,
+    )
+
+
+class AccessListData(BaseModel):
+    version: int = Field(
+        description="Must be greater than the current version",
+        examples=[1],
+        ge=1,
+    )
+    replace: bool = Field(
+        description="Replace the whole list instead of merging into it",
+        default=True,
+    )
+    entries: list[AccessListEntry]
+    allow_scene: list[scene.SceneAction] | None = Field(
+        description="Scene to play when an allowed card is scanned",
+        default=None,
+    )
+    deny_scene: list[scene.SceneAction] | None = Field(
+        description="Scene to play when a denied card is scanned",
+        default=None,
+    )
+
+
+class AccessListResponse(BaseModel):
+    version: int
+    entry_count: int
+    allow_scene: list[scene.SceneAction]
+    deny_scene: list[scene.SceneAction]
+
+
+async def _play_scene(actions: list[scene.SceneAction]):
+    try:
+        await scene.play_scene(actions)
+    except Exception as e:
+        print(f"Failed to play access scene: {e}")
+
+
+def decide(uid: str) -> AccessDecision | None:
+    """
+    Look up uid in the local access list and start the configured scene
+    without waiting for it. Must be called from the event loop.
+    """
+    decision = access_cache.lookup(uid)
+    if decision is None:
+        return None
+
+    task = asyncio.create_task(_play_scene(access_scenes[decision]))
+    _scene_tasks.add(task)
+    task.add_done_callback(_scene_tasks.discard)
+
+    return decision
+
+
+def _get_access_list() -> AccessListResponse:
+    return AccessListResponse(
+        version=access_cache.version,
+        entry_count=len(access_cache),
+        allow_scene=access_scenes[AccessDecision.ALLOW],
+        deny_scene=access_scenes[AccessDecision.DENY],
+    )
+
+
+async def get_access_list() -> AccessListResponse:
+    # With the process split, cards are decided in the hardware daemon.
+    if hardware_client is not None:
+        payload, _ = await hardware_client.request(Op.GET_ACCESS_LIST)
+        return AccessListResponse.model_validate(protocol.decode_json(payload))
+
+    return _get_access_list()
+
+
+async def update_access_list(data: AccessListData) -> AccessListResponse:
+    if hardware_client is not None:
+        payload, _ = await hardware_client.request(
+            Op.SET_ACCESS_LIST,
+            protocol.encode_json(data.model_dump(mode="json")),
+        )
+        return AccessListResponse.model_validate(protocol.decode_json(payload))
+
+    access_cache.update(
+        data.version,
+        {
+            entry.uid: AccessCacheEntry(entry.decision, entry.ttl)
+            for entry in data.entries
+        },
+        replace=data.replace,
+    )
+
+    if data.allow_scene is not None:
+        access_scenes[AccessDecision.ALLOW] = data.allow_scene
+    if data.deny_scene is not None:
+        access_scenes[AccessDecision.DENY] = data.deny_scene
+
+    return _get_access_list()
+
+
+router = APIRouter(
+    prefix="/access_control",
+    tags=["access_control (local card decisions)"],
+)
+
+
+@router.get(
+    "/",
+    summary="Get access list version and scenes",
+    response_model=AccessListResponse,
+)
+async def read_access_list():
+    return await get_access_list()
+
+
+@router.put(
+    "/",
+    summary="Upload access list",
+    response_model=AccessListResponse,
+)
+async def set_access_list(data: Annotated[AccessListData, Body()]):
+    return await update_access_list(data)
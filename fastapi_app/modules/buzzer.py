@@ -1,23 +1,37 @@
+from concurrent.futures import Future
 from typing import Annotated
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Body, Form, Query
 from gpiozero.tones import Tone
 from pydantic import BaseModel, Field
 
 from fastapi_app.gpio_modules import Buzzer as GPIOBuzzer
-from fastapi_app.gpio_modules import BuzzerPlayRequest
-from fastapi_app.utils import RunOnShutdown
+from fastapi_app.gpio_modules import (
+    OWNS_HARDWARE,
+    BuzzerMelodyRequest,
+    BuzzerPlayRequest,
+    RequestPriority,
+)
+from fastapi_app.hardware_daemon import Op, hardware_client, protocol
+from fastapi_app.utils import RunOnShutdown, wait_request
+
+# Range of the buzzer, two octaves around A4. API workers of the process
+# split have no buzzer to ask.
+BUZZER_MIN_FREQUENCY = 110
+BUZZER_MAX_FREQUENCY = 1760
 
-buzzer = GPIOBuzzer(21)
-RunOnShutdown.add(buzzer.close)
+buzzer = None
+if OWNS_HARDWARE:
+    buzzer = GPIOBuzzer(21)
+    RunOnShutdown.add(buzzer.close)
 
 
 class BuzzerFormData(BaseModel):
     frequency: float = Field(
         description="Frequency in Hz",
         examples=[600, 1000],
-        ge=buzzer.min_frequency,
-        le=buzzer.max_frequency,
+        ge=BUZZER_MIN_FREQUENCY,
+        le=BUZZER_MAX_FREQUENCY,
     )
     duration: float = Field(
         description="Duration in seconds",
@@ -27,6 +41,70 @@ class BuzzerFormData(BaseModel):
     )
 
 
+class BuzzerNoteData(BaseModel):
+    frequency: float | None = Field(
+        description="Frequency in Hz, none for a rest",
+        examples=[600, None],
+        ge=BUZZER_MIN_FREQUENCY,
+        le=BUZZER_MAX_FREQUENCY,
+    )
+    duration: float = Field(
+        description="Duration in seconds",
+        examples=[0.1, 0.5],
+        ge=0.01,
+        le=5,
+    )
+
+
+class BuzzerMelodyData(BaseModel):
+    notes: list[BuzzerNoteData] = Field(
+        min_length=1, max_length=BuzzerMelodyRequest.MAX_NOTES
+    )
+
+
+async def beep(frequency: float, duration: float) -> Future[None]:
+    if hardware_client is not None:
+        _, future = await hardware_client.request(
+            Op.BEEP,
+            protocol.BEEP.pack(frequency, duration),
+            with_completion=True,
+        )
+        return future
+
+    # Beeps are cosmetic, shed before anything else under load.
+    return buzzer.schedule(
+        BuzzerPlayRequest(Tone(frequency), duration),
+        block=False,
+        priority=RequestPriority.LOW,
+    )
+
+
+async def play_melody(notes: list[BuzzerNoteData]) -> Future[None]:
+    if hardware_client is not None:
+        _, future = await hardware_client.request(
+            Op.PLAY_MELODY,
+            protocol.encode_notes(
+                [(note.frequency, note.duration) for note in notes]
+            ),
+            with_completion=True,
+        )
+        return future
+
+    # The whole melody takes a single queue slot.
+    return buzzer.schedule(
+        BuzzerMelodyRequest(
+            [
+                BuzzerPlayRequest(
+                    None if note.frequency is None else Tone(note.frequency),
+                    note.duration,
+                )
+                for note in notes
+            ]
+        ),
+        block=False,
+    )
+
+
 router = APIRouter(
     prefix="/buzzer",
     tags=["buzzer (passive)"],
@@ -38,8 +116,32 @@ router = APIRouter(
     summary="Set buzzer frequency and duration",
     response_model=BuzzerFormData,
 )
-def set_buzzer(data: Annotated[BuzzerFormData, Form()]):
-    tone = Tone(data.frequency)
-    buzzer.schedule(BuzzerPlayRequest(tone, data.duration), block=False)
+async def set_buzzer(
+    data: Annotated[BuzzerFormData, Form()],
+    wait: Annotated[
+        bool, Query(description="Respond once the beep finished playing")
+    ] = False,
+):
+    future = await beep(data.frequency, data.duration)
+    if wait:
+        await wait_request(future)
+
+    return data
+
+
+@router.post(
+    "/melody",
+    summary="Play a sequence of notes",
+    response_model=BuzzerMelodyData,
+)
+async def set_buzzer_melody(
+    data: Annotated[BuzzerMelodyData, Body()],
+    wait: Annotated[
+        bool, Query(description="Respond once the melody finished playing")
+    ] = False,
+):
+    future = await play_melody(data.notes)
+    if wait:
+        await wait_request(future)
 
     return data
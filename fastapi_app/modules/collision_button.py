@@ -1,15 +1,69 @@
-import asyncio
-import contextlib
+import os
+from typing import Annotated
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Header, WebSocket
 from pydantic import BaseModel
-from starlette.websockets import WebSocketState
 
-from fastapi_app.gpio_modules.button import Button, ButtonEvent
-from fastapi_app.utils import RunOnShutdown, time_utils
+from fastapi_app.gpio_modules import OWNS_HARDWARE
+from fastapi_app.gpio_modules.button import Button, ButtonEdge, ButtonEvent
+from fastapi_app.hardware_daemon import (
+    HARDWARE_DAEMON_SOCKET,
+    RemoteEventStream,
+)
+from fastapi_app.modules.state import device_state
+from fastapi_app.utils import (
+    EVENT_JOURNAL_DIR,
+    EventJournal,
+    EventSocket,
+    EventSourceResponse,
+    EventStream,
+    EventTopic,
+    JournalRecord,
+    RunOnShutdown,
+    event_source,
+    time_utils,
+)
+
+# Debounce with pigpio's glitch filter instead of in Python, edges are
+# timestamped by pigpio.
+BUTTON_GLITCH_FILTER = bool(
+    os.getenv("BUTTON_GLITCH_FILTER", "True").capitalize() == "True"
+)
+
+button = None
+if OWNS_HARDWARE:
+    button = Button(26, use_glitch_filter=BUTTON_GLITCH_FILTER)
+    RunOnShutdown.add(button.close)
+
+
+def _to_record_data(edge: ButtonEdge) -> dict:
+    return {"is_pressed": edge.event == ButtonEvent.PRESSED, "tick": edge.tick}
+
 
-button = Button(26)
-RunOnShutdown.add(button.close)
+def _update_state(record: JournalRecord):
+    device_state.update(
+        "collision_button",
+        {
+            "seq": record.seq,
+            "is_pressed": record.data["is_pressed"],
+            "timestamp": time_utils.to_utc_iso(record.timestamp),
+        },
+    )
+
+
+if OWNS_HARDWARE:
+    button_stream = EventStream(
+        button.async_wait_event,
+        EventJournal(os.path.join(EVENT_JOURNAL_DIR, "collision_button")),
+        _to_record_data,
+        get_timestamp=lambda edge: edge.timestamp,
+        on_record=_update_state,
+    )
+else:
+    button_stream = RemoteEventStream(
+        HARDWARE_DAEMON_SOCKET, "collision_button"
+    )
+RunOnShutdown.add(button_stream.close)
 
 router = APIRouter(
     prefix="/collision_button",
@@ -18,48 +72,38 @@ router = APIRouter(
 
 
 class CollisionButtonEvent(BaseModel):
+    seq: int
     is_pressed: bool
     timestamp: str
+    # pigpio tick of the edge in microseconds, for exact press durations.
+    # None if debounced in Python.
+    tick: int | None = None
+
+
+def _to_response(record: JournalRecord) -> CollisionButtonEvent:
+    return CollisionButtonEvent(
+        seq=record.seq,
+        is_pressed=record.data["is_pressed"],
+        timestamp=time_utils.to_utc_iso(record.timestamp),
+        tick=record.data.get("tick"),
+    )
+
+
+button_topic = EventTopic("collision_button", button_stream, _to_response)
 
 
 @router.websocket("/watch")
-async def watch_events(websocket: WebSocket):
+async def watch_events(websocket: WebSocket, since: int | None = None):
     await websocket.accept()
 
-    async def _wait_event():
-        async with contextlib.aclosing(button.async_wait_event()) as wait_event:
-            async for event in wait_event:
-                try:
-                    current_time = time_utils.get_utc_iso_now()
-                    # print(event)
-
-                    match event:
-                        case ButtonEvent.PRESSED:
-                            await websocket.send_json(
-                                CollisionButtonEvent(
-                                    is_pressed=True,
-                                    timestamp=current_time,
-                                ).model_dump()
-                            )
-                        case ButtonEvent.RELEASED:
-                            await websocket.send_json(
-                                CollisionButtonEvent(
-                                    is_pressed=False,
-                                    timestamp=current_time,
-                                ).model_dump()
-                            )
-
-                    # print(f"Collision button event: {event}")
-
-                except WebSocketDisconnect:
-                    break
-
-    task = asyncio.create_task(_wait_event())
-    try:
-        await task
-    except asyncio.exceptions.CancelledError:
-        # Hide exception message
-        pass
-    finally:
-        if not websocket.application_state == WebSocketState.DISCONNECTED:
-            await websocket.close(1001, reason="Another connection opened")
+    socket = EventSocket(websocket, {button_topic.name: button_topic}, False)
+    await socket.subscribe(button_topic.name, since)
+    await socket.serve()
+
+
+@router.get("/events", response_class=EventSourceResponse)
+async def stream_events(
+    since: int | None = None,
+    last_event_id: Annotated[int | None, Header()] = None,
+):
+    return await event_source(button_topic, since, last_event_id)
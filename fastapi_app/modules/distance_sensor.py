@@ -1,15 +1,155 @@
-import asyncio
 import contextlib
+import os
+import tempfile
+from typing import Annotated, AsyncGenerator
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Header, Query, WebSocket
 from pydantic import BaseModel
-from starlette.websockets import WebSocketState
 
-from fastapi_app.gpio_modules.ultrasonic_sensor import UltrasonicSensor
-from fastapi_app.utils import RunOnShutdown, time_utils
+from fastapi_app.gpio_modules import OWNS_HARDWARE, SampleRingWriter
+from fastapi_app.gpio_modules.ultrasonic_scheduler import (
+    UltrasonicSample,
+    UltrasonicScheduler,
+    UltrasonicSensorPins,
+)
+from fastapi_app.hardware_daemon import (
+    HARDWARE_DAEMON_SOCKET,
+    Op,
+    RemoteEventStream,
+    hardware_client,
+    protocol,
+)
+from fastapi_app.modules.rfid import rfid
+from fastapi_app.modules.state import device_state
+from fastapi_app.utils import (
+    EVENT_JOURNAL_DIR,
+    EventJournal,
+    EventSocket,
+    EventSourceResponse,
+    EventStream,
+    EventTopic,
+    JournalRecord,
+    RunOnShutdown,
+    event_source,
+    time_utils,
+)
+
+# A vehicle closer than this switches the RFID reader to fast polling.
+RFID_WAKE_DISTANCE_CM = float(os.getenv("RFID_WAKE_DISTANCE_CM", 100))
+
+# Time echoes from pigpio edge ticks instead of gpiozero's polling thread.
+ULTRASONIC_PIGPIO_TIMING = bool(
+    os.getenv("ULTRASONIC_PIGPIO_TIMING", "True").capitalize() == "True"
+)
+# Pings per second, shared by all sensors.
+ULTRASONIC_MAX_SAMPLE_RATE = float(os.getenv("ULTRASONIC_MAX_SAMPLE_RATE", 16))
+
+# Comma separated list of name=trigger_pin:echo_pin, e.g.
+# "front=27:22,rear=23:24". Sensors are pinged one at a time.
+ULTRASONIC_SENSORS = os.getenv("ULTRASONIC_SENSORS", "main=27:22")
+
+# Shared-memory ring with every sample, for processes on the same Pi. An
+# empty path disables it.
+DISTANCE_SAMPLE_RING = os.getenv(
+    "DISTANCE_SAMPLE_RING",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "lienhoa_distance_samples",
+    ),
+)
+DISTANCE_SAMPLE_RING_CAPACITY = int(
+    os.getenv("DISTANCE_SAMPLE_RING_CAPACITY", 4096)
+)
+
+
+def _parse_sensor_config(config: str) -> UltrasonicSensorPins:
+    name, _, pins = config.strip().partition("=")
+    trigger_pin, _, echo_pin = pins.partition(":")
+    return UltrasonicSensorPins(name, int(trigger_pin), int(echo_pin))
+
+
+sensor = None
+if OWNS_HARDWARE:
+    sensor_pins = [
+        _parse_sensor_config(config)
+        for config in ULTRASONIC_SENSORS.split(",")
+    ]
+
+    sample_ring = None
+    if DISTANCE_SAMPLE_RING:
+        sample_ring = SampleRingWriter(
+            DISTANCE_SAMPLE_RING,
+            [pins.name for pins in sensor_pins],
+            DISTANCE_SAMPLE_RING_CAPACITY,
+        )
+
+    sensor = UltrasonicScheduler(
+        sensor_pins,
+        use_pigpio_timing=ULTRASONIC_PIGPIO_TIMING,
+        max_sample_rate=ULTRASONIC_MAX_SAMPLE_RATE,
+        sample_ring=sample_ring,
+    )
+    RunOnShutdown.add(sensor.close)
+    # After the sensor, so the ring is not closed under a running sampler.
+    if sample_ring is not None:
+        RunOnShutdown.add(sample_ring.close)
+
+
+async def _wake_rfid_on_approach() -> AsyncGenerator[UltrasonicSample, None]:
+    # Checked on the device event path, once per sample, even when no
+    # client is watching. Looks up the generator on every restart,
+    # set_sample_interval() replaces it.
+    async with contextlib.aclosing(sensor.async_wait_event()) as wait_event:
+        async for sample in wait_event:
+            if sample.distance < RFID_WAKE_DISTANCE_CM:
+                rfid.wake()
+
+            yield sample
+
+
+def _to_record_data(sample: UltrasonicSample) -> dict:
+    return {"sensor": sample.sensor, "distance": sample.distance}
+
+
+def _update_state(record: JournalRecord):
+    device_state.update(
+        "distance_sensor",
+        {
+            "seq": record.seq,
+            "distance": record.data["distance"],
+            "timestamp": time_utils.to_utc_iso(record.timestamp),
+        },
+        key=record.data["sensor"],
+    )
+
+
+if OWNS_HARDWARE:
+    sensor_stream = EventStream(
+        _wake_rfid_on_approach,
+        EventJournal(os.path.join(EVENT_JOURNAL_DIR, "distance_sensor")),
+        _to_record_data,
+        # A stalled client gets the latest distance of every sensor, not a
+        # backlog of stale ones.
+        conflate=True,
+        conflate_key=lambda data: data["sensor"],
+        on_record=_update_state,
+    )
+else:
+    sensor_stream = RemoteEventStream(
+        HARDWARE_DAEMON_SOCKET, "distance_sensor"
+    )
+RunOnShutdown.add(sensor_stream.close)
+
+
+async def set_sample_interval(interval: float):
+    if hardware_client is not None:
+        await hardware_client.request(
+            Op.SET_SAMPLE_INTERVAL, protocol.SAMPLE_INTERVAL.pack(interval)
+        )
+        return
+
+    sensor.set_sample_interval(interval)
 
-sensor = UltrasonicSensor(trigger_pin=27, echo_pin=22)
-RunOnShutdown.add(sensor.close)
 
 router = APIRouter(
     prefix="/distance_sensor",
@@ -19,36 +159,56 @@ router = APIRouter(
 
 
 class DistanceSensorResponse(BaseModel):
+    seq: int
+    # Records journaled before multi-sensor support have no sensor name.
+    sensor: str | None = None
     distance: float
     timestamp: str
 
 
+def _to_response(record: JournalRecord) -> DistanceSensorResponse:
+    return DistanceSensorResponse(
+        seq=record.seq,
+        sensor=record.data.get("sensor"),
+        distance=record.data["distance"],
+        timestamp=time_utils.to_utc_iso(record.timestamp),
+    )
+
+
+async def _on_subscribe(params: dict):
+    # Keeps the current interval if the subscriber does not set one.
+    if "interval" in params:
+        await set_sample_interval(float(params["interval"]))
+
+
+sensor_topic = EventTopic(
+    "distance_sensor", sensor_stream, _to_response, _on_subscribe
+)
+
+
 @router.websocket("/watch")
-async def watch_events(websocket: WebSocket, interval: float):
+async def watch_events(
+    websocket: WebSocket, interval: float, since: int | None = None
+):
     await websocket.accept()
-    sensor.set_sample_interval(interval)
 
-    async def _wait_event():
-        async with contextlib.aclosing(sensor.async_wait_event()) as wait_event:
-            async for event in wait_event:
-                try:
-                    current_time = time_utils.get_utc_iso_now()
-                    await websocket.send_json(
-                        DistanceSensorResponse(
-                            distance=event,
-                            timestamp=current_time,
-                        ).model_dump()
-                    )
-
-                except WebSocketDisconnect:
-                    break
-
-    task = asyncio.create_task(_wait_event())
-    try:
-        await task
-    except asyncio.exceptions.CancelledError:
-        # Hide exception message
-        pass
-    finally:
-        if not websocket.application_state == WebSocketState.DISCONNECTED:
-            await websocket.close(1001, reason="Another connection opened")
+    socket = EventSocket(websocket, {sensor_topic.name: sensor_topic}, False)
+    await socket.subscribe(sensor_topic.name, since, {"interval": interval})
+    await socket.serve()
+
+
+@router.get("/events", response_class=EventSourceResponse)
+async def stream_events(
+    since: int | None = None,
+    interval: Annotated[
+        float | None,
+        Query(description="Time between samples, keeps the current one"),
+    ] = None,
+    last_event_id: Annotated[int | None, Header()] = None,
+):
+    return await event_source(
+        sensor_topic,
+        since,
+        last_event_id,
+        None if interval is None else {"interval": interval},
+    )
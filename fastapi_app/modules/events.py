@@ -0,0 +1,27 @@
+from fastapi import APIRouter, WebSocket
+
+from fastapi_app.modules.collision_button import button_topic
+from fastapi_app.modules.distance_sensor import sensor_topic
+from fastapi_app.modules.rfid import rfid_topic
+from fastapi_app.utils import EventSocket, EventTopic
+
+TOPICS: dict[str, EventTopic] = {
+    topic.name: topic for topic in (rfid_topic, button_topic, sensor_topic)
+}
+
+router = APIRouter(
+    prefix="/events",
+    tags=["device events"],
+)
+
+
+@router.websocket("")
+async def watch_events(websocket: WebSocket):
+    """
+    One socket for every device stream. Send
+    {"action": "subscribe", "topic": "rfid", "since": 12} (distance_sensor
+    also takes "interval") or {"action": "unsubscribe", "topic": "rfid"},
+    events arrive as {"type": "event", "topic": "rfid", "data": {...}}.
+    """
+    await websocket.accept()
+    await EventSocket(websocket, TOPICS).serve()
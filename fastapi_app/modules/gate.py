@@ -1,12 +1,23 @@
 import os
+import time
+from concurrent.futures import Future
 from typing import Annotated
 
-from fastapi import APIRouter, Form, Path
+from fastapi import APIRouter, Form, Path, Query
 from pydantic import BaseModel, Field
 
 from fastapi_app.gpio_modules import Servo as GPIOServo
-from fastapi_app.gpio_modules import ServoMoveRequest
-from fastapi_app.utils import RunOnShutdown
+from fastapi_app.gpio_modules import (
+    OWNS_HARDWARE,
+    LaneConfig,
+    OverflowPolicy,
+    RequestPriority,
+    ServoMoveRequest,
+    ServoState,
+)
+from fastapi_app.hardware_daemon import Op, hardware_client, protocol
+from fastapi_app.modules.state import device_state
+from fastapi_app.utils import RunOnShutdown, time_utils, wait_request
 
 GATE_CLOSE_ANGLE = int(os.getenv("GATE_CLOSE_ANGLE", -45))
 GATE_OPEN_ANGLE = int(os.getenv("GATE_OPEN_ANGLE", 0))
@@ -14,32 +25,72 @@ GATE_OPEN_ANGLE = int(os.getenv("GATE_OPEN_ANGLE", 0))
 GATE_1_ANGLE_OFFSET = float(os.getenv("GATE_1_ANGLE_OFFSET", 0))
 GATE_2_ANGLE_OFFSET = float(os.getenv("GATE_2_ANGLE_OFFSET", 0))
 
-gate_1 = GPIOServo(
-    9,
-    min_pulse_width=0.55 / 1000,
-    max_pulse_width=2.485 / 1000,
-    angle_offset=GATE_1_ANGLE_OFFSET,
-)
-gate_1.schedule(ServoMoveRequest(GATE_CLOSE_ANGLE, 0), block=True)
-RunOnShutdown.add(gate_1.close)
-
+# Moves of a gate are served in order, in a single lane. A newer move
+# replaces the last queued one, so the gate ends up where it was last asked
+# to go and a close is never rejected or overtaken by an older open.
+GATE_LANES = {
+    RequestPriority.NORMAL: LaneConfig(3, OverflowPolicy.REPLACE_PENDING),
+}
+
+# Same range as Servo, API workers of the process split have no servo to
+# ask.
+GATE_MIN_ANGLE = -45
+GATE_MAX_ANGLE = 45
+
+
+def _report_gate_state(gate_id: int):
+    def _update(servo_state: ServoState):
+        device_state.update(
+            "gates",
+            {
+                "angle": round(servo_state.angle, 3),
+                "target_angle": round(servo_state.target_angle, 3),
+                # When the gate reaches target_angle, None once it did.
+                "eta": (
+                    time_utils.to_utc_iso(time.time() + servo_state.eta)
+                    if servo_state.eta > 0
+                    else None
+                ),
+            },
+            key=str(gate_id),
+        )
+
+    return _update
+
+
+gates: dict[int, GPIOServo] = {}
+if OWNS_HARDWARE:
+    gate_1 = GPIOServo(
+        9,
+        min_pulse_width=0.55 / 1000,
+        max_pulse_width=2.485 / 1000,
+        angle_offset=GATE_1_ANGLE_OFFSET,
+        lanes=GATE_LANES,
+        on_state_change=_report_gate_state(1),
+    )
+    gate_1.schedule(ServoMoveRequest(GATE_CLOSE_ANGLE, 0), block=True)
+    RunOnShutdown.add(gate_1.close)
+
+    gate_2 = GPIOServo(
+        10,
+        min_pulse_width=0.5475 / 1000,
+        max_pulse_width=2.46 / 1000,
+        angle_offset=GATE_2_ANGLE_OFFSET,
+        lanes=GATE_LANES,
+        on_state_change=_report_gate_state(2),
+    )
+    gate_2.schedule(ServoMoveRequest(GATE_CLOSE_ANGLE, 0), block=True)
+    RunOnShutdown.add(gate_2.close)
 
-gate_2 = GPIOServo(
-    10,
-    min_pulse_width=0.5475 / 1000,
-    max_pulse_width=2.46 / 1000,
-    angle_offset=GATE_2_ANGLE_OFFSET,
-)
-gate_2.schedule(ServoMoveRequest(GATE_CLOSE_ANGLE, 0), block=True)
-RunOnShutdown.add(gate_2.close)
+    gates = {1: gate_1, 2: gate_2}
 
 
 class GateFormData(BaseModel):
     angle: float = Field(
         description="Angle in degrees",
         examples=[-45, 0, 10, 45],
-        ge=gate_1.min_angle,
-        le=gate_1.max_angle,
+        ge=GATE_MIN_ANGLE,
+        le=GATE_MAX_ANGLE,
     )
     duration: float = Field(
         description="Duration in seconds",
@@ -50,6 +101,25 @@ class GateFormData(BaseModel):
     )
 
 
+async def move_gate(
+    gate_id: int, angle: float, duration: float
+) -> Future[None]:
+    if hardware_client is not None:
+        _, future = await hardware_client.request(
+            Op.MOVE_GATE,
+            protocol.MOVE_GATE.pack(gate_id, angle, duration),
+            with_completion=True,
+        )
+        return future
+
+    if gate_id not in gates:
+        raise ValueError(f"Invalid gate_id: {gate_id}")
+
+    return gates[gate_id].schedule(
+        ServoMoveRequest(angle, duration), block=False
+    )
+
+
 router = APIRouter(
     prefix="/gate",
     tags=["gate (module MG90S)"],
@@ -70,20 +140,15 @@ router = APIRouter(
     summary="Set gate state",
     response_model=GateFormData,
 )
-def set_gate(
+async def set_gate(
     data: Annotated[GateFormData, Form()],
     gate_id: Annotated[int, Path(ge=1, le=2)],
+    wait: Annotated[
+        bool, Query(description="Respond once the gate finished moving")
+    ] = False,
 ):
-    match gate_id:
-        case 1:
-            gate_1.schedule(
-                ServoMoveRequest(data.angle, data.duration), block=False
-            )
-        case 2:
-            gate_2.schedule(
-                ServoMoveRequest(data.angle, data.duration), block=False
-            )
-        case _:
-            raise ValueError(f"Invalid gate_id: {gate_id}")
+    future = await move_gate(gate_id, data.angle, data.duration)
+    if wait:
+        await wait_request(future)
 
     return data
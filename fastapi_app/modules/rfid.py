@@ -1,16 +1,204 @@
-import asyncio
 import contextlib
+import os
+from typing import Annotated, AsyncGenerator
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Header, WebSocket
 from pydantic import BaseModel
-from starlette.websockets import WebSocketState
 
+from fastapi_app.gpio_modules import OWNS_HARDWARE, SIMULATE_HARDWARE
+from fastapi_app.gpio_modules.card_data import CardData, CardReadConfig
 from fastapi_app.gpio_modules.rfid_module import RfidModule as GPIORfid
+from fastapi_app.gpio_modules.rfid_module import (
+    AsyncRfidModule,
+    RfidReader,
+    RfidScan,
+    create_i2c_pn532,
+    create_spi_pn532,
+    create_uart_pn532,
+)
+from fastapi_app.gpio_modules.simulation import SimulatedPn532
+from fastapi_app.hardware_daemon import (
+    HARDWARE_DAEMON_SOCKET,
+    RemoteEventStream,
+)
+from fastapi_app.modules import access_control
 from fastapi_app.modules.buzzer import buzzer
-from fastapi_app.utils import RunOnShutdown, time_utils
+from fastapi_app.modules.state import device_state
+from fastapi_app.utils import (
+    EVENT_JOURNAL_DIR,
+    AccessDecision,
+    EventJournal,
+    EventSocket,
+    EventSourceResponse,
+    EventStream,
+    EventTopic,
+    JournalRecord,
+    RunOnShutdown,
+    event_source,
+    time_utils,
+)
+
+# Comma separated list of name=bus:address, e.g.
+# "entry=uart:/dev/ttyAMA0,exit=i2c:1,lobby=spi:8".
+RFID_READERS = os.getenv("RFID_READERS", "main=uart:/dev/ttyAMA0")
+# When every reader is on UART, read them on the event loop instead of a
+# thread.
+RFID_ASYNC_UART = bool(
+    os.getenv("RFID_ASYNC_UART", "True").capitalize() == "True"
+)
+
+# Card data read after the UID, e.g. pass id and expiry of monthly passes.
+# Comma separated MIFARE Classic blocks (NTAG2xx pages for 7 byte UIDs).
+RFID_CARD_BLOCKS = os.getenv("RFID_CARD_BLOCKS", "")
+RFID_CARD_KEY = os.getenv("RFID_CARD_KEY", "ffffffffffff")
+# Also read the NDEF message of NTAG2xx cards.
+RFID_CARD_NDEF = bool(
+    os.getenv("RFID_CARD_NDEF", "False").capitalize() == "True"
+)
+# Seconds the data of a card is reused when it is presented again.
+RFID_CARD_DATA_TTL = float(os.getenv("RFID_CARD_DATA_TTL", 60))
+
+# Seconds a card is ignored after a scan on the same reader.
+RFID_DEBOUNCE_TIME = float(os.getenv("RFID_DEBOUNCE_TIME", 0.5))
+# Comma separated list of uid=seconds for cards debounced differently, e.g.
+# "04a1b2c3=0,deadbeef=5".
+RFID_CARD_DEBOUNCE_TIMES = os.getenv("RFID_CARD_DEBOUNCE_TIMES", "")
+
+
+def _parse_reader_config(config: str) -> tuple[str, str, str]:
+    name, _, connection = config.strip().partition("=")
+    bus, _, address = connection.partition(":")
+    return name, bus, address
+
+
+def _create_reader(config: str) -> RfidReader:
+    name, bus, address = _parse_reader_config(config)
+
+    if SIMULATE_HARDWARE:
+        return RfidReader(name, lambda: SimulatedPn532(with_fd=bus == "uart"))
+
+    match bus:
+        case "uart":
+            return RfidReader(name, lambda: create_uart_pn532(address))
+        case "i2c":
+            return RfidReader(name, lambda: create_i2c_pn532(int(address)))
+        case "spi":
+            return RfidReader(name, lambda: create_spi_pn532(int(address)))
+        case _:
+            raise ValueError(f"Invalid RFID reader config: {config}")
+
+
+card_read_config = None
+if RFID_CARD_BLOCKS or RFID_CARD_NDEF:
+    card_read_config = CardReadConfig(
+        blocks=[int(block) for block in RFID_CARD_BLOCKS.split(",") if block],
+        key=bytes.fromhex(RFID_CARD_KEY),
+        ndef=RFID_CARD_NDEF,
+    )
+
+
+def _create_rfid() -> GPIORfid | AsyncRfidModule:
+    reader_configs = [
+        _parse_reader_config(config) for config in RFID_READERS.split(",")
+    ]
+    if (
+        RFID_ASYNC_UART
+        and not SIMULATE_HARDWARE
+        and all(bus == "uart" for _, bus, _ in reader_configs)
+    ):
+        return AsyncRfidModule(
+            {name: address for name, _, address in reader_configs},
+            buzzer=buzzer,
+            debounce_time=RFID_DEBOUNCE_TIME,
+            card_read_config=card_read_config,
+            card_data_ttl=RFID_CARD_DATA_TTL,
+        )
+
+    return GPIORfid(
+        [_create_reader(config) for config in RFID_READERS.split(",")],
+        buzzer=buzzer,
+        debounce_time=RFID_DEBOUNCE_TIME,
+        card_read_config=card_read_config,
+        card_data_ttl=RFID_CARD_DATA_TTL,
+    )
+
+
+rfid = None
+if OWNS_HARDWARE:
+    rfid = _create_rfid()
+    RunOnShutdown.add(rfid.close)
 
-rfid = GPIORfid(buzzer)
-RunOnShutdown.add(rfid.close)
+    for config in RFID_CARD_DEBOUNCE_TIMES.split(","):
+        if config:
+            uid, _, seconds = config.strip().partition("=")
+            rfid.set_debounce_time(uid.lower(), float(seconds))
+
+
+def _card_data_to_record_data(card_data: CardData | None) -> dict | None:
+    if card_data is None:
+        return None
+
+    return {
+        "blocks": {
+            str(block): data.hex() for block, data in card_data.blocks.items()
+        },
+        "ndef_records": [
+            {
+                "tnf": record.tnf,
+                "type": record.type.decode("ascii", errors="replace"),
+                "payload": record.payload.hex(),
+                "text": record.text,
+            }
+            for record in card_data.ndef_records
+        ],
+    }
+
+
+async def _decide_scans() -> AsyncGenerator[
+    tuple[RfidScan, AccessDecision | None], None
+]:
+    # Every scan is decided on the device event path, as it arrives, so
+    # cached cards open the gate even when no client is watching.
+    async with contextlib.aclosing(rfid.async_wait_event()) as wait_event:
+        async for scan in wait_event:
+            yield scan, access_control.decide(scan.uid)
+
+
+def _to_record_data(
+    decided_scan: tuple[RfidScan, AccessDecision | None],
+) -> dict:
+    scan, decision = decided_scan
+    return {
+        "reader": scan.reader,
+        "uid": scan.uid,
+        "decision": decision,
+        "card_data": _card_data_to_record_data(scan.card_data),
+    }
+
+
+def _update_state(record: JournalRecord):
+    device_state.update(
+        "rfid",
+        {
+            "seq": record.seq,
+            "uid": record.data["uid"],
+            "timestamp": time_utils.to_utc_iso(record.timestamp),
+            "decision": record.data["decision"],
+        },
+        key=record.data["reader"],
+    )
+
+
+if OWNS_HARDWARE:
+    rfid_stream = EventStream(
+        _decide_scans,
+        EventJournal(os.path.join(EVENT_JOURNAL_DIR, "rfid")),
+        _to_record_data,
+        on_record=_update_state,
+    )
+else:
+    rfid_stream = RemoteEventStream(HARDWARE_DAEMON_SOCKET, "rfid")
+RunOnShutdown.add(rfid_stream.close)
 
 router = APIRouter(
     prefix="/rfid",
@@ -18,36 +206,60 @@ router = APIRouter(
 )
 
 
+class NdefRecordResponse(BaseModel):
+    tnf: int
+    type: str
+    # Hex encoded
+    payload: str
+    # Decoded text of Text records
+    text: str | None = None
+
+
+class CardDataResponse(BaseModel):
+    # Hex encoded data by block number
+    blocks: dict[int, str]
+    ndef_records: list[NdefRecordResponse]
+
+
 class RfidEventResponse(BaseModel):
+    seq: int
+    reader: str
     uid: str
     timestamp: str
+    # Decision already acted on by the Pi, None if the card is not in the
+    # local access list and the backend has to decide.
+    decision: AccessDecision | None = None
+    # Only sent when RFID_CARD_BLOCKS or RFID_CARD_NDEF is set. None if the
+    # card could not be read.
+    card_data: CardDataResponse | None = None
+
+
+def _to_response(record: JournalRecord) -> RfidEventResponse:
+    return RfidEventResponse(
+        seq=record.seq,
+        reader=record.data["reader"],
+        uid=record.data["uid"],
+        timestamp=time_utils.to_utc_iso(record.timestamp),
+        decision=record.data["decision"],
+        card_data=record.data.get("card_data"),
+    )
+
+
+rfid_topic = EventTopic("rfid", rfid_stream, _to_response)
 
 
 @router.websocket("/watch")
-async def watch_events(websocket: WebSocket):
+async def watch_events(websocket: WebSocket, since: int | None = None):
     await websocket.accept()
 
-    async def _wait_event():
-        async with contextlib.aclosing(rfid.async_wait_event()) as wait_event:
-            async for event in wait_event:
-                try:
-                    current_time = time_utils.get_utc_iso_now()
-                    await websocket.send_json(
-                        RfidEventResponse(
-                            uid=event,
-                            timestamp=current_time,
-                        ).model_dump()
-                    )
-
-                except WebSocketDisconnect:
-                    break
-
-    task = asyncio.create_task(_wait_event())
-    try:
-        await task
-    except asyncio.exceptions.CancelledError:
-        # Hide exception message
-        pass
-    finally:
-        if not websocket.application_state == WebSocketState.DISCONNECTED:
-            await websocket.close(1001, reason="Another connection opened")
+    socket = EventSocket(websocket, {rfid_topic.name: rfid_topic}, False)
+    await socket.subscribe(rfid_topic.name, since)
+    await socket.serve()
+
+
+@router.get("/events", response_class=EventSourceResponse)
+async def stream_events(
+    since: int | None = None,
+    last_event_id: Annotated[int | None, Header()] = None,
+):
+    return await event_source(rfid_topic, since, last_event_id)
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Annotated, Literal, Union
+
+from fastapi import APIRouter, Body
+from pydantic import BaseModel, Field
+
+from fastapi_app.modules import buzzer, gate, screen, status_lights
+
+
+class SceneActionTiming(BaseModel):
+    delay: float = Field(
+        description="Seconds to wait after the scene starts",
+        examples=[0, 0.5],
+        ge=0,
+        le=10,
+        default=0,
+    )
+
+
+class StatusLightsAction(SceneActionTiming):
+    device: Literal["status_lights"]
+    state: status_lights.StatusLightState
+
+
+class ScreenAction(SceneActionTiming, screen.LcdFormData):
+    device: Literal["screen"]
+
+
+class BuzzerAction(SceneActionTiming, buzzer.BuzzerFormData):
+    device: Literal["buzzer"]
+
+
+class GateAction(SceneActionTiming, gate.GateFormData):
+    device: Literal["gate"]
+    gate_id: int = Field(ge=1, le=2)
+
+
+SceneAction = Annotated[
+    Union[StatusLightsAction, ScreenAction, BuzzerAction, GateAction],
+    Field(discriminator="device"),
+]
+
+
+class SceneData(BaseModel):
+    actions: list[SceneAction] = Field(
+        description="Device actions, run concurrently",
+        min_length=1,
+        max_length=16,
+    )
+
+
+def _validate_action(action: SceneAction):
+    match action:
+        case StatusLightsAction():
+            if action.state not in status_lights.STATUS_LIGHT_PATTERNS:
+                raise ValueError(f"Invalid state: {action.state}")
+        case ScreenAction() | BuzzerAction() | GateAction():
+            # Fully checked by their models, e.g. gate_id is 1 or 2.
+            pass
+        case _:
+            raise ValueError(f"Invalid action: {action}")
+
+
+async def _run_action(action: SceneAction):
+    if action.delay > 0:
+        await asyncio.sleep(action.delay)
+
+    match action:
+        case StatusLightsAction():
+            await status_lights.show_state(action.state)
+        case ScreenAction():
+            await screen.write_text(action.text)
+        case BuzzerAction():
+            await buzzer.beep(action.frequency, action.duration)
+        case GateAction():
+            await gate.move_gate(
+                action.gate_id, action.angle, action.duration
+            )
+        case _:
+            raise ValueError(f"Invalid action: {action}")
+
+
+async def play_scene(actions: list[SceneAction]):
+    # An invalid action fails the scene before any device changed.
+    for action in actions:
+        _validate_action(action)
+
+    tasks = [asyncio.create_task(_run_action(action)) for action in actions]
+    try:
+        done, _ = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_EXCEPTION
+        )
+        for task in done:
+            # Raises the first failure.
+            task.result()
+    finally:
+        # Actions still waiting for their delay do not run once one failed,
+        # or once the request was cancelled.
+        for task in tasks:
+            task.cancel()
+
+
+router = APIRouter(
+    prefix="/scene",
+    tags=["scene (multiple devices)"],
+)
+
+
+@router.post(
+    "/",
+    summary="Run several device actions in one request",
+    response_model=SceneData,
+)
+async def set_scene(data: Annotated[SceneData, Body()]):
+    await play_scene(data.actions)
+    return data
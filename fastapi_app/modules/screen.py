@@ -1,13 +1,21 @@
+from concurrent.futures import Future
 from typing import Annotated
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Query
 from pydantic import BaseModel, Field
 
-from fastapi_app.gpio_modules import LcdI2c
-from fastapi_app.utils import RunOnShutdown
+from fastapi_app.gpio_modules import OWNS_HARDWARE, LcdI2c
+from fastapi_app.hardware_daemon import Op, hardware_client
+from fastapi_app.modules.state import device_state
+from fastapi_app.utils import RunOnShutdown, wait_request
 
-screen = LcdI2c(i2c_bus=8)
-RunOnShutdown.add(screen.close)
+screen = None
+if OWNS_HARDWARE:
+    screen = LcdI2c(
+        i2c_bus=8,
+        on_write=lambda lines: device_state.update("screen", {"lines": lines}),
+    )
+    RunOnShutdown.add(screen.close)
 
 
 class LcdFormData(BaseModel):
@@ -21,6 +29,16 @@ class LcdResponse(BaseModel):
     text: str
 
 
+async def write_text(text: str) -> Future[None]:
+    if hardware_client is not None:
+        _, future = await hardware_client.request(
+            Op.WRITE_SCREEN, text.encode(), with_completion=True
+        )
+        return future
+
+    return screen.schedule_write(text)
+
+
 router = APIRouter(
     prefix="/screen",
     tags=["screen (module 2004A with PCF8574 I2C backpack)"],
@@ -32,6 +50,15 @@ router = APIRouter(
     summary="Set lcd screen text",
     response_model=LcdResponse,
 )
-async def set_lcd_text(data: Annotated[LcdFormData, Form()]):
-    screen.write_string(data.text)
+async def set_lcd_text(
+    data: Annotated[LcdFormData, Form()],
+    wait: Annotated[
+        bool, Query(description="Respond once the text is on the screen")
+    ] = False,
+):
+    # Written from the LCD thread, the I2C transfer would block the loop.
+    future = await write_text(data.text)
+    if wait:
+        await wait_request(future)
+
     return LcdResponse(text=data.text)
@@ -0,0 +1,108 @@
+import os
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Header, Query, Response, status
+from pydantic import BaseModel
+
+from fastapi_app.hardware_daemon import Op, hardware_client, protocol
+from fastapi_app.utils import StateStore
+
+# Longest a GET /state?since= request waits for a change, in seconds.
+STATE_MAX_WAIT = float(os.getenv("STATE_MAX_WAIT", 60))
+
+# Updated by the device modules as their devices change, in the process
+# that owns the hardware.
+device_state = StateStore()
+
+
+class DeviceStateResponse(BaseModel):
+    version: int
+    # By device: gates, status_lights, screen, rfid, collision_button and
+    # distance_sensor. A device shows up once its state is first known.
+    state: dict[str, Any]
+
+
+async def get_snapshot(
+    since: int | None = None,
+    timeout: float = 0,
+    sections: list[str] | None = None,
+) -> tuple[str, int, dict[str, Any]]:
+    """
+    Returns the id of the store, its version and the state. With since,
+    first waits up to timeout for a change, see StateStore.wait().
+    """
+    if hardware_client is not None:
+        payload, _ = await hardware_client.request(
+            Op.GET_STATE,
+            protocol.encode_state_wait(since, timeout, sections),
+        )
+        snapshot = protocol.decode_json(payload)
+        return snapshot["id"], snapshot["version"], snapshot["state"]
+
+    if since is not None:
+        await device_state.wait(since, timeout, sections)
+
+    version, state = device_state.snapshot()
+    return device_state.id, version, state
+
+
+def _etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # Weak comparison, W/ prefixes are ignored.
+    return etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
+
+
+router = APIRouter(
+    prefix="/state",
+    tags=["device state"],
+)
+
+
+@router.get(
+    "",
+    summary="Get the state of every device",
+    response_model=DeviceStateResponse,
+    responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not modified"}},
+)
+async def read_state(
+    response: Response,
+    since: Annotated[
+        int | None,
+        Query(description="Wait until the version is past this one"),
+    ] = None,
+    timeout: Annotated[
+        float,
+        Query(
+            description="Longest wait in seconds, the current state is "
+            "returned once it passed",
+            ge=0,
+            le=STATE_MAX_WAIT,
+        ),
+    ] = 30,
+    sections: Annotated[
+        list[str] | None,
+        Query(
+            description="Only wait for changes of these devices, e.g. "
+            "gates or screen"
+        ),
+    ] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    # Served from the cache, reading it never touches the hardware.
+    store_id, version, state = await get_snapshot(since, timeout, sections)
+
+    etag = f'"{store_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(etag, if_none_match):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
+    response.headers.update(headers)
+    return DeviceStateResponse(version=version, state=state)
@@ -1,19 +1,30 @@
-import asyncio
 from enum import Enum
 from typing import Annotated
 
 from adafruit_extended_bus import ExtendedI2C as I2C
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Body, Form, HTTPException, status
 from pydantic import BaseModel, Field
 
-from fastapi_app.gpio_modules import LedsPcf8574
+from fastapi_app.gpio_modules import (
+    OWNS_HARDWARE,
+    SIMULATE_HARDWARE,
+    LedPattern,
+    LedPatternPlayer,
+    LedPatternStep,
+    LedsPcf8574,
+)
+from fastapi_app.hardware_daemon import (
+    Op,
+    PatternConflictError,
+    hardware_client,
+    protocol,
+)
+from fastapi_app.modules.state import device_state
 from fastapi_app.utils import RunOnShutdown
 
-leds = LedsPcf8574(I2C(7), reverse_layout=True, led_count=4)
-RunOnShutdown.add(leds.close)
-
-leds_request_lock = asyncio.Lock()
-
+LED_COUNT = 4
+# One bit per LED, all on.
+LEDS_MAX_BYTE = (1 << LED_COUNT) - 1
 
 class StatusLightState(str, Enum):
     NONE = "none"
@@ -30,6 +41,150 @@ class StatusLightsStateResponse(BaseModel):
     )
 
 
+class StatusLightsPatternStep(BaseModel):
+    byte: int = Field(
+        description="LEDs to turn on, one bit per LED",
+        examples=[0b0100, 0b0000],
+        ge=0,
+        le=LEDS_MAX_BYTE,
+    )
+    duration: float = Field(
+        description="Duration in seconds",
+        examples=[0.15, 0.5],
+        ge=0.02,
+        le=60,
+    )
+
+
+class StatusLightsPatternData(BaseModel):
+    steps: list[StatusLightsPatternStep] = Field(
+        description="Steps to play in order",
+        min_length=1,
+        max_length=64,
+    )
+    loop_count: int = Field(
+        description="Number of times to play the steps, 0 to loop forever",
+        examples=[0, 3],
+        ge=0,
+        default=0,
+    )
+    priority: int = Field(
+        description="A playing pattern can only be replaced by a pattern "
+        "with the same or higher priority",
+        examples=[0, 10],
+        default=0,
+    )
+    end_byte: int | None = Field(
+        description="Byte to show after a finite pattern ends",
+        examples=[None, 0b0001],
+        ge=0,
+        le=LEDS_MAX_BYTE,
+        default=None,
+    )
+
+
+# PROCESSING blinks and DENY flashes, the rest are static.
+STATUS_LIGHT_PATTERNS = {
+    StatusLightState.NONE: LedPattern.static(0b0000),
+    StatusLightState.READY: LedPattern.static(0b1000),
+    StatusLightState.PROCESSING: LedPattern(
+        [LedPatternStep(0b0100, 0.5), LedPatternStep(0b0000, 0.5)],
+        loop_count=0,
+    ),
+    StatusLightState.ALLOW: LedPattern.static(0b0010),
+    StatusLightState.DENY: LedPattern(
+        [LedPatternStep(0b0001, 0.15), LedPatternStep(0b0000, 0.15)],
+        loop_count=3,
+        end_byte=0b0001,
+    ),
+}
+STATUS_LIGHT_STATES = {
+    pattern: state for state, pattern in STATUS_LIGHT_PATTERNS.items()
+}
+
+
+def _report_pattern(pattern: LedPattern, playing: bool):
+    state = STATUS_LIGHT_STATES.get(pattern)
+    device_state.update(
+        "status_lights",
+        {
+            "state": None if state is None else state.value,
+            # Patterns played through play_pattern().
+            "pattern": (
+                None
+                if state is not None
+                else {
+                    "steps": [
+                        {"byte": step.byte, "duration": step.duration}
+                        for step in pattern.steps
+                    ],
+                    "loop_count": pattern.loop_count,
+                    "priority": pattern.priority,
+                    "end_byte": pattern.end_byte,
+                }
+            ),
+            # False once a finite pattern ended.
+            "playing": playing,
+        },
+    )
+
+
+leds = None
+leds_player = None
+if OWNS_HARDWARE:
+    leds = LedsPcf8574(
+        None if SIMULATE_HARDWARE else I2C(7),
+        reverse_layout=True,
+        led_count=LED_COUNT,
+    )
+    leds_player = LedPatternPlayer(leds, on_state_change=_report_pattern)
+    RunOnShutdown.add(leds_player.close)
+    RunOnShutdown.add(leds.close)
+
+
+async def show_state(state: StatusLightState):
+    if state not in STATUS_LIGHT_PATTERNS:
+        raise ValueError(f"Invalid state: {state}")
+
+    if hardware_client is not None:
+        await hardware_client.request(
+            Op.SHOW_STATUS_LIGHTS_STATE, state.value.encode()
+        )
+        return
+
+    # A new state always replaces whatever pattern is playing.
+    leds_player.play(STATUS_LIGHT_PATTERNS[state], preempt=True)
+
+
+async def play_pattern(data: StatusLightsPatternData) -> bool:
+    """
+    Returns False if a pattern with a higher priority is playing.
+    """
+    if hardware_client is not None:
+        try:
+            await hardware_client.request(
+                Op.PLAY_STATUS_LIGHTS_PATTERN,
+                protocol.encode_pattern(
+                    [(step.byte, step.duration) for step in data.steps],
+                    data.loop_count,
+                    data.priority,
+                    data.end_byte,
+                ),
+            )
+        except PatternConflictError:
+            return False
+
+        return True
+
+    pattern = LedPattern(
+        [LedPatternStep(step.byte, step.duration) for step in data.steps],
+        loop_count=data.loop_count,
+        priority=data.priority,
+        end_byte=data.end_byte,
+    )
+    return leds_player.play(pattern)
+
+
 router = APIRouter(
     prefix="/status_lights_state",
     tags=["status_lights_state (module PCF8574)"],
@@ -51,18 +206,22 @@ router = APIRouter(
     response_model=StatusLightsStateResponse,
 )
 async def set_status_light(state: Annotated[StatusLightState, Form()]):
-    async with leds_request_lock:
-        if state == StatusLightState.NONE:
-            leds.set_leds_byte(0b0000)
-        elif state == StatusLightState.READY:
-            leds.set_leds_byte(0b1000)
-        elif state == StatusLightState.PROCESSING:
-            leds.set_leds_byte(0b0100)
-        elif state == StatusLightState.ALLOW:
-            leds.set_leds_byte(0b0010)
-        elif state == StatusLightState.DENY:
-            leds.set_leds_byte(0b0001)
-        else:
-            raise ValueError(f"Invalid state: {state}")
-
+    await show_state(state)
     return StatusLightsStateResponse(state=state)
+
+
+@router.patch(
+    "/pattern",
+    summary="Play a status lights pattern",
+    response_model=StatusLightsPatternData,
+)
+async def set_status_light_pattern(
+    data: Annotated[StatusLightsPatternData, Body()],
+):
+    if not await play_pattern(data):
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            "A pattern with a higher priority is playing",
+        )
+
+    return data
@@ -1,2 +1,15 @@
-from .request_queue import RequestQueue
+from .access_cache import AccessCache, AccessCacheEntry, AccessDecision
+from .admission_control import (
+    DEFAULT_ADMISSION_LIMIT,
+    AdmissionController,
+    AdmissionLimit,
+)
+from .event_journal import EVENT_JOURNAL_DIR, EventJournal, JournalRecord
+from .event_socket import EventSocket, EventTopic
+from .event_source import EventSourceResponse, event_source
+from .event_stream import EventStream
+from .request_future import wait_request
+from .request_count_tracker import RequestCountTracker
 from .run_on_shutdown import RunOnShutdown
+from .state_store import StateStore
+from .token_bucket import TokenBucket
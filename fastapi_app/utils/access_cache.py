@@ -0,0 +1,79 @@
+import threading
+import time
+from enum import Enum
+
+
+class AccessDecision(str, Enum):
+    ALLOW = "allow"
+    DENY = "deny"
+
+
+class AccessCacheEntry:
+    def __init__(self, decision: AccessDecision, ttl: float | None = None):
+        self.decision = decision
+        self.expires_at = time.monotonic() + ttl if ttl is not None else None
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and now >= self.expires_at
+
+
+class AccessCache:
+    """
+    Local allowlist/denylist of card UIDs, uploaded in bulk by the backend.
+
+    Every upload carries a version number, uploads that are not newer than
+    the current version are rejected so a slow, stale sync can not overwrite
+    a newer one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, AccessCacheEntry] = {}
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(
+        self,
+        version: int,
+        entries: dict[str, AccessCacheEntry],
+        replace: bool = True,
+    ):
+        with self._lock:
+            if version <= self._version:
+                raise ValueError(
+                    f"Version {version} is not newer than {self._version}"
+                )
+
+            if replace:
+                self._entries = dict(entries)
+            else:
+                self._entries.update(entries)
+
+            self._version = version
+            self._remove_expired()
+
+    def lookup(self, uid: str) -> AccessDecision | None:
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+
+            if entry.is_expired(time.monotonic()):
+                del self._entries[uid]
+                return None
+
+            return entry.decision
+
+    def _remove_expired(self):
+        now = time.monotonic()
+        expired = [
+            uid for uid, entry in self._entries.items() if entry.is_expired(now)
+        ]
+        for uid in expired:
+            del self._entries[uid]
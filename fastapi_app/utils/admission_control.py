@@ -0,0 +1,117 @@
+import os
+import threading
+
+from fastapi import Depends
+from starlette.requests import HTTPConnection
+from starlette.responses import StreamingResponse
+
+from fastapi_app.exceptions import app_exceptions
+
+from .request_count_tracker import RequestCountTracker
+from .token_bucket import TokenBucket
+
+# 0 disables the limit.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 8))
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", 20))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", 40))
+
+# Retry-After when the concurrency limit is reached, requests in progress
+# give no better estimate.
+CONCURRENCY_RETRY_AFTER = 1
+
+
+class AdmissionLimit:
+    def __init__(
+        self,
+        max_concurrent: int | None = None,
+        rate: float | None = None,
+        burst: int | None = None,
+    ):
+        self.max_concurrent = max_concurrent or None
+        self.rate = rate or None
+        self.burst = burst or max(1, round(rate or 1))
+
+
+DEFAULT_ADMISSION_LIMIT = AdmissionLimit(
+    ADMISSION_MAX_CONCURRENT, ADMISSION_RATE, ADMISSION_BURST
+)
+
+
+class _EndpointAdmission:
+    def __init__(self, limit: AdmissionLimit):
+        self.tracker = (
+            RequestCountTracker(limit.max_concurrent)
+            if limit.max_concurrent is not None
+            else None
+        )
+        self.bucket = (
+            TokenBucket(limit.rate, limit.burst)
+            if limit.rate is not None
+            else None
+        )
+
+
+class AdmissionController:
+    """
+    Rejects requests with TooManyRequestsException before they reach the
+    device queues. Every endpoint gets its own concurrency and rate limit,
+    so a burst on one endpoint does not starve the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: dict[tuple[str, str], _EndpointAdmission] = {}
+
+    def _get_endpoint(
+        self, key: tuple[str, str], limit: AdmissionLimit
+    ) -> _EndpointAdmission:
+        with self._lock:
+            if key not in self._endpoints:
+                self._endpoints[key] = _EndpointAdmission(limit)
+
+            return self._endpoints[key]
+
+    def limit(self, limit: AdmissionLimit = DEFAULT_ADMISSION_LIMIT):
+        """
+        Dependency applying limit to each endpoint of a router, e.g.
+        app.include_router(router, dependencies=[controller.limit()]).
+        """
+
+        async def _admit(connection: HTTPConnection):
+            # Streams are long lived, a slot would be held until they close.
+            if connection.scope["type"] != "http":
+                yield
+                return
+
+            route = connection.scope.get("route")
+            path = route.path if route is not None else connection.url.path
+            endpoint = self._get_endpoint(
+                (connection.scope["method"], path), limit
+            )
+
+            if endpoint.bucket is not None:
+                retry_after = endpoint.bucket.try_acquire()
+                if retry_after > 0:
+                    raise app_exceptions.TooManyRequestsException(retry_after)
+
+            # Like WebSockets, event streams would hold a slot until they
+            # close. Reconnects are still rate limited.
+            response_class = getattr(route, "response_class", None)
+            if endpoint.tracker is None or (
+                isinstance(response_class, type)
+                and issubclass(response_class, StreamingResponse)
+            ):
+                yield
+                return
+
+            if not endpoint.tracker.try_enter():
+                raise app_exceptions.TooManyRequestsException(
+                    CONCURRENCY_RETRY_AFTER
+                )
+
+            try:
+                yield
+            finally:
+                endpoint.tracker.exit()
+
+        return Depends(_admit)
@@ -0,0 +1,243 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+EVENT_JOURNAL_DIR = os.getenv("EVENT_JOURNAL_DIR", "journal")
+
+
+class JournalRecord:
+    def __init__(self, seq: int, timestamp: float, data: Any):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.data = data
+
+    def to_line(self) -> str:
+        return json.dumps(
+            [self.seq, self.timestamp, self.data], separators=(",", ":")
+        )
+
+    @classmethod
+    def from_line(cls, line: str) -> "JournalRecord":
+        seq, timestamp, data = json.loads(line)
+        return cls(seq, timestamp, data)
+
+
+class EventJournal:
+    """
+    Append-only event log split into size-capped segment files.
+
+    Writes are buffered and fsync'ed at most once every sync_interval seconds
+    to limit SD card wear, so a power loss can lose the last sync_interval
+    seconds of events. Only the newest max_segments segments are kept.
+
+    append only numbers the record and queues it, a writer thread does the
+    file work, so appending from the event loop never waits for the disk.
+    """
+
+    SEGMENT_SUFFIX = ".jsonl"
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 256 * 1024,
+        max_segments: int = 8,
+        sync_interval: float = 1.0,
+    ):
+        if max_segments < 2:
+            raise ValueError("max_segments must be at least 2")
+
+        self._directory = directory
+        self._segment_max_bytes = segment_max_bytes
+        self._max_segments = max_segments
+        self._sync_interval = sync_interval
+
+        # Numbers the records and queues them in the same order.
+        self._seq_lock = threading.Lock()
+        # Guards the segment file, held by the writer thread and the timer.
+        self._file_lock = threading.Lock()
+        self._written = threading.Condition(self._file_lock)
+        self._sync_timer: threading.Timer | None = None
+        self._closed = False
+
+        os.makedirs(self._directory, exist_ok=True)
+        self._last_seq = self._find_last_seq()
+        self._written_seq = self._last_seq
+
+        # Always start a new segment, the last one may end with a torn write.
+        self._segment_file = None
+        self._open_segment(self._last_seq + 1)
+
+        # None stops the writer once the records before it are written.
+        self._queue: queue.Queue[JournalRecord | None] = queue.Queue()
+        self._writer_thread = threading.Thread(
+            target=self._write_records, daemon=True
+        )
+        self._writer_thread.start()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def close(self):
+        with self._seq_lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            self._queue.put(None)
+
+        self._writer_thread.join()
+        with self._file_lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+
+            self._sync()
+            self._segment_file.close()
+
+    def append(
+        self, data: Any, timestamp: float | None = None
+    ) -> JournalRecord:
+        """
+        Append data, timestamped now unless the source measured the time of
+        the event itself. Returns before the record is written.
+        """
+        with self._seq_lock:
+            self._last_seq += 1
+            record = JournalRecord(
+                self._last_seq,
+                timestamp if timestamp is not None else time.time(),
+                data,
+            )
+
+            if not self._closed:
+                self._queue.put(record)
+
+        return record
+
+    def read_since(self, seq: int) -> list[JournalRecord]:
+        """
+        Return the records with a sequence number greater than seq that are
+        still kept on disk.
+        """
+        with self._seq_lock:
+            end_seq = self._last_seq
+
+        # Records still queued for the writer are not on disk yet.
+        with self._written:
+            self._written.wait_for(
+                lambda: self._written_seq >= end_seq or self._closed
+            )
+            if not self._segment_file.closed:
+                self._segment_file.flush()
+
+        records: list[JournalRecord] = []
+        segments = self._list_segments()
+
+        for i, (first_seq, path) in enumerate(segments):
+            # Skip segments that only hold records up to seq.
+            if i + 1 < len(segments) and segments[i + 1][0] <= seq + 1:
+                continue
+
+            with open(path, "r") as segment:
+                for line in segment:
+                    try:
+                        record = JournalRecord.from_line(line)
+                    except ValueError:
+                        # Torn write from a crash or an append in progress.
+                        continue
+
+                    if seq < record.seq <= end_seq:
+                        records.append(record)
+
+        return records
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(
+            self._directory, f"{first_seq:016d}{self.SEGMENT_SUFFIX}"
+        )
+
+    def _list_segments(self) -> list[tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(self.SEGMENT_SUFFIX):
+                continue
+
+            first_seq = name.removesuffix(self.SEGMENT_SUFFIX)
+            if first_seq.isdigit():
+                segments.append(
+                    (int(first_seq), os.path.join(self._directory, name))
+                )
+
+        return sorted(segments)
+
+    def _find_last_seq(self) -> int:
+        for first_seq, path in reversed(self._list_segments()):
+            last_seq = first_seq - 1
+
+            with open(path, "r") as segment:
+                for line in segment:
+                    try:
+                        last_seq = JournalRecord.from_line(line).seq
+                    except ValueError:
+                        continue
+
+            if last_seq >= first_seq:
+                return last_seq
+
+        return 0
+
+    def _write_records(self):
+        while (record := self._queue.get()) is not None:
+            with self._written:
+                try:
+                    self._write(record)
+                except OSError as e:
+                    print(f"Failed to write journal record: {e}")
+
+                self._written_seq = record.seq
+                self._written.notify_all()
+
+    def _write(self, record: JournalRecord):
+        # Must be called with self._file_lock held.
+        self._segment_file.write(record.to_line() + "\n")
+
+        if self._segment_file.tell() >= self._segment_max_bytes:
+            self._sync()
+            self._segment_file.close()
+            self._open_segment(record.seq + 1)
+            self._remove_old_segments()
+        else:
+            self._schedule_sync()
+
+    def _open_segment(self, first_seq: int):
+        path = self._segment_path(first_seq)
+        self._segment_file = open(path, "a")
+
+    def _remove_old_segments(self):
+        segments = self._list_segments()
+        for _, path in segments[: -self._max_segments]:
+            os.remove(path)
+
+    def _schedule_sync(self):
+        # Must be called with self._file_lock held.
+        if self._sync_timer is not None:
+            return
+
+        def _timer_sync():
+            with self._file_lock:
+                self._sync_timer = None
+                if not self._segment_file.closed:
+                    self._sync()
+
+        self._sync_timer = threading.Timer(self._sync_interval, _timer_sync)
+        self._sync_timer.daemon = True
+        self._sync_timer.start()
+
+    def _sync(self):
+        # Must be called with self._file_lock held.
+        self._segment_file.flush()
+        os.fsync(self._segment_file.fileno())
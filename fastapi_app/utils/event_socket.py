@@ -0,0 +1,198 @@
+import asyncio
+import contextlib
+import json
+from typing import Any, Awaitable, Callable
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+from starlette.websockets import WebSocketState
+
+from .event_journal import JournalRecord
+from .event_stream import EventStream
+
+
+class EventTopic:
+    """
+    A device event stream that can be watched over a WebSocket.
+
+    on_subscribe gets the extra fields of the subscribe message, e.g. the
+    sample interval of the distance sensor, and raises ValueError if they
+    are invalid.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stream: EventStream,
+        to_response: Callable[[JournalRecord], BaseModel],
+        on_subscribe: Callable[[dict[str, Any]], Awaitable[None]]
+        | None = None,
+    ):
+        self.name = name
+        self.stream = stream
+        self.to_response = to_response
+        self.on_subscribe = on_subscribe
+
+
+class SubscribeMessage(BaseModel, extra="allow"):
+    action: str
+    topic: str
+    since: int | None = None
+
+
+class EventSocket:
+    """
+    Serves any number of topic subscriptions over one WebSocket.
+
+    The client sends {"action": "subscribe", "topic": ..., "since": ...} or
+    {"action": "unsubscribe", "topic": ...} and receives
+    {"type": "event", "topic": ..., "data": ...} messages of all its topics
+    interleaved, plus "subscribed", "unsubscribed" and "error" messages.
+
+    Untagged sockets send the bare event data and close once their last
+    subscription ended, like the per-device /watch endpoints always did.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        topics: dict[str, EventTopic],
+        tagged: bool = True,
+    ):
+        self._websocket = websocket
+        self._topics = topics
+        self._tagged = tagged
+
+        self._subscriptions: dict[str, asyncio.Task] = {}
+        # Subscriptions send from their own tasks.
+        self._send_lock = asyncio.Lock()
+        # Set once an untagged socket has nothing left to send.
+        self._closed_by_server = asyncio.Event()
+
+    async def _send(self, message: dict[str, Any]):
+        async with self._send_lock:
+            await self._websocket.send_json(message)
+
+    async def _send_control(self, message: dict[str, Any]):
+        if self._tagged:
+            await self._send(message)
+
+    async def subscribe(
+        self,
+        name: str,
+        since: int | None = None,
+        params: dict[str, Any] | None = None,
+    ):
+        topic = self._topics.get(name)
+        if topic is None:
+            raise ValueError(f"Unknown topic: {name}")
+
+        if topic.on_subscribe is not None:
+            await topic.on_subscribe(params or {})
+
+        # Subscribing again restarts the topic from since.
+        self.unsubscribe(name)
+
+        task = asyncio.create_task(self._forward(topic, since))
+        self._subscriptions[name] = task
+        task.add_done_callback(
+            lambda task: self._on_subscription_done(name, task)
+        )
+
+        await self._send_control({"type": "subscribed", "topic": name})
+
+    def unsubscribe(self, name: str) -> bool:
+        task = self._subscriptions.pop(name, None)
+        if task is None:
+            return False
+
+        task.cancel()
+        return True
+
+    async def _forward(self, topic: EventTopic, since: int | None):
+        async with contextlib.aclosing(
+            topic.stream.subscribe(since)
+        ) as wait_event:
+            async for record in wait_event:
+                data = topic.to_response(record).model_dump(mode="json")
+                if self._tagged:
+                    await self._send(
+                        {"type": "event", "topic": topic.name, "data": data}
+                    )
+                else:
+                    await self._send(data)
+
+    def _on_subscription_done(self, name: str, task: asyncio.Task):
+        if self._subscriptions.get(name) is task:
+            del self._subscriptions[name]
+
+        if not task.cancelled() and not isinstance(
+            task.exception(), (type(None), WebSocketDisconnect)
+        ):
+            print(f"Subscription to {name} failed: {task.exception()}")
+
+        if not self._tagged and not self._subscriptions:
+            # Wakes up serve() to close the socket.
+            self._closed_by_server.set()
+
+    async def _handle_message(self, message: Any):
+        try:
+            command = SubscribeMessage.model_validate(message)
+        except ValidationError as e:
+            raise ValueError(f"Invalid message: {e.errors()[0]['msg']}")
+
+        match command.action:
+            case "subscribe":
+                await self.subscribe(
+                    command.topic, command.since, command.model_extra
+                )
+            case "unsubscribe":
+                if self.unsubscribe(command.topic):
+                    await self._send_control(
+                        {"type": "unsubscribed", "topic": command.topic}
+                    )
+            case _:
+                raise ValueError(f"Unknown action: {command.action}")
+
+    async def _receive_messages(self):
+        while True:
+            message = await self._websocket.receive_text()
+            try:
+                await self._handle_message(json.loads(message))
+            except ValueError as e:
+                await self._send_control({"type": "error", "message": str(e)})
+
+    async def serve(self):
+        """
+        Serve the client's messages until it disconnects, or until the
+        server shuts down.
+        """
+        if not self._tagged and not self._subscriptions:
+            self._closed_by_server.set()
+
+        receive_task = asyncio.create_task(self._receive_messages())
+        closed_task = asyncio.create_task(self._closed_by_server.wait())
+        try:
+            await asyncio.wait(
+                (receive_task, closed_task),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if receive_task.done() and not receive_task.cancelled():
+                # Only a disconnect ends the loop, anything else is a bug.
+                with contextlib.suppress(WebSocketDisconnect):
+                    receive_task.result()
+
+        except asyncio.exceptions.CancelledError:
+            # Hide exception message
+            pass
+        finally:
+            receive_task.cancel()
+            closed_task.cancel()
+            for name in list(self._subscriptions):
+                self.unsubscribe(name)
+
+            if (
+                not self._websocket.application_state
+                == WebSocketState.DISCONNECTED
+            ):
+                await self._websocket.close(1001, reason="Server shutdown")
@@ -0,0 +1,84 @@
+import asyncio
+import contextlib
+import os
+from typing import Any, AsyncGenerator
+
+from starlette.responses import StreamingResponse
+
+from .event_socket import EventTopic
+
+# Comment line sent when a stream is quiet, keeps proxies from closing it.
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+# How long an EventSource waits before reconnecting, in ms.
+SSE_RETRY_MS = 3000
+
+
+class EventSourceResponse(StreamingResponse):
+    media_type = "text/event-stream"
+
+
+async def _format_events(
+    topic: EventTopic, since: int | None
+) -> AsyncGenerator[str, None]:
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    async with contextlib.aclosing(
+        topic.stream.subscribe(since)
+    ) as wait_event:
+        # Outlives heartbeats, cancelling it would end the subscription.
+        next_record: asyncio.Future | None = None
+        try:
+            while True:
+                if next_record is None:
+                    next_record = asyncio.ensure_future(anext(wait_event))
+
+                done, _ = await asyncio.wait(
+                    (next_record,), timeout=SSE_HEARTBEAT_INTERVAL
+                )
+                if not done:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                try:
+                    record = next_record.result()
+                except StopAsyncIteration:
+                    return
+                next_record = None
+
+                data = topic.to_response(record).model_dump_json()
+                yield (
+                    f"id: {record.seq}\nevent: {topic.name}\n"
+                    f"data: {data}\n\n"
+                )
+
+        finally:
+            if next_record is not None:
+                next_record.cancel()
+                # The generator can only be closed once it stopped running.
+                await asyncio.wait((next_record,))
+
+
+async def event_source(
+    topic: EventTopic,
+    since: int | None = None,
+    last_event_id: int | None = None,
+    params: dict[str, Any] | None = None,
+) -> EventSourceResponse:
+    """
+    Server-Sent Events version of a topic's /watch socket. A reconnecting
+    EventSource sends the Last-Event-ID header, which takes precedence over
+    since.
+    """
+    if topic.on_subscribe is not None:
+        await topic.on_subscribe(params or {})
+
+    return EventSourceResponse(
+        _format_events(
+            topic, since if last_event_id is None else last_event_id
+        ),
+        headers={
+            "Cache-Control": "no-cache",
+            # Disables response buffering of nginx.
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,212 @@
+import asyncio
+import contextlib
+from collections import deque
+from typing import Any, AsyncGenerator, Callable, Generic, Hashable, TypeVar
+
+from fastapi_app.utils.event_journal import EventJournal, JournalRecord
+
+# Generic event type
+T = TypeVar("T")
+
+
+class _Subscriber:
+    """
+    Records waiting to be sent to one subscriber, in bounded memory.
+
+    By default at most max_pending records are kept. When a slow subscriber
+    overflows them they are dropped and it catches up from the journal
+    instead, so no record is lost. With conflate, only the latest record of
+    every conflate_key is kept, for continuous measurements.
+    """
+
+    def __init__(
+        self,
+        max_pending: int,
+        conflate: bool,
+        conflate_key: Callable[[Any], Hashable] | None,
+    ):
+        self._max_pending = max_pending
+        self._conflate = conflate
+        self._conflate_key = conflate_key
+
+        self._pending: deque[JournalRecord] = deque()
+        self._latest: dict[Hashable, JournalRecord] = {}
+        self._overflowed = False
+        self._not_empty = asyncio.Event()
+
+    def put(self, record: JournalRecord) -> bool:
+        """
+        Returns whether a pending record was dropped.
+        """
+        dropped = False
+        if self._conflate:
+            key = (
+                self._conflate_key(record.data)
+                if self._conflate_key is not None
+                else None
+            )
+            dropped = key in self._latest
+            self._latest[key] = record
+        elif self._overflowed:
+            dropped = True
+        elif len(self._pending) >= self._max_pending:
+            self._pending.clear()
+            self._overflowed = True
+            dropped = True
+        else:
+            self._pending.append(record)
+
+        self._not_empty.set()
+        return dropped
+
+    async def get(self) -> JournalRecord | None:
+        """
+        Wait for the next record. Returns None if records were dropped and
+        must be read from the journal.
+        """
+        await self._not_empty.wait()
+
+        if self._overflowed:
+            self._overflowed = False
+            record = None
+        elif self._conflate:
+            record = self._latest.pop(next(iter(self._latest)))
+        else:
+            record = self._pending.popleft()
+
+        if not self._pending and not self._latest:
+            self._not_empty.clear()
+
+        return record
+
+
+class EventStream(Generic[T]):
+    """
+    Keeps a device event source running for the life of the app, writes
+    every event to a journal and fans it out to any number of subscribers.
+
+    Subscribers can resume from a sequence number to catch up on the events
+    they missed while disconnected. Each subscriber holds at most
+    max_pending records, see _Subscriber.
+    """
+
+    def __init__(
+        self,
+        wait_event: Callable[[], AsyncGenerator[T, None]],
+        journal: EventJournal,
+        to_record_data: Callable[[T], Any],
+        get_timestamp: Callable[[T], float | None] | None = None,
+        max_pending: int = 256,
+        conflate: bool = False,
+        conflate_key: Callable[[Any], Hashable] | None = None,
+        on_record: Callable[[JournalRecord], None] | None = None,
+    ):
+        self._wait_event = wait_event
+        self._journal = journal
+        self._to_record_data = to_record_data
+        # For sources that know when the event happened better than when it
+        # reached the event loop.
+        self._get_timestamp = get_timestamp
+
+        self._max_pending = max_pending
+        self._conflate = conflate
+        self._conflate_key = conflate_key
+        # Sees every record, e.g. to keep the device state up to date.
+        self._on_record = on_record
+
+        self._subscribers: set[_Subscriber] = set()
+        # Records a subscriber skipped, conflated or caught up from the
+        # journal.
+        self.dropped_count = 0
+        self._pump_task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._pump_task = asyncio.create_task(self._pump())
+
+    def stop(self):
+        # Called from RunOnShutdown before the device is closed, which ends
+        # the source generator. The pump then exits instead of restarting it.
+        self._stopping = True
+
+    def close(self):
+        self.stop()
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+
+        self._journal.close()
+
+    async def _pump(self):
+        while not self._stopping:
+            try:
+                async with contextlib.aclosing(
+                    self._wait_event()
+                ) as wait_event:
+                    async for event in wait_event:
+                        self._publish(event)
+
+            except Exception as e:
+                print(e)
+                print("Event source failed, restarting in 1 second...")
+                await asyncio.sleep(1)
+
+            # The source was closed, e.g. to apply new settings. Restart it on
+            # the next loop iteration.
+            await asyncio.sleep(0)
+
+    def _publish(self, event: T):
+        record = self._journal.append(
+            self._to_record_data(event),
+            self._get_timestamp(event) if self._get_timestamp else None,
+        )
+        if self._on_record is not None:
+            self._on_record(record)
+
+        for subscriber in self._subscribers:
+            if subscriber.put(record):
+                self.dropped_count += 1
+
+    async def subscribe(
+        self, since: int | None = None
+    ) -> AsyncGenerator[JournalRecord, None]:
+        """
+        Yield new records. If since is set, first replay the journaled
+        records with a greater sequence number.
+        """
+        subscriber = _Subscriber(
+            self._max_pending, self._conflate, self._conflate_key
+        )
+
+        # Subscribe before reading the journal so no record falls in between,
+        # duplicates are skipped by sequence number.
+        self._subscribers.add(subscriber)
+        try:
+            last_seq = since if since is not None else self._journal.last_seq
+
+            if since is not None:
+                for record in await asyncio.to_thread(
+                    self._journal.read_since, since
+                ):
+                    last_seq = record.seq
+                    yield record
+
+            while True:
+                record = await subscriber.get()
+                if record is None:
+                    # Fell too far behind, catch up from the journal.
+                    for record in await asyncio.to_thread(
+                        self._journal.read_since, last_seq
+                    ):
+                        last_seq = record.seq
+                        yield record
+                    continue
+
+                if record.seq <= last_seq:
+                    continue
+
+                last_seq = record.seq
+                yield record
+
+        finally:
+            self._subscribers.discard(subscriber)
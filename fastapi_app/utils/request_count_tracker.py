@@ -1,14 +1,46 @@
+import threading
+
+from fastapi_app.exceptions import app_exceptions
+
+
 class RequestCountTracker:
+    """
+    Counts requests in progress, safe to share between threads and the
+    event loop.
+    """
+
     def __init__(self, max_requests: int):
         self.max_requests = max_requests
-        self.requests = 0
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    @property
+    def requests(self) -> int:
+        return self._requests
 
     def is_max_requests_reached(self):
-        return self.requests >= self.max_requests
+        return self._requests >= self.max_requests
+
+    def try_enter(self) -> bool:
+        """
+        Count one more request unless the limit is reached.
+        """
+        with self._lock:
+            if self._requests >= self.max_requests:
+                return False
+
+            self._requests += 1
+            return True
+
+    def exit(self):
+        with self._lock:
+            self._requests -= 1
 
     def __enter__(self):
-        self.requests += 1
+        if not self.try_enter():
+            raise app_exceptions.TooManyRequestsException()
+
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.requests -= 1
+        self.exit()
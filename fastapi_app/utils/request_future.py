@@ -0,0 +1,20 @@
+import asyncio
+from concurrent.futures import Future
+
+from fastapi_app.exceptions import app_exceptions
+
+
+async def wait_request(future: Future[None]):
+    """
+    Wait for a scheduled device request without blocking a thread. Raises
+    RequestDroppedException if the request was dropped from its queue, or
+    the exception serving it raised.
+    """
+    try:
+        # Shielded so a client disconnecting does not cancel the request.
+        await asyncio.shield(asyncio.wrap_future(future))
+    except asyncio.CancelledError:
+        if future.cancelled():
+            raise app_exceptions.RequestDroppedException() from None
+
+        raise
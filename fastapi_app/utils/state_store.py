@@ -0,0 +1,125 @@
+import asyncio
+import copy
+import threading
+import time
+import uuid
+from typing import Any
+
+
+class StateStore:
+    """
+    Latest known state of every device, kept up to date by whoever changes
+    it, so reading it never touches the hardware.
+
+    Every change bumps version. Together with id, which is new on every
+    start, it identifies a snapshot, e.g. as an ETag. Readers can wait for
+    the version to move on instead of polling.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:8]
+
+        self._lock = threading.Lock()
+        self._sections: dict[str, Any] = {}
+        self._version = 0
+        # Version of the last change of every section.
+        self._section_versions: dict[str, int] = {}
+        # Woken up from whichever thread updates the store, keyed by the
+        # section they wait for, None for any section.
+        self._waiters: dict[
+            str | None, set[tuple[asyncio.AbstractEventLoop, asyncio.Future]]
+        ] = {}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def update(self, section: str, value: Any, key: str | None = None):
+        """
+        Replace section, or only its entry key, e.g. one of the gates.
+        Values must be JSON serializable. Unchanged values keep the version.
+
+        Thread safe, device threads update their state directly.
+        """
+        with self._lock:
+            if key is None:
+                if self._sections.get(section) == value:
+                    return
+
+                self._sections[section] = value
+            else:
+                entries = self._sections.setdefault(section, {})
+                if entries.get(key) == value:
+                    return
+
+                entries[key] = value
+
+            self._version += 1
+            self._section_versions[section] = self._version
+
+            # Only the waiters of other sections keep waiting.
+            for waiter_key in (section, None):
+                for loop, future in self._waiters.pop(waiter_key, ()):
+                    loop.call_soon_threadsafe(_wake_up, future)
+
+    def snapshot(self) -> tuple[int, dict[str, Any]]:
+        with self._lock:
+            return self._version, copy.deepcopy(self._sections)
+
+    def _changed_since(self, since: int, sections: list[str] | None) -> bool:
+        # Must be called with self._lock held. A version the store never
+        # had, e.g. from before a restart, counts as changed.
+        if not 0 <= since <= self._version:
+            return True
+        if sections is None:
+            return since < self._version
+
+        return any(
+            self._section_versions.get(section, 0) > since
+            for section in sections
+        )
+
+    async def wait(
+        self,
+        since: int,
+        timeout: float,
+        sections: list[str] | None = None,
+    ) -> bool:
+        """
+        Wait until the version moves past since, or only until one of
+        sections changed. Returns False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                if self._changed_since(since, sections):
+                    return True
+
+                waiter = (loop, loop.create_future())
+                waiter_keys = sections if sections is not None else [None]
+                for waiter_key in waiter_keys:
+                    self._waiters.setdefault(waiter_key, set()).add(waiter)
+
+            try:
+                await asyncio.wait_for(
+                    waiter[1], max(0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._lock:
+                    for waiter_key in waiter_keys:
+                        waiters = self._waiters.get(waiter_key)
+                        if waiters is None:
+                            continue
+
+                        waiters.discard(waiter)
+                        if not waiters:
+                            del self._waiters[waiter_key]
+
+
+def _wake_up(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
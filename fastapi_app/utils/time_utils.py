@@ -3,3 +3,7 @@ from datetime import datetime, timezone
 
 def get_utc_iso_now() -> str:
     return datetime.now(timezone.utc).isoformat()
+
+
+def to_utc_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()